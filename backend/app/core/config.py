@@ -1,6 +1,6 @@
 import os
 from pydantic_settings import BaseSettings
-from typing import List, Union
+from typing import Dict, List, Optional, Union
 from pydantic import AnyHttpUrl, field_validator
 
 class Settings(BaseSettings):
@@ -34,9 +34,112 @@ class Settings(BaseSettings):
     # --- DEEPSEEK CONFIG ---
     DEEPSEEK_API_KEY: str
     DEEPSEEK_BASE_URL: str = "https://api.deepseek.com"
+
+    # --- CLIENTE LLM (pool compartido) ---
+    LLM_HTTP2: bool = True
+    LLM_MAX_CONNECTIONS: int = 100
+    LLM_MAX_KEEPALIVE: int = 20
+    LLM_KEEPALIVE_EXPIRY: float = 60.0
+    LLM_CONNECT_TIMEOUT: float = 5.0
+    LLM_CLASSIFY_TIMEOUT: float = 5.0
+    LLM_STREAM_TIMEOUT: float = 45.0
+    # "native": herramientas vía parámetro `tools` | "prompt": esquema JSON en el system prompt
+    LLM_TOOL_MODE: str = "native"
+    # Pide al proveedor el uso real de tokens en el último chunk del stream (stream_options.include_usage)
+    LLM_STREAM_USAGE: bool = True
     
+    # --- PIPELINE DEL CHAT ---
+    # "sequential": clasifica y luego recupera | "concurrent": ambos en paralelo |
+    # "speculative": además arranca el stream sin esperar la clasificación
+    CHAT_PIPELINE_MODE: str = "concurrent"
+    # Confianza mínima del clasificador local para no consultar al LLM. None: el umbral
+    # calibrado por precisión fuera de muestra que train_intent.py guarda con el modelo
+    INTENT_LOCAL_THRESHOLD: Optional[float] = None
+
+    # --- PROMPT (presupuesto de tokens del contexto RAG por intención) ---
+    RAG_CONTEXT_PASSAGES: int = 5
+    PROMPT_CONTEXT_TOKENS: int = 1200
+    PROMPT_CONTEXT_TOKENS_BY_INTENT: Dict[str, int] = {"GENERAL": 800, "INVERSIONISTA": 1500, "GOBIERNO": 1500}
+    PROMPT_MIN_PASSAGE_TOKENS: int = 40
+
+    # --- MEMORIA DE CONVERSACIÓN (por session_id) ---
+    MEMORY_ENABLED: bool = True
+    MEMORY_MAX_SESSIONS: int = 5000
+    MEMORY_TTL: float = 1800.0
+    MEMORY_WINDOW_TOKENS: int = 1500
+    MEMORY_SUMMARY_ENABLED: bool = True
+    MEMORY_SUMMARY_TIMEOUT: float = 10.0  # llamada de resumen al LLM (fuera del camino del usuario)
+    MEMORY_RECOVER_FROM_LOGS: bool = True
+    MEMORY_RECOVER_TURNS: int = 6
+
+    # --- CACHÉ DE RESPUESTAS ---
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_TTL: float = 3600.0
+    RESPONSE_CACHE_MAX_ENTRIES: int = 1000
+    RESPONSE_CACHE_MAX_BYTES: int = 16 * 1024 * 1024
+    RESPONSE_CACHE_SIMILARITY: float = 0.92
+
+    # --- WEBSOCKET (cola por conexión) ---
+    WS_QUEUE_SIZE: int = 256
+    WS_SEND_TIMEOUT: float = 5.0
+
+    # --- BUS DE EVENTOS ENTRE WORKERS ---
+    EVENT_BUS_BACKEND: str = "memory"  # "memory" (un worker) o "postgres" (LISTEN/NOTIFY)
+    EVENT_BUS_QUEUE_SIZE: int = 10000
+    EVENT_BUS_RECONNECT_DELAY: float = 2.0
+
+    # --- CALOR DEL GRAFO (decaimiento + agregación por ticks) ---
+    GRAPH_HEAT_BOOST: float = 5.0
+    GRAPH_HEAT_HALF_LIFE: float = 300.0
+    GRAPH_HEAT_MAX: int = 60
+    GRAPH_HEAT_TICK: float = 0.25
+    GRAPH_HEAT_PERSIST_INTERVAL: float = 30.0
+
+    # --- ESCRITOR DE LOGS (lotes en segundo plano) ---
+    LOG_WRITER_QUEUE_SIZE: int = 5000
+    LOG_WRITER_BATCH_SIZE: int = 100
+    LOG_WRITER_FLUSH_INTERVAL: float = 1.0
+    LOG_WRITER_PUT_TIMEOUT: float = 0.05
+    LOG_WRITER_SHUTDOWN_TIMEOUT: float = 10.0
+
+    # --- MÉTRICAS DE LATENCIA (histogramas de /analytics/latency) ---
+    LATENCY_WINDOW_HOURS: int = 24
+    LATENCY_BUCKETS_MS: List[int] = [50, 100, 250, 500, 1000, 2000, 5000, 10000, 30000]
+
+    # --- PANEL DE ANALÍTICA (paginación por cursor) ---
+    ANALYTICS_PAGE_SIZE: int = 50
+    ANALYTICS_MAX_PAGE_SIZE: int = 500
+
+    # --- RAG / ÍNDICE VECTORIAL ---
+    RAG_EMBEDDER: str = "hashing"  # "hashing" (TF-IDF) o "local" (sentence-transformers)
+    RAG_EMBEDDING_DIM: int = 1024
+    RAG_LOCAL_MODEL: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+    RAG_MIN_SCORE: float = 0.05
+    RAG_INDEX_DIR: str = "data/index"
+    RAG_REFIT_RATIO: float = 0.3  # Fracción de docs cambiados a partir de la cual se reajusta el IDF
+    RAG_HYBRID: bool = True  # Fusiona vector + full-text (Postgres) con RRF
+    RAG_RRF_K: int = 60
+    RAG_CANDIDATES: int = 10
+    # GraphRAG: expansión k-hop sobre graph_edges
+    RAG_GRAPH_ENABLED: bool = True
+    RAG_GRAPH_HOPS: int = 2
+    RAG_GRAPH_DECAY: float = 0.5
+    RAG_GRAPH_MIN_SCORE: float = 0.1
+    GRAPH_RELATION_WEIGHTS: Dict[str, float] = {
+        "colabora con": 1.0, "provee tecnología a": 1.0, "provee nube a": 1.0,
+        "impulsa a": 0.9, "reciben mentoría de": 0.9, "es beneficiario de": 0.8,
+        "pertenece a": 0.7, "se ubica en": 0.5, "pilar": 0.6,
+    }
+    GRAPH_RELATION_DEFAULT_WEIGHT: float = 0.7
+
+    # --- INGESTA ---
+    INGEST_BATCH_SIZE: int = 500
+    INGEST_COPY_THRESHOLD: int = 5000  # A partir de aquí se usa COPY a tabla staging
+
     DB_POOL_SIZE: int = 20
     DB_MAX_OVERFLOW: int = 10
+    # Motor asyncpg para los handlers async (chat, analytics); requiere el paquete asyncpg
+    ASYNC_DB_ENABLED: bool = False
 
     class Config:
         case_sensitive = True
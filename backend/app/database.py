@@ -1,6 +1,10 @@
-from sqlalchemy import create_engine
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from starlette.concurrency import run_in_threadpool
 from app.core.config import settings
 
 # --- OPTIMIZACIÓN: Pool de conexiones más grande ---
@@ -15,9 +19,93 @@ engine = create_engine(
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# --- MOTOR ASÍNCRONO OPCIONAL (asyncpg) ---
+# Con ASYNC_DB_ENABLED las consultas de los handlers async no bloquean el event loop.
+async_engine = None
+AsyncSessionLocal = None
+
+def _async_url(url: str):
+    return make_url(url).set(drivername="postgresql+asyncpg")
+
+if settings.ASYNC_DB_ENABLED:
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    async_engine = create_async_engine(
+        _async_url(settings.SQLALCHEMY_DATABASE_URI),
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_pre_ping=True
+    )
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+@contextmanager
+def session_scope():
+    """
+    Sesión de vida corta: toma una conexión del pool solo durante el bloque y la
+    devuelve al salir (rollback si hubo error). Para trabajo que no vive en un request.
+    """
+    db = SessionLocal()
+    try:
+        yield db
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+# --- MÉTRICAS DEL POOL ---
+_pool_stats = {"checkouts": 0, "peak_checked_out": 0}
+
+@event.listens_for(engine, "checkout")
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    _pool_stats["checkouts"] += 1
+    _pool_stats["peak_checked_out"] = max(_pool_stats["peak_checked_out"], engine.pool.checkedout())
+
+def _pool_status(pool) -> dict:
+    capacity = pool.size() + max(settings.DB_MAX_OVERFLOW, 0)
+    checked_out = pool.checkedout()
+    return {
+        "size": pool.size(),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "checked_out": checked_out,
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "saturation": round(checked_out / capacity, 3) if capacity else 0.0,
+    }
+
+def pool_metrics() -> dict:
+    metrics = {"sync": {**_pool_status(engine.pool), **_pool_stats}}
+    if async_engine is not None:
+        metrics["async"] = _pool_status(async_engine.sync_engine.pool)
+    return metrics
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    """AsyncSession si ASYNC_DB_ENABLED; si no, la sesión síncrona de siempre."""
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as session:
+            yield session
+    else:
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+# Los handlers async usan estos helpers y funcionan con cualquiera de las dos sesiones:
+# con la síncrona la consulta corre en el threadpool en vez de bloquear el loop.
+
+async def execute(db, statement):
+    if isinstance(db, AsyncSession):
+        return await db.execute(statement)
+    return await run_in_threadpool(db.execute, statement)
+
+async def commit(db):
+    if isinstance(db, AsyncSession):
+        return await db.commit()
+    return await run_in_threadpool(db.commit)
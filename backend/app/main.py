@@ -1,16 +1,26 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
+from typing import Optional
 from app.core.config import settings
 from app.routers import api, analytics, auth
-from app.database import engine, Base, SessionLocal, get_db
+from app.database import engine, async_engine, Base, session_scope
+from app.models.schema_patches import apply_schema_patches
 from app.services.ingestion_service import ingestion_service
 from app.utils.websocket import manager
+from app.utils.pagination import NEXT_CURSOR_HEADER
 from app.services.chat_service import chat_service
+from app.services.rag_service import rag_service
+from app.services.llm_client import llm_client
+from app.services.intent_classifier import intent_classifier
+from app.services.log_writer import log_writer
+from app.services.analytics_rollups import backfill_rollups
+from app.services.event_bus import event_bus
+from app.services.graph_service import graph_service
 from app.schemas.chat import ChatRequest
 
 Base.metadata.create_all(bind=engine)
+apply_schema_patches(engine)
 
 app = FastAPI(title=settings.PROJECT_NAME)
 
@@ -20,20 +30,23 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],  # cursor de paginación del panel
 )
 
 @app.websocket("/ws/logs")
-async def websocket_endpoint(websocket: WebSocket):
-    # CORRECCIÓN: Llamada simple sin session_id
-    await manager.connect(websocket)
+async def websocket_endpoint(websocket: WebSocket, topics: Optional[str] = None, sessions: Optional[str] = None):
+    # Sin filtros recibe todo; ?topics=log,graph_heat&sessions=abc,def o un mensaje "subscribe" lo acotan
+    await manager.connect(websocket, topics, sessions)
+    manager.send_graph_snapshot(websocket, graph_service.current_weights())
     try:
-        while True: await websocket.receive_text()
+        while True: await manager.handle_client_message(websocket, await websocket.receive_text())
     except WebSocketDisconnect: manager.disconnect(websocket)
 
 @app.post(f"{settings.API_V1_STR}/chat")
-async def chat_endpoint(request: ChatRequest, db: Session = Depends(get_db)):
+async def chat_endpoint(request: ChatRequest):
+    # Sin Depends(get_db): el pipeline toma conexiones del pool solo cuando consulta
     return StreamingResponse(
-        chat_service.stream_process_message(db, request.message, request.session_id),
+        chat_service.stream_process_message(request.message, request.session_id),
         media_type="text/plain"
     )
 
@@ -44,10 +57,34 @@ app.include_router(analytics.router, prefix=f"{settings.API_V1_STR}/analytics")
 @app.on_event("startup")
 def startup_event():
     try:
-        db = SessionLocal()
-        ingestion_service.ingest_initial_data(db)
-        db.close()
+        intent_classifier.load()
+    except Exception as e: print(f"⚠️ [INTENT] Clasificador local no disponible: {e}")
+    try:
+        with session_scope() as db:
+            ingestion_service.ingest_initial_data(db)
     except: pass
+    if rag_service.index is None:
+        rag_service.load_index()  # sin índice tras la ingesta: la primera búsqueda lo construye en memoria
+    try:
+        with session_scope() as db:
+            backfill_rollups(db)
+    except Exception as e: print(f"⚠️ [ANALYTICS] No se pudieron reconstruir los rollups: {e}")
+
+@app.on_event("startup")
+async def startup_background_services():
+    await llm_client.startup()
+    await log_writer.start()
+    await event_bus.start()
+    await graph_service.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await log_writer.stop()
+    await graph_service.stop()
+    await event_bus.stop()
+    await llm_client.shutdown()
+    if async_engine is not None:
+        await async_engine.dispose()
 
 @app.get("/")
 def root(): return {"status": "CIAY Neuro-Symbolic System Operational"}
\ No newline at end of file
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, String, Text, Integer, ForeignKey, Boolean, Float, DateTime
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, Text, Integer, ForeignKey, Boolean, Float, DateTime, Computed, Index
+from sqlalchemy.dialects.postgresql import UUID, TSVECTOR
 from sqlalchemy.sql import func
 import uuid
 from app.database import Base
@@ -8,8 +8,18 @@ class TimeStampMixin:
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+# Vector de búsqueda full-text (config 'spanish'): keywords y tema pesan más que el contenido
+KNOWLEDGE_TSVECTOR_SQL = (
+    "setweight(to_tsvector('spanish', coalesce(keywords, '')), 'A') || "
+    "setweight(to_tsvector('spanish', coalesce(topic, '')), 'A') || "
+    "setweight(to_tsvector('spanish', coalesce(content, '')), 'B')"
+)
+
 class KnowledgeItem(Base, TimeStampMixin):
     __tablename__ = "knowledge_items"
+    __table_args__ = (
+        Index("ix_knowledge_items_search_vector", "search_vector", postgresql_using="gin"),
+    )
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     topic = Column(String, index=True)
     content = Column(Text, nullable=False)
@@ -17,6 +27,10 @@ class KnowledgeItem(Base, TimeStampMixin):
     technical_level = Column(String, default="General") 
     application_sector = Column(String, default="Transversal")
     source_url = Column(String, nullable=True)
+    # Pasajes generados por ingest.py: documento de origen y posición dentro de él
+    parent_document = Column(String, index=True, nullable=True)
+    chunk_index = Column(Integer, nullable=True)
+    search_vector = Column(TSVECTOR, Computed(KNOWLEDGE_TSVECTOR_SQL, persisted=True))
     
 class GraphNode(Base, TimeStampMixin):
     __tablename__ = "graph_nodes"
@@ -26,11 +40,21 @@ class GraphNode(Base, TimeStampMixin):
     
 class GraphEdge(Base, TimeStampMixin):
     __tablename__ = "graph_edges"
+    __table_args__ = (
+        Index("uq_graph_edges_triplet", "source_id", "relation", "target_id", unique=True),
+    )
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     source_id = Column(String, ForeignKey("graph_nodes.id"))
     target_id = Column(String, ForeignKey("graph_nodes.id"))
     relation = Column(String, nullable=False)
 
+class IngestManifest(Base, TimeStampMixin):
+    # Hash por archivo fuente y por fila para la ingesta incremental
+    __tablename__ = "ingest_manifest"
+    source = Column(String, primary_key=True)
+    file_hash = Column(String, nullable=False)
+    row_hashes = Column(Text) # JSON {clave_fila: hash}
+
 class UserTaxonomy(Base, TimeStampMixin):
     __tablename__ = "user_taxonomy"
     code = Column(String, primary_key=True)
@@ -39,6 +63,10 @@ class UserTaxonomy(Base, TimeStampMixin):
 
 class InteractionLog(Base, TimeStampMixin):
     __tablename__ = "interaction_logs"
+    __table_args__ = (
+        Index("ix_interaction_logs_session_created_id", "session_id", "created_at", "id"),
+        Index("ix_interaction_logs_created_at", "created_at"),
+    )
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     session_id = Column(String, index=True)
     user_input = Column(Text)
@@ -48,9 +76,22 @@ class InteractionLog(Base, TimeStampMixin):
     sentiment_score = Column(Float, default=0.0)
     sentiment_label = Column(String, default="NEUTRO")
     topics_detected = Column(String, nullable=True)
+    # Tiempos del turno (ms) y uso de tokens reportado por el proveedor (NULL si no aplica)
+    classify_ms = Column(Float, nullable=True)
+    retrieve_ms = Column(Float, nullable=True)
+    ttft_ms = Column(Float, nullable=True)      # desde el inicio del turno (lo que ve el usuario)
+    llm_ttft_ms = Column(Float, nullable=True)  # desde que se abre el stream del LLM
+    stream_ms = Column(Float, nullable=True)
+    tool_ms = Column(Float, nullable=True)
+    total_ms = Column(Float, nullable=True)
+    prompt_tokens = Column(Integer, nullable=True)
+    completion_tokens = Column(Integer, nullable=True)
 
 class ContactLead(Base, TimeStampMixin):
     __tablename__ = "contact_leads"
+    __table_args__ = (
+        Index("ix_contact_leads_created_id", "created_at", "id"),  # paginación por cursor
+    )
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     nombre = Column(String, nullable=True)
     correo = Column(String, nullable=True)
@@ -64,6 +105,9 @@ class ContactLead(Base, TimeStampMixin):
 
 class CourseRegistration(Base, TimeStampMixin):
     __tablename__ = "course_registrations"
+    __table_args__ = (
+        Index("ix_course_registrations_created_id", "created_at", "id"),
+    )
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     student_name = Column(String)
     email = Column(String)
@@ -78,4 +122,30 @@ class CitizenReport(Base, TimeStampMixin):
     description = Column(Text)
     status = Column(String, default="Abierto")
     ticket_id = Column(String, unique=True) # Folio generado
-# --------------------------------
\ No newline at end of file
+# --------------------------------
+# --- ROLLUPS DE ANALÍTICA (los actualiza el escritor de logs) ---
+
+class AnalyticsHourly(Base):
+    __tablename__ = "analytics_hourly"
+    hour = Column(DateTime(timezone=True), primary_key=True)  # UTC, truncado a la hora
+    interactions = Column(Integer, nullable=False, default=0)
+    new_sessions = Column(Integer, nullable=False, default=0)
+    tokens = Column(Integer, nullable=False, server_default="0")
+    latency_ms_sum = Column(Float, nullable=False, server_default="0")
+    latency_count = Column(Integer, nullable=False, server_default="0")
+
+class AnalyticsIntentHourly(Base):
+    __tablename__ = "analytics_intent_hourly"
+    hour = Column(DateTime(timezone=True), primary_key=True)
+    intent = Column(String, primary_key=True)
+    interactions = Column(Integer, nullable=False, default=0)
+
+class SessionActivity(Base):
+    __tablename__ = "session_activity"
+    __table_args__ = (
+        Index("ix_session_activity_first_seen_id", "first_seen", "session_id"),  # paginación (clave inmutable)
+    )
+    session_id = Column(String, primary_key=True)
+    first_seen = Column(DateTime(timezone=True), nullable=False)
+    last_seen = Column(DateTime(timezone=True), nullable=False)
+    message_count = Column(Integer, nullable=False, default=0)
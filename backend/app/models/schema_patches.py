@@ -0,0 +1,48 @@
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from app.models.knowledge import KNOWLEDGE_TSVECTOR_SQL
+
+# create_all() no altera tablas existentes: estos parches idempotentes llevan
+# las bases ya desplegadas al esquema actual de los modelos.
+SCHEMA_PATCHES = [
+    f"ALTER TABLE knowledge_items ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    f"GENERATED ALWAYS AS ({KNOWLEDGE_TSVECTOR_SQL}) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_knowledge_items_search_vector ON knowledge_items USING gin (search_vector)",
+    "ALTER TABLE knowledge_items ADD COLUMN IF NOT EXISTS parent_document VARCHAR",
+    "ALTER TABLE knowledge_items ADD COLUMN IF NOT EXISTS chunk_index INTEGER",
+    "CREATE INDEX IF NOT EXISTS ix_knowledge_items_parent_document ON knowledge_items (parent_document)",
+    # Índices compuestos para la paginación por cursor del panel
+    "CREATE INDEX IF NOT EXISTS ix_interaction_logs_session_created_id ON interaction_logs (session_id, created_at, id)",
+    "CREATE INDEX IF NOT EXISTS ix_contact_leads_created_id ON contact_leads (created_at, id)",
+    "CREATE INDEX IF NOT EXISTS ix_course_registrations_created_id ON course_registrations (created_at, id)",
+    "CREATE INDEX IF NOT EXISTS ix_session_activity_first_seen_id ON session_activity (first_seen, session_id)",
+    "CREATE INDEX IF NOT EXISTS ix_interaction_logs_created_at ON interaction_logs (created_at)",
+    # Métricas por turno (tiempos y tokens) y sus acumulados por hora
+    *[f"ALTER TABLE interaction_logs ADD COLUMN IF NOT EXISTS {column} {kind}" for column, kind in (
+        ("classify_ms", "DOUBLE PRECISION"), ("retrieve_ms", "DOUBLE PRECISION"), ("ttft_ms", "DOUBLE PRECISION"),
+        ("llm_ttft_ms", "DOUBLE PRECISION"), ("stream_ms", "DOUBLE PRECISION"), ("tool_ms", "DOUBLE PRECISION"),
+        ("total_ms", "DOUBLE PRECISION"), ("prompt_tokens", "INTEGER"), ("completion_tokens", "INTEGER"),
+    )],
+    "ALTER TABLE analytics_hourly ADD COLUMN IF NOT EXISTS tokens INTEGER NOT NULL DEFAULT 0",
+    "ALTER TABLE analytics_hourly ADD COLUMN IF NOT EXISTS latency_ms_sum DOUBLE PRECISION NOT NULL DEFAULT 0",
+    "ALTER TABLE analytics_hourly ADD COLUMN IF NOT EXISTS latency_count INTEGER NOT NULL DEFAULT 0",
+    # Aristas únicas para ON CONFLICT: se deduplican una sola vez antes de crear el índice
+    """
+    DO $$ BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_indexes WHERE indexname = 'uq_graph_edges_triplet') THEN
+            DELETE FROM graph_edges a USING graph_edges b
+            WHERE a.ctid < b.ctid AND a.source_id = b.source_id
+              AND a.relation = b.relation AND a.target_id = b.target_id;
+            CREATE UNIQUE INDEX uq_graph_edges_triplet ON graph_edges (source_id, relation, target_id);
+        END IF;
+    END $$
+    """,
+]
+
+def apply_schema_patches(engine: Engine):
+    for statement in SCHEMA_PATCHES:
+        try:
+            with engine.begin() as conn:
+                conn.execute(text(statement))
+        except Exception as e:
+            print(f"⚠️ [SCHEMA] Parche no aplicado: {e}")
@@ -1,82 +1,191 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
-from app.database import get_db
-from app.models.knowledge import InteractionLog, UserTaxonomy, ContactLead, CourseRegistration, CitizenReport
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import func, desc, select, delete
+from app.core.config import settings
+from app.database import get_async_db, execute, commit, pool_metrics
+from app.models.knowledge import InteractionLog, UserTaxonomy, ContactLead, CourseRegistration, CitizenReport, AnalyticsHourly, AnalyticsIntentHourly, SessionActivity
+from app.services.log_writer import log_writer
+from app.services.conversation_memory import conversation_memory
+from app.utils.websocket import manager
+from app.services.event_bus import event_bus
+from app.utils.pagination import keyset, split_page, NEXT_CURSOR_HEADER
+from typing import Optional
 import json
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
 router = APIRouter()
 
+# Handlers async: con ASYNC_DB_ENABLED las consultas van por asyncpg; si no, por el
+# threadpool (helpers execute/commit de app.database).
+
 # --- DASHBOARD PRINCIPAL ---
 @router.get("/dashboard/stats")
-def get_real_dashboard_stats(db: Session = Depends(get_db)):
-    total_interactions = db.query(InteractionLog).count()
-    total_sessions = db.query(InteractionLog.session_id).distinct().count()
-    
-    intent_stats = db.query(InteractionLog.detected_intent, func.count(InteractionLog.id)).group_by(InteractionLog.detected_intent).all()
-    formatted_intents = [{"name": i or "Desconocido", "value": c} for i, c in intent_stats]
-
-    last_24h = datetime.utcnow() - timedelta(hours=24)
-    hourly_activity = db.query(func.date_trunc('hour', InteractionLog.created_at).label('hour'), func.count(InteractionLog.id)).filter(InteractionLog.created_at >= last_24h).group_by('hour').order_by('hour').all()
-    chart_data = [{"name": h.strftime("%H:00"), "tokens": c * 150, "latency": 0} for h, c in hourly_activity]
+async def get_real_dashboard_stats(db = Depends(get_async_db)):
+    # Solo lee los rollups (analytics_hourly / analytics_intent_hourly): costo constante
+    # sin importar cuántos logs existan. Los mantiene el escritor de logs por lote.
+    total_interactions, total_sessions, latency_sum, latency_count = (await execute(db, select(
+        func.coalesce(func.sum(AnalyticsHourly.interactions), 0),
+        func.coalesce(func.sum(AnalyticsHourly.new_sessions), 0),
+        func.coalesce(func.sum(AnalyticsHourly.latency_ms_sum), 0),
+        func.coalesce(func.sum(AnalyticsHourly.latency_count), 0),
+    ))).one()
+
+    intent_total = func.sum(AnalyticsIntentHourly.interactions)
+    intent_stats = (await execute(db, select(AnalyticsIntentHourly.intent, intent_total).group_by(AnalyticsIntentHourly.intent).order_by(desc(intent_total)))).all()
+    formatted_intents = [{"name": i, "value": c} for i, c in intent_stats]
+
+    last_24h = datetime.now(timezone.utc) - timedelta(hours=24)
+    hourly_activity = (await execute(db, select(AnalyticsHourly.hour, AnalyticsHourly.tokens, AnalyticsHourly.latency_ms_sum, AnalyticsHourly.latency_count).where(AnalyticsHourly.hour >= last_24h).order_by(AnalyticsHourly.hour))).all()
+    chart_data = [{"name": h.strftime("%H:00"), "tokens": t, "latency": round(ls / lc) if lc else 0} for h, t, ls, lc in hourly_activity]
     if not chart_data: chart_data = [{"name": "Sin Datos", "tokens": 0, "latency": 0}]
 
     return {
         "kpis": {
             "total_interactions": total_interactions,
             "total_sessions": total_sessions,
-            "avg_latency": "1.2s"
+            # Latencia media del turno completo (total_ms); sin mediciones aún: "N/A"
+            "avg_latency": f"{latency_sum / latency_count / 1000:.1f}s" if latency_count else "N/A"
         },
         "intents_distribution": formatted_intents,
         "activity_chart": chart_data
     }
 
+# --- LATENCIA Y TOKENS (percentiles por etapa del turno) ---
+
+LATENCY_COLUMNS = {
+    "classify_ms": InteractionLog.classify_ms,
+    "retrieve_ms": InteractionLog.retrieve_ms,
+    "ttft_ms": InteractionLog.ttft_ms,
+    "llm_ttft_ms": InteractionLog.llm_ttft_ms,
+    "stream_ms": InteractionLog.stream_ms,
+    "tool_ms": InteractionLog.tool_ms,
+    "total_ms": InteractionLog.total_ms,
+}
+PERCENTILES = {"p50": 0.5, "p95": 0.95, "p99": 0.99}
+
+@router.get("/latency")
+async def get_latency_histograms(hours: int = settings.LATENCY_WINDOW_HOURS, db = Depends(get_async_db)):
+    """
+    p50/p95/p99 y buckets acumulados (le = "menor o igual que", estilo Prometheus)
+    de cada etapa, más el uso real de tokens, en las últimas `hours` horas. Un solo escaneo.
+    """
+    buckets = settings.LATENCY_BUCKETS_MS
+    columns = []
+    for column in LATENCY_COLUMNS.values():
+        columns.append(func.count(column))
+        columns += [func.percentile_cont(q).within_group(column) for q in PERCENTILES.values()]
+        columns += [func.count().filter(column <= bound) for bound in buckets]
+    columns += [
+        func.coalesce(func.sum(InteractionLog.prompt_tokens), 0),
+        func.coalesce(func.sum(InteractionLog.completion_tokens), 0),
+        func.count(InteractionLog.prompt_tokens),
+    ]
+    since = datetime.now(timezone.utc) - timedelta(hours=hours)
+    row = list((await execute(db, select(*columns).where(InteractionLog.created_at >= since))).one())
+
+    metrics = {}
+    for name in LATENCY_COLUMNS:
+        count, row = row[0], row[1:]
+        quantiles, row = row[:len(PERCENTILES)], row[len(PERCENTILES):]
+        cumulative, row = row[:len(buckets)], row[len(buckets):]
+        metrics[name] = {
+            "count": count,
+            **{label: round(value, 1) if value is not None else None for label, value in zip(PERCENTILES, quantiles)},
+            "buckets": [{"le": bound, "count": n} for bound, n in zip(buckets, cumulative)] + [{"le": "+Inf", "count": count}],
+        }
+    prompt_tokens, completion_tokens, turns_with_usage = row
+    return {
+        "window_hours": hours,
+        "metrics": metrics,
+        "tokens": {"prompt": prompt_tokens, "completion": completion_tokens, "turns_with_usage": turns_with_usage},
+    }
+
+# --- PAGINACIÓN (cursor sobre created_at, id) ---
+# Las listas del panel crecen con el CRM: se devuelven por páginas del índice compuesto,
+# solo con las columnas que se muestran. Cursor siguiente en la cabecera X-Next-Cursor.
+
+PAGE_LIMIT = Query(settings.ANALYTICS_PAGE_SIZE, ge=1, le=settings.ANALYTICS_MAX_PAGE_SIZE)
+LEAD_FIELDS = ("id", "nombre", "correo", "empresa", "telefono", "interes", "mensaje", "origen", "created_at")
+REGISTRATION_FIELDS = ("id", "student_name", "email", "course_name", "status", "created_at")
+
+def _projection(model, allowed, fields: Optional[str]):
+    """Columnas de ?fields=a,b (id y created_at siempre: las necesita el cursor)."""
+    names = [f.strip() for f in fields.split(",") if f.strip()] if fields else list(allowed)
+    unknown = sorted(set(names) - set(allowed))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Campos no disponibles: {', '.join(unknown)}")
+    return [getattr(model, name) for name in dict.fromkeys(["id", *names, "created_at"])]
+
+async def _page(db, response: Response, stmt, order_column, key_column, cursor: Optional[str], limit: int, descending: bool = True):
+    try:
+        stmt = keyset(stmt, order_column, key_column, cursor, limit, descending)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    rows, next_cursor = split_page((await execute(db, stmt)).all(), limit, order_column.key, key_column.key)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return rows
+
 # --- GESTIÓN DE LEADS (CRM) ---
 
 @router.get("/leads")
-def get_leads(db: Session = Depends(get_db)):
-    return db.query(ContactLead).order_by(ContactLead.created_at.desc()).all()
+async def get_leads(response: Response, cursor: Optional[str] = None, limit: int = PAGE_LIMIT, fields: Optional[str] = None, db = Depends(get_async_db)):
+    stmt = select(*_projection(ContactLead, LEAD_FIELDS, fields))
+    return [row._asdict() for row in await _page(db, response, stmt, ContactLead.created_at, ContactLead.id, cursor, limit)]
 
 @router.delete("/leads/{lead_id}")
-def delete_lead(lead_id: str, db: Session = Depends(get_db)):
-    lead = db.query(ContactLead).filter(ContactLead.id == lead_id).first()
-    if not lead:
+async def delete_lead(lead_id: str, db = Depends(get_async_db)):
+    result = await execute(db, delete(ContactLead).where(ContactLead.id == lead_id))
+    if not result.rowcount:
         raise HTTPException(status_code=404, detail="Lead no encontrado")
-    db.delete(lead)
-    db.commit()
+    await commit(db)
     return {"status": "success", "msg": "Lead eliminado"}
 
 # --- GESTIÓN DE CURSOS (ACADEMIA) ---
 
 @router.get("/registrations")
-def get_registrations(db: Session = Depends(get_db)):
-    return db.query(CourseRegistration).order_by(CourseRegistration.created_at.desc()).all()
+async def get_registrations(response: Response, cursor: Optional[str] = None, limit: int = PAGE_LIMIT, fields: Optional[str] = None, db = Depends(get_async_db)):
+    stmt = select(*_projection(CourseRegistration, REGISTRATION_FIELDS, fields))
+    return [row._asdict() for row in await _page(db, response, stmt, CourseRegistration.created_at, CourseRegistration.id, cursor, limit)]
 
 @router.delete("/registrations/{reg_id}")
-def delete_registration(reg_id: str, db: Session = Depends(get_db)):
-    reg = db.query(CourseRegistration).filter(CourseRegistration.id == reg_id).first()
-    if not reg:
+async def delete_registration(reg_id: str, db = Depends(get_async_db)):
+    result = await execute(db, delete(CourseRegistration).where(CourseRegistration.id == reg_id))
+    if not result.rowcount:
         raise HTTPException(status_code=404, detail="Inscripción no encontrada")
-    db.delete(reg)
-    db.commit()
+    await commit(db)
     return {"status": "success", "msg": "Inscripción eliminada"}
 
 # --- ENDPOINTS EXISTENTES ---
 
 @router.get("/sessions")
-def get_sessions(db: Session = Depends(get_db)):
-    sessions = db.query(InteractionLog.session_id, func.count(InteractionLog.id).label('message_count'), func.max(InteractionLog.created_at).label('last_activity')).group_by(InteractionLog.session_id).order_by(desc('last_activity')).limit(50).all()
-    return [{"session_id": s.session_id, "message_count": s.message_count, "last_activity": s.last_activity.isoformat()} for s in sessions]
+async def get_sessions(response: Response, cursor: Optional[str] = None, limit: int = PAGE_LIMIT, db = Depends(get_async_db)):
+    # session_activity (rollup del escritor de logs): sin GROUP BY sobre interaction_logs.
+    # Se pagina por first_seen (inmutable), no por last_seen: una sesión que recibe mensajes
+    # mientras se recorren las páginas no se salta ni se repite. Orden: sesiones más nuevas primero.
+    stmt = select(SessionActivity.session_id, SessionActivity.message_count, SessionActivity.first_seen, SessionActivity.last_seen)
+    sessions = await _page(db, response, stmt, SessionActivity.first_seen, SessionActivity.session_id, cursor, limit)
+    return [{"session_id": s.session_id, "message_count": s.message_count, "last_activity": s.last_seen.isoformat()} for s in sessions]
 
 @router.get("/session/{session_id}")
-def get_session_history(session_id: str, db: Session = Depends(get_db)):
-    logs = db.query(InteractionLog).filter(InteractionLog.session_id == session_id).order_by(InteractionLog.created_at.asc()).all()
-    return [{"id": str(log.id), "timestamp": log.created_at.isoformat(), "user_input": log.user_input, "bot_response": log.bot_response, "metadata": {"intent": log.detected_intent, "sentiment": log.sentiment_label, "score": log.sentiment_score, "steps": json.loads(log.execution_steps) if log.execution_steps else []}} for log in logs]
+async def get_session_history(session_id: str, response: Response, cursor: Optional[str] = None, limit: int = PAGE_LIMIT, steps: bool = True, db = Depends(get_async_db)):
+    # ?steps=false no lee ni decodifica execution_steps (la traza es lo más pesado de cada fila)
+    columns = [InteractionLog.id, InteractionLog.created_at, InteractionLog.user_input, InteractionLog.bot_response,
+               InteractionLog.detected_intent, InteractionLog.sentiment_label, InteractionLog.sentiment_score]
+    if steps:
+        columns.append(InteractionLog.execution_steps)
+    stmt = select(*columns).where(InteractionLog.session_id == session_id)
+    logs = await _page(db, response, stmt, InteractionLog.created_at, InteractionLog.id, cursor, limit, descending=False)
+
+    def _message(log):
+        metadata = {"intent": log.detected_intent, "sentiment": log.sentiment_label, "score": log.sentiment_score}
+        if steps:
+            metadata["steps"] = json.loads(log.execution_steps) if log.execution_steps else []
+        return {"id": str(log.id), "timestamp": log.created_at.isoformat(), "user_input": log.user_input, "bot_response": log.bot_response, "metadata": metadata}
+    return [_message(log) for log in logs]
 
 @router.get("/profiles")
-def get_user_profiles(db: Session = Depends(get_db)):
-    profiles = db.query(UserTaxonomy).all()
+async def get_user_profiles(db = Depends(get_async_db)):
+    profiles = (await execute(db, select(UserTaxonomy))).scalars().all()
     if not profiles:
         return [
             {"code": "INVERSIONISTA", "description": "Busca oportunidades de negocio", "examples": "Quiero invertir"},
@@ -84,4 +193,22 @@ def get_user_profiles(db: Session = Depends(get_db)):
             {"code": "GOBIERNO", "description": "Regulación y servicios", "examples": "Trámites"},
             {"code": "GENERAL", "description": "Ciudadanía", "examples": "¿Qué es el CIAY?"}
         ]
-    return [{"code": p.code, "description": p.description, "examples": p.examples} for p in profiles]
\ No newline at end of file
+    return [{"code": p.code, "description": p.description, "examples": p.examples} for p in profiles]
+
+# --- SALUD DEL SISTEMA ---
+
+@router.get("/system/log-writer")
+def get_log_writer_metrics():
+    return log_writer.metrics()
+
+@router.get("/system/memory")
+def get_memory_metrics():
+    return conversation_memory.metrics()
+
+@router.get("/system/websocket")
+def get_websocket_metrics():
+    return {**manager.metrics(), "bus": event_bus.metrics()}
+
+@router.get("/system/db-pool")
+def get_db_pool_metrics():
+    return pool_metrics()
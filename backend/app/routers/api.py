@@ -1,5 +1,6 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Header, Response
 from sqlalchemy.orm import Session
+from typing import Optional
 from app.database import get_db
 from app.schemas.chat import GraphData
 from app.services.graph_service import graph_service
@@ -7,5 +8,15 @@ from app.services.graph_service import graph_service
 router = APIRouter()
 
 @router.get("/graph", response_model=GraphData)
-def graph_endpoint(db: Session = Depends(get_db)):
-    return graph_service.get_topology(db)
\ No newline at end of file
+def graph_endpoint(
+    node: Optional[str] = None,
+    depth: Optional[int] = None,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    # ?node=CIAY&depth=2 devuelve solo el vecindario del nodo (grafos grandes)
+    etag, body = graph_service.get_topology_payload(db, node, depth)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
\ No newline at end of file
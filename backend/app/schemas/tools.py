@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field
 from typing import Literal, Optional
+import json
 
 # --- SUB-MODELOS DE DATOS (PAYLOAD) ---
 
@@ -25,4 +26,35 @@ class RegisterCourseTool(BaseModel):
     action: Literal["register_course"]
     data: CourseData
 
-#
\ No newline at end of file
+# --- ESQUEMAS PRECALCULADOS (una vez al importar) ---
+
+TOOL_MODELS = {
+    "save_contact": SaveContactTool,
+    "register_course": RegisterCourseTool,
+}
+
+# Modo "prompt": esquema pegado en el system prompt
+TOOLS_PROMPT_SCHEMA = json.dumps({
+    "oneOf": [model.model_json_schema() for model in TOOL_MODELS.values()]
+}, indent=2)
+
+# Modo "native": parámetro `tools` de la API compatible con OpenAI.
+# Los argumentos de cada función son el payload `data` de la acción.
+NATIVE_TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "save_contact",
+            "description": "Guarda los datos de contacto de un usuario interesado en el CIAY.",
+            "parameters": ContactData.model_json_schema(),
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "register_course",
+            "description": "Inscribe a un estudiante en un curso del CIAY.",
+            "parameters": CourseData.model_json_schema(),
+        },
+    },
+]
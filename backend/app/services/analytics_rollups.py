@@ -0,0 +1,149 @@
+from sqlalchemy import func, literal_column, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from app.models.knowledge import AnalyticsHourly, AnalyticsIntentHourly, SessionActivity
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List
+
+# Rollups incrementales de interaction_logs para el dashboard:
+#   analytics_hourly         interacciones, sesiones nuevas, tokens y latencia por hora (UTC)
+#   analytics_intent_hourly  interacciones por intención y hora
+#   session_activity         primera/última actividad por sesión (define "sesión nueva")
+# Se actualizan en la misma transacción que cada lote del escritor de logs.
+
+UNKNOWN_INTENT = "Desconocido"
+BACKFILL_LOCK_KEY = 727002
+
+
+def hour_bucket(moment: datetime) -> datetime:
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def apply_rollups(db: Session, rows: List[dict]):
+    """Suma un lote de logs a los rollups. Claves ordenadas para evitar deadlocks entre workers."""
+    if not rows: return
+    now = datetime.now(timezone.utc)
+    interactions: Counter = Counter()
+    tokens: Counter = Counter()
+    latency_sum: Counter = Counter()
+    latency_count: Counter = Counter()
+    by_intent: Counter = Counter()
+    sessions: Dict[str, dict] = {}
+
+    for row in rows:
+        created = row.get("created_at") or now
+        hour = hour_bucket(created)
+        interactions[hour] += 1
+        tokens[hour] += (row.get("prompt_tokens") or 0) + (row.get("completion_tokens") or 0)
+        if row.get("total_ms") is not None:
+            latency_sum[hour] += row["total_ms"]
+            latency_count[hour] += 1
+        by_intent[(hour, row.get("detected_intent") or UNKNOWN_INTENT)] += 1
+        session_id = row.get("session_id")
+        if session_id:
+            entry = sessions.setdefault(session_id, {"session_id": session_id, "first_seen": created, "last_seen": created, "message_count": 0})
+            entry["first_seen"] = min(entry["first_seen"], created)
+            entry["last_seen"] = max(entry["last_seen"], created)
+            entry["message_count"] += 1
+
+    # Sesiones: xmax = 0 en RETURNING indica que la fila se insertó (sesión nueva)
+    new_sessions: Counter = Counter()
+    if sessions:
+        stmt = pg_insert(SessionActivity).values([sessions[key] for key in sorted(sessions)])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["session_id"],
+            set_={
+                "last_seen": func.greatest(SessionActivity.last_seen, stmt.excluded.last_seen),
+                "message_count": SessionActivity.message_count + stmt.excluded.message_count,
+            },
+        ).returning(SessionActivity.first_seen, literal_column("(xmax = 0)").label("inserted"))
+        for first_seen, inserted in db.execute(stmt):
+            if inserted:
+                new_sessions[hour_bucket(first_seen)] += 1
+
+    hours = sorted(set(interactions) | set(new_sessions))
+    stmt = pg_insert(AnalyticsHourly).values([
+        {
+            "hour": hour, "interactions": interactions[hour], "new_sessions": new_sessions[hour],
+            "tokens": tokens[hour], "latency_ms_sum": latency_sum[hour], "latency_count": latency_count[hour],
+        }
+        for hour in hours
+    ])
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["hour"],
+        set_={
+            column: getattr(AnalyticsHourly, column) + getattr(stmt.excluded, column)
+            for column in ("interactions", "new_sessions", "tokens", "latency_ms_sum", "latency_count")
+        },
+    ))
+
+    stmt = pg_insert(AnalyticsIntentHourly).values([
+        {"hour": hour, "intent": intent, "interactions": count} for (hour, intent), count in sorted(by_intent.items())
+    ])
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["hour", "intent"],
+        set_={"interactions": AnalyticsIntentHourly.interactions + stmt.excluded.interactions},
+    ))
+
+
+BACKFILL_SQL = [
+    """
+    INSERT INTO session_activity (session_id, first_seen, last_seen, message_count)
+    SELECT session_id, min(created_at), max(created_at), count(*)
+    FROM interaction_logs WHERE session_id IS NOT NULL AND created_at IS NOT NULL
+    GROUP BY session_id
+    ON CONFLICT (session_id) DO NOTHING
+    """,
+    """
+    INSERT INTO analytics_hourly (hour, interactions, new_sessions, tokens, latency_ms_sum, latency_count)
+    SELECT date_trunc('hour', created_at AT TIME ZONE 'UTC') AT TIME ZONE 'UTC', count(*), 0,
+           coalesce(sum(coalesce(prompt_tokens, 0) + coalesce(completion_tokens, 0)), 0),
+           coalesce(sum(total_ms), 0), count(total_ms)
+    FROM interaction_logs WHERE created_at IS NOT NULL
+    GROUP BY 1
+    ON CONFLICT (hour) DO NOTHING
+    """,
+    """
+    INSERT INTO analytics_hourly (hour, interactions, new_sessions)
+    SELECT date_trunc('hour', first_seen AT TIME ZONE 'UTC') AT TIME ZONE 'UTC', 0, count(*)
+    FROM session_activity
+    GROUP BY 1
+    ON CONFLICT (hour) DO UPDATE SET new_sessions = EXCLUDED.new_sessions
+    """,
+    """
+    INSERT INTO analytics_intent_hourly (hour, intent, interactions)
+    SELECT date_trunc('hour', created_at AT TIME ZONE 'UTC') AT TIME ZONE 'UTC',
+           COALESCE(detected_intent, 'Desconocido'), count(*)
+    FROM interaction_logs WHERE created_at IS NOT NULL
+    GROUP BY 1, 2
+    ON CONFLICT (hour, intent) DO NOTHING
+    """,
+]
+
+
+def backfill_rollups(db: Session) -> bool:
+    """
+    Una sola vez: si los rollups están vacíos y ya hay logs (bases existentes),
+    se reconstruyen desde interaction_logs. Devuelve True si hubo backfill.
+    """
+    lock_conn = db.get_bind().connect()
+    lock_conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": BACKFILL_LOCK_KEY})
+    try:
+        if db.execute(select(AnalyticsHourly.hour).limit(1)).first() is not None:
+            return False
+        if db.execute(text("SELECT 1 FROM interaction_logs LIMIT 1")).first() is None:
+            return False
+        for statement in BACKFILL_SQL:
+            db.execute(text(statement))
+        db.commit()
+        print("📊 [ANALYTICS] Rollups reconstruidos desde interaction_logs")
+        return True
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": BACKFILL_LOCK_KEY})
+        lock_conn.close()
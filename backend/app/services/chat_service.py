@@ -1,178 +1,310 @@
-from sqlalchemy.orm import Session
 from app.services.rag_service import rag_service
 from app.services.graph_service import graph_service
 from app.services.tools_service import tools_service
+from app.services.llm_client import llm_client
+from app.services.intent_classifier import intent_classifier
+from app.services.response_cache import response_cache, scope_key
+from app.services.log_writer import log_writer
+from app.services.prompt_builder import PromptBuilder, estimate_tokens
+from app.services.conversation_memory import conversation_memory
 from app.utils.websocket import manager
-from app.models.knowledge import InteractionLog
-from app.database import SessionLocal
+from app.utils.tool_stream import ToolCallStreamParser
 from app.core.config import settings
-from app.schemas.tools import SaveContactTool, RegisterCourseTool
+from app.database import AsyncSessionLocal, session_scope
+from app.schemas.tools import TOOL_MODELS, NATIVE_TOOLS
 import json
 import time
 import asyncio
-import threading
-import httpx
-import re
+from datetime import datetime, timezone
 from pydantic import ValidationError
 
+# Intenciones que pueden disparar una herramienta (contacto / inscripción)
+TOOL_INTENTS = ("CONTACTO", "INVERSIONISTA", "ESTUDIANTE", "STARTUP")
+
+def _elapsed_ms(since: float) -> float:
+    return round((time.perf_counter() - since) * 1000, 1)
+
+async def _timed(awaitable, timings: dict, key: str):
+    """Espera `awaitable` y guarda su duración en timings[key] (ms)."""
+    start = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        timings[key] = _elapsed_ms(start)
+
 class ChatService:
     def __init__(self):
-        self.api_key = settings.DEEPSEEK_API_KEY
-        self.base_url = settings.DEEPSEEK_BASE_URL
         self.base_prompt = self._load_system_prompt()
+        self.prompt_builder = PromptBuilder(self.base_prompt)
 
     def _load_system_prompt(self) -> str:
         try:
             with open("data/system_prompt.txt", "r", encoding="utf-8") as f: return f.read()
         except: return "Eres el asistente del CIAY."
 
-    def _get_tools_schema(self):
-        return json.dumps({
-            "oneOf": [
-                SaveContactTool.model_json_schema(),
-                RegisterCourseTool.model_json_schema()
-            ]
-        }, indent=2)
-
     async def _classify_intent_semantically(self, message: str):
+        # Camino rápido: clasificador local en microsegundos; el LLM solo si no hay confianza
+        local = intent_classifier.classify(message)
+        if intent_classifier.is_confident(local, settings.INTENT_LOCAL_THRESHOLD):
+            return local
+
         classification_prompt = [
             {"role": "system", "content": "Eres el Clasificador Semántico. Categorías: INVERSIONISTA, ESTUDIANTE, GOBIERNO, STARTUP, GENERAL, CONTACTO. JSON: {'intent': 'CATEGORIA', 'confidence': 0.95}"},
             {"role": "user", "content": message}
         ]
         try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                response = await client.post(
-                    f"{self.base_url}/chat/completions",
-                    headers={"Authorization": f"Bearer {self.api_key}"},
-                    json={"model": "deepseek-chat", "messages": classification_prompt, "response_format": { "type": "json_object" }}
-                )
-                if response.status_code == 200:
-                    return json.loads(response.json()['choices'][0]['message']['content'])
+            response = await llm_client.complete(
+                {"model": "deepseek-chat", "messages": classification_prompt, "response_format": { "type": "json_object" }},
+                timeout=settings.LLM_CLASSIFY_TIMEOUT
+            )
+            if response.status_code == 200:
+                return json.loads(response.json()['choices'][0]['message']['content'])
         except: pass
-        return {"intent": "GENERAL", "confidence": 0.5}
+        return local or {"intent": "GENERAL", "confidence": 0.5}
+
+    async def _stream_completion(self, message: str, sys_prompt: str, history: list, native_tools: bool, log_step, turn: dict):
+        """Stream del LLM + validación/ejecución de herramienta. El resultado queda en `turn`."""
+        messages = [
+            {"role": "system", "content": sys_prompt},
+            *history,
+            {"role": "user", "content": message}
+        ]
+
+        prompt_tokens = estimate_tokens(sys_prompt) + estimate_tokens(message)
+        await log_step("[LLM]", "Inferencia Estructurada...", "running", {"model": "deepseek-chat", "prompt_tokens_est": prompt_tokens})
+
+        payload = {"model": "deepseek-chat", "messages": messages, "stream": True, "temperature": 0.1}
+        if settings.LLM_STREAM_USAGE:
+            payload["stream_options"] = {"include_usage": True}
+        if native_tools:
+            payload["tools"] = NATIVE_TOOLS
 
-    def _save_log_background(self, log_data):
-        db = SessionLocal()
+        parser = ToolCallStreamParser()
+        native_calls = {}  # index -> {"name", "arguments"} armados desde los deltas
+        validated = []
+        start = time.perf_counter()
         try:
-            log_entry = InteractionLog(**log_data)
-            db.add(log_entry)
-            db.commit()
-        except Exception as e: print(f"Error saving log: {e}")
-        finally: db.close()
+            async with llm_client.stream(payload, timeout=settings.LLM_STREAM_TIMEOUT) as response:
+                async for chunk in response.aiter_lines():
+                    if chunk.startswith("data: "):
+                        data_str = chunk.replace("data: ", "")
+                        if data_str == "[DONE]": break
+                        try:
+                            event = json.loads(data_str)
+                        except: continue
+                        # Con include_usage el último chunk trae `usage` y `choices` vacío
+                        if event.get('usage'):
+                            turn["usage"] = event['usage']
+                        try:
+                            delta = event['choices'][0]['delta']
+                        except: continue
+                        if "llm_ttft_ms" not in turn and (delta.get('content') or delta.get('tool_calls')):
+                            turn["llm_ttft_ms"] = _elapsed_ms(start)
 
-    async def stream_process_message(self, db: Session, message: str, session_id: str = "default"):
+                        # Function calling nativo: nombre y argumentos llegan en fragmentos
+                        for call in delta.get('tool_calls') or []:
+                            entry = native_calls.setdefault(call.get('index', 0), {"name": "", "arguments": []})
+                            function = call.get('function') or {}
+                            if function.get('name'): entry["name"] = function['name']
+                            if function.get('arguments'): entry["arguments"].append(function['arguments'])
+
+                        content = delta.get('content')
+                        if not content: continue
+
+                        # --- CORTE LIMPIO: el texto desde "@@" no llega al frontend ---
+                        was_open = parser.state == parser.TOOL
+                        visible = parser.feed(content)
+                        if visible:
+                            yield visible
+                        # El bloque se valida en cuanto aparece el "@@" de cierre
+                        if was_open and parser.state == parser.DONE and parser.tool_json:
+                            validated.append(await self._validate_tool_call(parser.tool_json, log_step))
+
+                tail = parser.flush()
+                if tail:
+                    yield tail
+            turn["stream_ms"] = _elapsed_ms(start)
+
+            for _, call in sorted(native_calls.items()):
+                validated.append(await self._validate_tool_call("".join(call["arguments"]), log_step, action=call["name"]))
+
+            # --- EJECUCIÓN DE HERRAMIENTA ---
+            if parser.tool_json or native_calls:
+                turn["tool_call"] = True
+                tool_start = time.perf_counter()
+                for action, validated_payload in filter(None, validated):
+                    if AsyncSessionLocal is not None:
+                        result = await tools_service.ahandle_tool_call(action, validated_payload)
+                    else:
+                        result = await asyncio.to_thread(tools_service.handle_tool_call, action, validated_payload)
+                    await log_step("[TOOL_EXEC]", result.get("msg"), "success", result)
+
+                    yield f"\n\n✅ {result.get('msg')}"
+                turn["tool_ms"] = _elapsed_ms(tool_start)
+
+        except Exception as e:
+            turn["error"] = True
+            yield f"Error: {str(e)}"
+        finally:
+            turn["response"] = parser.text
+            turn["sentinel"] = parser.sentinel_seen
+
+    async def _validate_tool_call(self, json_str: str, log_step, action: str = None):
+        """
+        Devuelve (action, payload validado) o None.
+        En modo nativo `json_str` son solo los argumentos (el `data`) y la acción es el nombre de la función.
+        """
+        await log_step("[VALIDATOR]", "Validando estructura...", "running")
+        try:
+            raw_data = json.loads(json_str)
+            if action is not None:
+                raw_data = {"action": action, "data": raw_data}
+            action = raw_data.get("action")
+
+            # Validación Pydantic
+            validated_payload = None
+            tool_model = TOOL_MODELS.get(action)
+            if tool_model is not None:
+                validated_payload = tool_model(**raw_data).data.dict()
+
+            if validated_payload:
+                await log_step("[VALIDATOR]", "Schema Correcto", "success", validated_payload)
+                return action, validated_payload
+            print("❌ [DEBUG] Acción no reconocida")
+
+        except ValidationError as ve:
+            print(f"❌ [DEBUG] Error Pydantic: {ve}")
+            await log_step("[VALIDATOR]", "Error de formato en datos", "failed")
+        except json.JSONDecodeError:
+            await log_step("[VALIDATOR]", "JSON Inválido", "failed")
+        return None
+
+    def _search_scoped(self, message: str):
+        with session_scope() as db:
+            return rag_service.search(db, message, settings.RAG_CONTEXT_PASSAGES)
+
+    async def _retrieve(self, message: str):
+        # La conexión se toma solo durante la consulta, nunca durante el stream del LLM.
+        # Con asyncpg la consulta no bloquea el loop; si no, el search síncrono va a un hilo.
+        if AsyncSessionLocal is not None:
+            async with AsyncSessionLocal() as adb:
+                return await rag_service.asearch(adb, message, settings.RAG_CONTEXT_PASSAGES)
+        return await asyncio.to_thread(self._search_scoped, message)
+
+    async def stream_process_message(self, message: str, session_id: str = "default"):
         logs = []
+        shown = []
         full_response = ""
+        started = time.perf_counter()
+        # Tiempos del turno en ms (None si la etapa no ocurrió: caché, sin herramienta...).
+        # ttft_ms: desde que llegó el mensaje hasta el primer texto visible (lo que espera el usuario);
+        # llm_ttft_ms: solo la latencia del proveedor, desde que se abre el stream.
+        timings = dict.fromkeys(("classify_ms", "retrieve_ms", "ttft_ms", "llm_ttft_ms", "stream_ms", "tool_ms", "total_ms"))
+        usage = {}
         
         async def log_step(step, detail, status="done", data=None):
             entry = {"step": step, "detail": detail, "status": status, "timestamp": time.time(), "data": data}
             logs.append(entry)
-            await manager.broadcast_log(step, detail, status, data)
+            await manager.broadcast_log(step, detail, status, data, session_id=session_id)
 
         await log_step("[KERNEL]", f"Sesión: {session_id[:6]}", "success")
         
-        classification = await self._classify_intent_semantically(message)
-        intent = classification.get("intent", "GENERAL")
-        await log_step("[SEMANTIC]", f"Intención: {intent}", "success", classification)
-        await graph_service.boost_node_dynamic(intent)
-        
-        context_items = rag_service.search(db, message)
-        context_text = "\n".join([f"- {item.content}" for item in context_items])
-        
-        tools_schema = self._get_tools_schema()
-        
-        sys_prompt = f"{self.base_prompt}\n\nCONTEXTO RAG:\n{context_text}"
-        
-        if intent in ["CONTACTO", "INVERSIONISTA", "ESTUDIANTE", "STARTUP"]:
-            sys_prompt += f"""
-            
-            IMPORTANTE: Si tienes los datos necesarios, GENERA EL JSON AL FINAL.
-            Usa este esquema EXACTO:
-            {tools_schema}
-            
-            Envuelve el JSON así:
-            @@TOOL_CALL: <JSON_AQUI> @@
-            """
+        async def publish_intent(classification):
+            intent = classification.get("intent", "GENERAL")
+            await log_step("[SEMANTIC]", f"Intención: {intent}", "success", classification)
+            await graph_service.boost_node_dynamic(intent)
+            return intent
 
-        messages = [
-            {"role": "system", "content": sys_prompt},
-            {"role": "user", "content": message}
-        ]
+        # --- PIPELINE: clasificación (LLM) y recuperación (RAG) en paralelo ---
+        mode = settings.CHAT_PIPELINE_MODE
+        classify_task = asyncio.create_task(_timed(self._classify_intent_semantically(message), timings, "classify_ms"))
+        publish_task = None
 
-        await log_step("[LLM]", "Inferencia Estructurada...", "running", {"model": "deepseek-chat"})
+        async def publish_when_classified():
+            return await publish_intent(await classify_task)
 
         try:
-            async with httpx.AsyncClient(timeout=45.0) as client:
-                async with client.stream("POST", f"{self.base_url}/chat/completions", 
-                    headers={"Authorization": f"Bearer {self.api_key}"},
-                    json={"model": "deepseek-chat", "messages": messages, "stream": True, "temperature": 0.1} 
-                ) as response:
-                    async for chunk in response.aiter_lines():
-                        if chunk.startswith("data: "):
-                            data_str = chunk.replace("data: ", "")
-                            if data_str == "[DONE]": break
-                            try:
-                                content = json.loads(data_str)['choices'][0]['delta'].get('content', '')
-                                if content:
-                                    full_response += content
-                                    
-                                    # --- FIX DE STREAMING: CORTE LIMPIO ---
-                                    # Si detectamos que empieza el bloque de herramienta (@@), 
-                                    # dejamos de enviar texto al frontend inmediatamente.
-                                    # El resto se acumula en full_response para procesarse abajo.
-                                    if "@@" in full_response:
-                                        continue
-                                    
-                                    yield content
-                            except: pass
-                            
-            # --- PROCESAMIENTO DE HERRAMIENTA ---
-            tool_match = re.search(r"@@TOOL_CALL:\s*({.*?})\s*@@", full_response, re.DOTALL)
-            
-            if tool_match:
-                json_str = tool_match.group(1)
-                await log_step("[VALIDATOR]", "Validando estructura...", "running")
-                
-                try:
-                    raw_data = json.loads(json_str)
-                    action = raw_data.get("action")
-                    
-                    # Validación Pydantic
-                    validated_payload = None
-                    if action == "save_contact":
-                        model = SaveContactTool(**raw_data)
-                        validated_payload = model.data.dict()
-                    elif action == "register_course":
-                        model = RegisterCourseTool(**raw_data)
-                        validated_payload = model.data.dict()
-                    
-                    if validated_payload:
-                        await log_step("[VALIDATOR]", "Schema Correcto", "success", validated_payload)
-                        
-                        # Ejecución
-                        result = tools_service.handle_tool_call(action, validated_payload)
-                        await log_step("[TOOL_EXEC]", result.get("msg"), "success", result)
-                        
-                        yield f"\n\n✅ {result.get('msg')}"
-                    else:
-                        print("❌ [DEBUG] Acción no reconocida")
+            if mode == "sequential":
+                await asyncio.wait([classify_task])
 
-                except ValidationError as ve:
-                    print(f"❌ [DEBUG] Error Pydantic: {ve}")
-                    await log_step("[VALIDATOR]", "Error de formato en datos", "failed")
-                except json.JSONDecodeError:
-                    await log_step("[VALIDATOR]", "JSON Inválido", "failed")
+            # Recuperación sin bloquear el event loop; el historial (memoria en proceso) se obtiene a la vez.
+            context_items, history = await asyncio.gather(
+                _timed(self._retrieve(message), timings, "retrieve_ms"),
+                conversation_memory.get_messages(session_id),
+            )
 
-        except Exception as e:
-            yield f"Error: {str(e)}"
+            if mode == "speculative":
+                # No se espera al clasificador: el stream arranca ya con las instrucciones de
+                # herramientas adjuntas y la intención (log + calor del grafo) se publica en
+                # cuanto termina la clasificación, en paralelo al stream.
+                classification, intent = None, None
+                attach_tools = True
+                publish_task = asyncio.create_task(publish_when_classified())
+            else:
+                classification = await classify_task
+                intent = await publish_intent(classification)
+                attach_tools = intent in TOOL_INTENTS
+
+            # --- PROMPT: prefijo estático cacheado + pasajes RAG dentro del presupuesto de la intención ---
+            tool_mode = settings.LLM_TOOL_MODE if attach_tools else None
+            sys_prompt, context_items = self.prompt_builder.build(context_items, tool_mode, intent)
+
+            # --- CACHÉ: preguntas repetidas con el mismo contexto no llegan al LLM ---
+            # El alcance (herramientas, intención, hash del historial) es parte de la clave:
+            # con historial solo acierta una conversación idéntica hasta este turno.
+            use_cache = settings.RESPONSE_CACHE_ENABLED
+            context_ids = [item.id for item in context_items]
+            cache_scope = scope_key(tool_mode, intent, history)
+            cached = response_cache.get(message, context_ids, cache_scope) if use_cache else None
+
+            if cached is not None:
+                await log_step("[CACHE]", f"Respuesta desde caché ({cached.match})", "success", {"match": cached.match, "score": cached.score})
+                full_response = cached.response
+                async for piece in response_cache.replay(cached.response):
+                    if timings["ttft_ms"] is None:
+                        timings["ttft_ms"] = _elapsed_ms(started)
+                    shown.append(piece)
+                    yield piece
+            else:
+                turn = {"response": "", "tool_call": False, "error": False, "sentinel": False}
+                async for piece in self._stream_completion(message, sys_prompt, history, tool_mode == "native", log_step, turn):
+                    if timings["ttft_ms"] is None:
+                        timings["ttft_ms"] = _elapsed_ms(started)
+                    shown.append(piece)
+                    yield piece
+                full_response = turn["response"]
+                timings.update({key: turn[key] for key in ("llm_ttft_ms", "stream_ms", "tool_ms") if key in turn})
+                usage = turn.get("usage") or {}
+                # Los turnos con herramienta (efectos secundarios) nunca se cachean
+                if use_cache and not turn["tool_call"] and not turn["error"] and not turn["sentinel"]:
+                    response_cache.put(message, context_ids, full_response, cache_scope)
+
+            if publish_task is not None:
+                intent = await publish_task
+                classification = classify_task.result()
+
+            timings["total_ms"] = _elapsed_ms(started)
+        finally:
+            # Cliente desconectado a mitad del stream: no dejar la clasificación (ni su llamada al LLM) colgando
+            for task in (classify_task, publish_task):
+                if task is not None and not task.done():
+                    task.cancel()
+
+        # La memoria guarda lo que vio el usuario (sin el bloque @@TOOL_CALL)
+        await conversation_memory.append(session_id, message, "".join(shown))
 
-        threading.Thread(target=self._save_log_background, args=({
+        await log_writer.submit({
             "session_id": session_id,
             "user_input": message,
             "bot_response": full_response,
             "detected_intent": intent,
             "execution_steps": json.dumps(logs),
-            "sentiment_score": classification.get("confidence", 0.0)
-        },)).start()
+            "sentiment_score": classification.get("confidence", 0.0),
+            **timings,
+            "prompt_tokens": usage.get("prompt_tokens"),
+            "completion_tokens": usage.get("completion_tokens"),
+            # Marca de tiempo del turno (no del lote): ordena el historial de la sesión
+            "created_at": datetime.now(timezone.utc)
+        })
 
 chat_service = ChatService()
\ No newline at end of file
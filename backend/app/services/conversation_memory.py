@@ -0,0 +1,204 @@
+from app.core.config import settings
+from app.database import session_scope
+from app.models.knowledge import InteractionLog
+from app.services.llm_client import llm_client
+from app.services.prompt_builder import estimate_tokens
+from app.services.event_bus import event_bus
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Deque, List, Optional
+import asyncio
+import time
+import uuid
+
+# Memoria de conversación por session_id, en proceso.
+#   - LRU con TTL: las sesiones inactivas se expulsan solas.
+#   - Ventana móvil acotada por tokens; los turnos que salen de la ventana se
+#     resumen en segundo plano con el LLM y el resumen se antepone al historial.
+#   - Si la sesión no está en memoria (reinicio, expulsión) se recupera UNA vez
+#     desde interaction_logs; nunca se consulta la tabla en cada turno.
+#   - Sin session_id propio ("default") no hay memoria: ese id lo comparten todos
+#     los clientes que no envían uno y el resumen conserva nombres y correos.
+#   - Con varios workers, cada turno invalida la copia de la sesión en los demás
+#     (bus "memory"); el siguiente turno allí la recupera desde interaction_logs.
+#     El log se escribe por lotes (LOG_WRITER_FLUSH_INTERVAL): un mensaje que llegue
+#     a otro worker antes de ese intervalo no ve el último turno. Sticky sessions
+#     en el balanceador evitan ese caso.
+
+SUMMARY_PROMPT = (
+    "Resume en español, en máximo 5 líneas, la conversación entre un usuario y el asistente del CIAY. "
+    "Conserva nombres, correos, cursos e intereses mencionados. Si hay un resumen previo, intégralo."
+)
+
+# Ids que no identifican a un usuario: nunca tienen memoria
+SHARED_SESSION_IDS = {"", "default"}
+
+
+def has_own_session(session_id: Optional[str]) -> bool:
+    return bool(session_id) and session_id not in SHARED_SESSION_IDS
+
+
+@dataclass
+class Turn:
+    user: str
+    assistant: str
+    tokens: int
+
+
+@dataclass
+class SessionHistory:
+    turns: Deque[Turn] = field(default_factory=deque)
+    summary: str = ""
+    tokens: int = 0
+    last_access: float = field(default_factory=time.monotonic)
+    summarizing: Optional[asyncio.Task] = None
+
+
+class ConversationMemory:
+    def __init__(self):
+        self.sessions: "OrderedDict[str, SessionHistory]" = OrderedDict()
+        self._recovering = {}
+        self.worker = uuid.uuid4().hex[:12]
+        self.invalidations = 0
+
+    def _expire(self, now: float):
+        # Las más antiguas están al inicio (orden LRU)
+        while self.sessions:
+            key, history = next(iter(self.sessions.items()))
+            if now - history.last_access <= settings.MEMORY_TTL and len(self.sessions) <= settings.MEMORY_MAX_SESSIONS:
+                break
+            self.sessions.popitem(last=False)
+            if history.summarizing and not history.summarizing.done():
+                history.summarizing.cancel()
+
+    def _touch(self, session_id: str, history: SessionHistory):
+        history.last_access = time.monotonic()
+        self.sessions[session_id] = history
+        self.sessions.move_to_end(session_id)
+        self._expire(history.last_access)
+
+    # --- RECUPERACIÓN ---
+
+    def _load_recent_turns(self, session_id: str) -> List[Turn]:
+        with session_scope() as db:
+            rows = (
+                db.query(InteractionLog.user_input, InteractionLog.bot_response)
+                .filter(InteractionLog.session_id == session_id)
+                .order_by(InteractionLog.created_at.desc())
+                .limit(settings.MEMORY_RECOVER_TURNS)
+                .all()
+            )
+        return [self._turn(user or "", bot or "") for user, bot in reversed(rows)]
+
+    async def _recover(self, session_id: str) -> SessionHistory:
+        history = SessionHistory()
+        if settings.MEMORY_RECOVER_FROM_LOGS:
+            try:
+                evicted = []
+                for turn in await asyncio.to_thread(self._load_recent_turns, session_id):
+                    evicted += self._add(history, turn)
+                if evicted and settings.MEMORY_SUMMARY_ENABLED:
+                    history.summarizing = asyncio.create_task(self._summarize(history, evicted, None))
+            except Exception as e:
+                print(f"⚠️ [MEMORY] No se pudo recuperar la sesión {session_id[:6]}: {e}")
+        return history
+
+    async def _get(self, session_id: str) -> SessionHistory:
+        history = self.sessions.get(session_id)
+        if history is not None and time.monotonic() - history.last_access <= settings.MEMORY_TTL:
+            self._touch(session_id, history)
+            return history
+
+        # Una sola recuperación por sesión aunque lleguen mensajes concurrentes
+        pending = self._recovering.get(session_id)
+        if pending is None:
+            pending = self._recovering[session_id] = asyncio.ensure_future(self._recover(session_id))
+        try:
+            history = await asyncio.shield(pending)
+        finally:
+            self._recovering.pop(session_id, None)
+        self._touch(session_id, history)
+        return history
+
+    # --- VENTANA ---
+
+    @staticmethod
+    def _turn(user: str, assistant: str) -> Turn:
+        return Turn(user, assistant, estimate_tokens(user) + estimate_tokens(assistant))
+
+    def _add(self, history: SessionHistory, turn: Turn) -> List[Turn]:
+        """Agrega el turno y devuelve los turnos que salieron de la ventana."""
+        history.turns.append(turn)
+        history.tokens += turn.tokens
+        evicted = []
+        while len(history.turns) > 1 and history.tokens > settings.MEMORY_WINDOW_TOKENS:
+            old = history.turns.popleft()
+            history.tokens -= old.tokens
+            evicted.append(old)
+        return evicted
+
+    async def get_messages(self, session_id: str) -> List[dict]:
+        """Historial listo para la API de chat (resumen + turnos de la ventana)."""
+        if not settings.MEMORY_ENABLED or not has_own_session(session_id): return []
+        history = await self._get(session_id)
+        messages = []
+        if history.summary:
+            messages.append({"role": "system", "content": f"RESUMEN DE LA CONVERSACIÓN PREVIA:\n{history.summary}"})
+        for turn in history.turns:
+            messages.append({"role": "user", "content": turn.user})
+            messages.append({"role": "assistant", "content": turn.assistant})
+        return messages
+
+    async def append(self, session_id: str, user: str, assistant: str):
+        if not settings.MEMORY_ENABLED or not assistant or not has_own_session(session_id): return
+        history = await self._get(session_id)
+        evicted = self._add(history, self._turn(user, assistant))
+        if evicted and settings.MEMORY_SUMMARY_ENABLED:
+            previous = history.summarizing
+            history.summarizing = asyncio.create_task(self._summarize(history, evicted, previous))
+        await event_bus.publish("memory", {"session_id": session_id, "worker": self.worker})
+
+    def invalidate(self, event: dict):
+        """Handler del bus: otro worker atendió un turno de esta sesión; la copia local quedó vieja."""
+        if event.get("worker") == self.worker: return
+        history = self.sessions.pop(event.get("session_id"), None)
+        if history is None: return
+        self.invalidations += 1
+        if history.summarizing and not history.summarizing.done():
+            history.summarizing.cancel()
+
+    # --- RESUMEN EN SEGUNDO PLANO ---
+
+    async def _summarize(self, history: SessionHistory, turns: List[Turn], previous: Optional[asyncio.Task]):
+        if previous is not None and not previous.done():
+            # Encadenado: cada resumen integra el anterior
+            try: await previous
+            except Exception: pass
+
+        transcript = "\n".join(f"Usuario: {t.user}\nAsistente: {t.assistant}" for t in turns)
+        if history.summary:
+            transcript = f"Resumen previo: {history.summary}\n\n{transcript}"
+        try:
+            response = await llm_client.complete({
+                "model": "deepseek-chat",
+                "messages": [
+                    {"role": "system", "content": SUMMARY_PROMPT},
+                    {"role": "user", "content": transcript},
+                ],
+                "temperature": 0.1,
+            }, timeout=settings.MEMORY_SUMMARY_TIMEOUT)
+            if response.status_code == 200:
+                history.summary = response.json()['choices'][0]['message']['content'].strip()
+        except Exception as e:
+            print(f"⚠️ [MEMORY] Resumen no generado: {e}")
+
+    def metrics(self) -> dict:
+        return {
+            "sessions": len(self.sessions),
+            "turns": sum(len(h.turns) for h in self.sessions.values()),
+            "summarized": sum(1 for h in self.sessions.values() if h.summary),
+            "invalidations": self.invalidations,
+        }
+
+conversation_memory = ConversationMemory()
+event_bus.subscribe("memory", conversation_memory.invalidate)
@@ -0,0 +1,170 @@
+from app.core.config import settings
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, List, Optional, Union
+import asyncio
+import json
+import uuid
+
+# Bus de eventos entre workers para el dashboard en vivo (logs y calor del grafo).
+#   - "memory": dentro del proceso (un solo worker, tests).
+#   - "postgres": LISTEN/NOTIFY sobre la base que ya usamos; cada worker entrega
+#     sus propios eventos en local al instante e ignora su eco desde Postgres.
+
+Handler = Callable[[dict], Union[None, Awaitable[None]]]
+
+# NOTIFY acepta payloads de hasta 8000 bytes
+NOTIFY_MAX_BYTES = 7900
+
+
+class EventBus:
+    def __init__(self):
+        self.handlers: Dict[str, List[Handler]] = defaultdict(list)
+        self.stats = {"published": 0, "received": 0, "oversized": 0, "errors": 0}
+
+    def subscribe(self, channel: str, handler: Handler):
+        self.handlers[channel].append(handler)
+
+    async def _dispatch(self, channel: str, message: dict):
+        for handler in self.handlers.get(channel, ()):
+            try:
+                result = handler(message)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"⚠️ [BUS] Error en handler de '{channel}': {e}")
+
+    async def publish(self, channel: str, message: dict):
+        self.stats["published"] += 1
+        await self._dispatch(channel, message)
+
+    async def start(self): pass
+
+    async def stop(self): pass
+
+    def metrics(self) -> dict:
+        return {"backend": settings.EVENT_BUS_BACKEND, **self.stats}
+
+
+class InMemoryEventBus(EventBus):
+    pass
+
+
+class PostgresEventBus(EventBus):
+    def __init__(self, prefix: str = "ciay_"):
+        super().__init__()
+        self.prefix = prefix
+        self.origin = uuid.uuid4().hex[:12]
+        self._listen_conn = None
+        self._notify_conn = None
+        self._outbox: Optional[asyncio.Queue] = None
+        self._sender: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _connect(self):
+        # Conexión DBAPI dedicada (fuera del pool): LISTEN necesita una sesión fija
+        from app.database import engine
+        conn = engine.raw_connection()
+        raw = conn.driver_connection
+        conn.detach()
+        raw.autocommit = True
+        return raw
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._outbox = asyncio.Queue(maxsize=settings.EVENT_BUS_QUEUE_SIZE)
+        self._sender = asyncio.create_task(self._send_loop())
+        await self._listen()
+
+    async def _listen(self):
+        try:
+            self._listen_conn = await asyncio.to_thread(self._connect)
+            with self._listen_conn.cursor() as cur:
+                for channel in self.handlers:
+                    cur.execute(f'LISTEN "{self.prefix}{channel}"')
+            # Las notificaciones se leen en el event loop cuando el socket tiene datos
+            self._loop.add_reader(self._listen_conn.fileno(), self._on_readable)
+            print(f"📡 [BUS] Escuchando Postgres: {', '.join(self.handlers)}")
+        except Exception as e:
+            print(f"⚠️ [BUS] LISTEN no disponible, reintentando: {e}")
+            self._loop.call_later(settings.EVENT_BUS_RECONNECT_DELAY, lambda: asyncio.ensure_future(self._listen()))
+
+    def _on_readable(self):
+        try:
+            self._listen_conn.poll()
+        except Exception as e:
+            print(f"⚠️ [BUS] Conexión LISTEN perdida: {e}")
+            self._close_listener()
+            self._loop.call_later(settings.EVENT_BUS_RECONNECT_DELAY, lambda: asyncio.ensure_future(self._listen()))
+            return
+        while self._listen_conn.notifies:
+            notify = self._listen_conn.notifies.pop(0)
+            try:
+                envelope = json.loads(notify.payload)
+            except ValueError:
+                continue
+            if envelope.get("o") == self.origin: continue
+            self.stats["received"] += 1
+            asyncio.ensure_future(self._dispatch(notify.channel[len(self.prefix):], envelope.get("m", {})))
+
+    def _close_listener(self):
+        if self._listen_conn is None: return
+        try:
+            self._loop.remove_reader(self._listen_conn.fileno())
+        except Exception: pass
+        try: self._listen_conn.close()
+        except Exception: pass
+        self._listen_conn = None
+
+    async def publish(self, channel: str, message: dict):
+        # Entrega local inmediata; el resto de los workers lo recibe por NOTIFY
+        await super().publish(channel, message)
+        payload = json.dumps({"o": self.origin, "m": message}, default=str)
+        if len(payload.encode("utf-8")) > NOTIFY_MAX_BYTES:
+            self.stats["oversized"] += 1
+            return
+        if self._outbox is None: return
+        try:
+            self._outbox.put_nowait((f"{self.prefix}{channel}", payload))
+        except asyncio.QueueFull:
+            self.stats["errors"] += 1
+
+    def _notify_batch(self, batch):
+        if self._notify_conn is None or self._notify_conn.closed:
+            self._notify_conn = self._connect()
+        with self._notify_conn.cursor() as cur:
+            for channel, payload in batch:
+                cur.execute("SELECT pg_notify(%s, %s)", (channel, payload))
+
+    async def _send_loop(self):
+        while True:
+            batch = [await self._outbox.get()]
+            while not self._outbox.empty() and len(batch) < 100:
+                batch.append(self._outbox.get_nowait())
+            try:
+                await asyncio.to_thread(self._notify_batch, batch)
+            except Exception as e:
+                self.stats["errors"] += len(batch)
+                self._close_notifier()
+                print(f"⚠️ [BUS] NOTIFY falló ({len(batch)} eventos): {e}")
+
+    def _close_notifier(self):
+        if self._notify_conn is None: return
+        try: self._notify_conn.close()
+        except Exception: pass
+        self._notify_conn = None
+
+    async def stop(self):
+        if self._sender is not None:
+            self._sender.cancel()
+            self._sender = None
+        self._close_listener()
+        self._close_notifier()
+
+
+def get_event_bus() -> EventBus:
+    if settings.EVENT_BUS_BACKEND == "postgres":
+        return PostgresEventBus()
+    return InMemoryEventBus()
+
+event_bus = get_event_bus()
@@ -0,0 +1,95 @@
+from app.services.vector_index import normalize_text
+from typing import Dict, Iterable, List, Optional, Sequence
+import re
+import numpy as np
+
+# Adyacencia del grafo de conocimiento en formato CSR (NumPy) para GraphRAG:
+# la expansión k-hop es una propagación de puntajes en memoria, sin consultas por salto.
+
+
+class GraphCSR:
+    def __init__(self, nodes: List[str], indptr: np.ndarray, indices: np.ndarray, weights: np.ndarray):
+        self.nodes = nodes
+        self.index = {node: i for i, node in enumerate(nodes)}
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        # Fila de origen de cada arista (precalculada para la propagación vectorizada)
+        self._rows = np.repeat(np.arange(len(nodes)), np.diff(indptr))
+        # Pesos normalizados por nodo de origen (paseo aleatorio): un hub reparte su puntaje
+        out_weight = np.bincount(self._rows, weights=weights, minlength=len(nodes)).astype(np.float32)
+        self.transition = weights / np.maximum(out_weight[self._rows], 1e-9) if len(weights) else weights
+
+    def __len__(self):
+        return len(self.nodes)
+
+    @classmethod
+    def from_links(cls, nodes: Iterable[str], links: Sequence[dict], relation_weights: Dict[str, float],
+                   default_weight: float = 1.0) -> "GraphCSR":
+        """Aristas no dirigidas: la relación vale igual en ambos sentidos para la recuperación."""
+        nodes = list(dict.fromkeys(nodes))
+        position = {node: i for i, node in enumerate(nodes)}
+        src, dst, w = [], [], []
+        for link in links:
+            a, b = position.get(link["source"]), position.get(link["target"])
+            if a is None or b is None or a == b: continue
+            weight = relation_weights.get(link.get("relation"), default_weight)
+            src += [a, b]; dst += [b, a]; w += [weight, weight]
+
+        src = np.asarray(src, dtype=np.int64)
+        order = np.argsort(src, kind="stable")
+        indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=len(nodes)), out=indptr[1:])
+        return cls(nodes, indptr, np.asarray(dst, dtype=np.int64)[order], np.asarray(w, dtype=np.float32)[order])
+
+    def expand(self, seeds: Dict[int, float], hops: int = 2, decay: float = 0.5) -> np.ndarray:
+        """
+        Propaga los puntajes de las semillas `hops` saltos; cada salto reparte el puntaje
+        según el peso de la relación y lo multiplica por `decay`. Devuelve el acumulado por nodo.
+        """
+        current = np.zeros(len(self.nodes), dtype=np.float32)
+        for node, score in seeds.items():
+            current[node] += score
+        total = np.zeros_like(current)
+        for _ in range(hops):
+            spread = np.zeros_like(current)
+            np.add.at(spread, self.indices, current[self._rows] * self.transition)
+            current = spread * decay
+            total += current
+            if not current.any(): break
+        return total
+
+
+class NodeMentions:
+    """Qué documentos mencionan cada nodo (por nombre, sin acentos ni mayúsculas)."""
+
+    def __init__(self, graph: GraphCSR, doc_texts: Sequence[str], min_length: int = 3):
+        patterns = {
+            i: re.compile(rf"\b{re.escape(normalize_text(name))}\b")
+            for i, name in enumerate(graph.nodes) if len(name) >= min_length
+        }
+        node_docs: List[List[int]] = [[] for _ in graph.nodes]
+        self.doc_nodes: List[List[int]] = []
+        for row, text in enumerate(doc_texts):
+            text = normalize_text(text)
+            found = [node for node, pattern in patterns.items() if pattern.search(text)]
+            for node in found:
+                node_docs[node].append(row)
+            self.doc_nodes.append(found)
+        self.patterns = patterns
+        self.node_docs = [np.asarray(rows, dtype=np.int64) for rows in node_docs]
+        # IDF por nodo: un nodo mencionado en todos los documentos no discrimina nada
+        n_docs = max(len(self.doc_nodes), 1)
+        self.node_idf = np.array([np.log(n_docs / len(rows)) if len(rows) else 0.0 for rows in node_docs], dtype=np.float32)
+
+    def nodes_in(self, text: str) -> List[int]:
+        text = normalize_text(text)
+        return [node for node, pattern in self.patterns.items() if pattern.search(text)]
+
+    def doc_scores(self, node_scores: np.ndarray, n_docs: int) -> Optional[np.ndarray]:
+        scores = np.zeros(n_docs, dtype=np.float32)
+        for node in np.flatnonzero(node_scores):
+            rows = self.node_docs[node]
+            if len(rows):
+                scores[rows] += node_scores[node] * self.node_idf[node]
+        return scores if scores.any() else None
@@ -1,20 +1,31 @@
+from sqlalchemy import func
 from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.core.config import settings
+from app.database import session_scope
 from app.models.knowledge import GraphNode, GraphEdge
 from app.utils.websocket import manager
+from app.services.event_bus import event_bus
+from app.services.graph_index import GraphCSR
+from typing import Dict, Optional
+import hashlib
+import json
 import math
 import asyncio
+import time
 
 class GraphService:
     def __init__(self):
-        # Mapa de calor en memoria (Volátil para demo rápida)
-        # Estructura: { "NodoID": peso_actual }
-        self.heat_map = {
+        # Peso base de cada nodo visible; el calor se suma encima y decae con el tiempo
+        self.base_weights = {
             "CIAY": 40,
             "Educación": 20,
             "Inversión": 20,
             "Gobierno": 20,
             "Startups": 20
         }
+        # Calor acumulado por nodo: { "NodoID": (calor, instante_monotónico) }
+        self.heat: Dict[str, tuple] = {}
         # Mapeo de Intenciones a Nodos del Grafo
         self.intent_map = {
             "ESTUDIANTE": "Educación",
@@ -23,37 +34,213 @@ class GraphService:
             "STARTUP": "Startups",
             "GENERAL": "CIAY"
         }
+        self._sent: Dict[str, int] = {}       # último peso enviado al frontend
+        self._dirty_db: set = set()           # nodos con peso pendiente de persistir
+        self._last_boosted: Optional[str] = None
+        self._tasks = []
+        # Topología en memoria (se construye desde la base)
+        self.links = []
+        self.adjacency: Optional[Dict[str, set]] = None
+        self.csr: Optional[GraphCSR] = None
+        self.topology_version = 0
+        self._topology_cache = {}
+        # Callbacks (síncronos) tras cada carga de topología; p. ej. el índice GraphRAG
+        self.topology_listeners = []
 
-    def get_topology(self, db: Session):
-        # Retorna la topología base enriquecida con el calor actual
-        # Esto es lo que consume el frontend al cargar
-        nodes = []
-        for id, weight in self.heat_map.items():
-            nodes.append({"id": id, "group": "pillar" if id != "CIAY" else "root", "val": weight})
-            
-        # Links estáticos definidos por lógica de negocio
-        links = [
-            {"source": "CIAY", "target": "Educación"},
-            {"source": "CIAY", "target": "Inversión"},
-            {"source": "CIAY", "target": "Gobierno"},
-            {"source": "CIAY", "target": "Startups"}
+    # --- MODELO DE CALOR (decaimiento exponencial) ---
+
+    @property
+    def _decay_rate(self) -> float:
+        return math.log(2) / settings.GRAPH_HEAT_HALF_LIFE
+
+    def _heat_at(self, node_id: str, now: float) -> float:
+        value, since = self.heat.get(node_id, (0.0, now))
+        return value * math.exp(-self._decay_rate * (now - since))
+
+    def _heat_cap(self, node_id: str) -> float:
+        # El calor guardado nunca supera lo que el peso puede mostrar: sin tráfico, el nodo
+        # empieza a bajar de inmediato en lugar de quedar fijo en el máximo varias vidas medias
+        return float(max(0, settings.GRAPH_HEAT_MAX - self.base_weights.get(node_id, 1)))
+
+    def weight(self, node_id: str, now: Optional[float] = None) -> int:
+        now = time.monotonic() if now is None else now
+        base = self.base_weights.get(node_id, 1)
+        return min(settings.GRAPH_HEAT_MAX, int(round(base + self._heat_at(node_id, now))))
+
+    def current_weights(self) -> Dict[str, int]:
+        now = time.monotonic()
+        return {node_id: self.weight(node_id, now) for node_id in self.base_weights}
+
+    # --- TOPOLOGÍA (graph_nodes / graph_edges en memoria) ---
+
+    def load_topology(self, db: Session):
+        """Construye nodos, aristas y adyacencia una sola vez; se llama de nuevo tras cada ingesta."""
+        node_ids = [row.id for row in db.query(GraphNode.id).all()]
+        edges = db.query(GraphEdge.source_id, GraphEdge.target_id, GraphEdge.relation).all()
+
+        # Pilares de intención (los que reciben calor) enlazados a la raíz
+        links = [{"source": "CIAY", "target": pillar, "relation": "pilar"} for pillar in self.base_weights if pillar != "CIAY"]
+        links += [{"source": src, "target": dst, "relation": rel} for src, dst, rel in edges]
+
+        adjacency: Dict[str, set] = {}
+        for node_id in list(self.base_weights) + node_ids:
+            adjacency.setdefault(node_id, set())
+        for link in links:
+            adjacency.setdefault(link["source"], set()).add(link["target"])
+            adjacency.setdefault(link["target"], set()).add(link["source"])
+
+        self.links = links
+        self.adjacency = adjacency
+        self.csr = GraphCSR.from_links(adjacency, links, settings.GRAPH_RELATION_WEIGHTS, settings.GRAPH_RELATION_DEFAULT_WEIGHT)
+        self.topology_version += 1
+        self._topology_cache.clear()
+        print(f"🕸️ [GRAPH] Topología cargada: {len(adjacency)} nodos, {len(links)} aristas")
+        for listener in self.topology_listeners:
+            try:
+                listener()
+            except Exception as e:
+                print(f"⚠️ [GRAPH] Error en listener de topología: {e}")
+
+    def _group(self, node_id: str) -> str:
+        if node_id == "CIAY": return "root"
+        return "pillar" if node_id in self.base_weights else "entity"
+
+    def _neighborhood(self, node_id: str, depth: int) -> set:
+        seen, frontier = {node_id}, [node_id]
+        for _ in range(depth):
+            frontier = [n for current in frontier for n in self.adjacency.get(current, ()) if n not in seen]
+            seen.update(frontier)
+            if not frontier: break
+        return seen
+
+    def get_topology(self, db: Session, node: Optional[str] = None, depth: Optional[int] = None, live: bool = True) -> dict:
+        # Retorna la topología; con `live` los pesos incluyen el calor actual, si no, son los base
+        if self.adjacency is None:
+            self.load_topology(db)
+
+        keep = self._neighborhood(node, depth if depth is not None else 1) if node else None
+        now = time.monotonic()
+        nodes = [
+            {"id": node_id, "group": self._group(node_id), "val": self.weight(node_id, now) if live else self.base_weights.get(node_id, 1)}
+            for node_id in self.adjacency if keep is None or node_id in keep
         ]
+        links = [l for l in self.links if keep is None or (l["source"] in keep and l["target"] in keep)]
         return {"nodes": nodes, "links": links}
 
+    def get_topology_payload(self, db: Session, node: Optional[str] = None, depth: Optional[int] = None):
+        """
+        (etag, cuerpo JSON serializado) con pesos base: solo cambia con la topología.
+        El calor viaja únicamente por el websocket (snapshot al conectar + frames por tick),
+        así el ETag no se invalida en cada tick mientras los nodos se enfrían.
+        """
+        if self.adjacency is None:
+            self.load_topology(db)
+        key = (node, depth, self.topology_version)
+        cached = self._topology_cache.get(key)
+        if cached is None:
+            body = json.dumps(self.get_topology(db, node, depth, live=False), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            cached = (f'"{hashlib.sha1(body).hexdigest()}"', body)
+            if len(self._topology_cache) >= 64:
+                self._topology_cache.clear()
+            self._topology_cache[key] = cached
+        return cached
+
     async def boost_node_dynamic(self, intent: str):
         """
-        Aumenta el calor de un nodo basado en la intención detectada
-        y notifica al frontend vía WebSocket.
+        Aumenta el calor de un nodo basado en la intención detectada.
+        El frontend recibe el cambio en el siguiente tick del agregador.
         """
         target_node = self.intent_map.get(intent, "CIAY")
-        
-        # Incrementamos peso (Simulación de tendencia)
-        if target_node in self.heat_map:
-            self.heat_map[target_node] += 5
-            # Limite para que no explote visualmente
-            if self.heat_map[target_node] > 60: self.heat_map[target_node] = 60
-            
-        # Broadcast al frontend para animación en tiempo real
-        await manager.broadcast_graph_update(target_node, self.heat_map[target_node])
-
-graph_service = GraphService()
\ No newline at end of file
+
+        # Se publica el incremento (no el valor): cada worker lo aplica a su mapa
+        await event_bus.publish("graph_heat", {"node_id": target_node, "delta": settings.GRAPH_HEAT_BOOST})
+
+    def apply_heat(self, event: dict):
+        target_node = event["node_id"]
+        if target_node not in self.base_weights: return
+        now = time.monotonic()
+        heat = min(self._heat_cap(target_node), self._heat_at(target_node, now) + event.get("delta", 0))
+        self.heat[target_node] = (heat, now)
+        self._last_boosted = target_node
+
+    # --- AGREGADOR POR TICKS ---
+
+    def diff_frame(self) -> Dict[str, int]:
+        """Nodos cuyo peso redondeado cambió desde el último frame (boosts y decaimiento)."""
+        now = time.monotonic()
+        changed = {}
+        for node_id in list(self.heat):
+            weight = self.weight(node_id, now)
+            if self._sent.get(node_id, self.base_weights.get(node_id, 1)) != weight:
+                changed[node_id] = weight
+                self._sent[node_id] = weight
+            if weight == self.base_weights.get(node_id, 1) and self._heat_at(node_id, now) < 0.5:
+                # Calor disipado: el nodo deja de recalcularse
+                self.heat.pop(node_id, None)
+        self._dirty_db.update(changed)
+        return changed
+
+    async def _tick_loop(self):
+        while True:
+            await asyncio.sleep(settings.GRAPH_HEAT_TICK)
+            changed = self.diff_frame()
+            if changed:
+                # Un solo frame por intervalo, sin importar cuántos mensajes llegaron
+                await manager.broadcast_graph_frame(changed, self._last_boosted)
+                self._last_boosted = None
+
+    # --- PERSISTENCIA ---
+
+    def persist_weights(self, weights: Dict[str, int]):
+        if not weights: return
+        with session_scope() as db:
+            # updated_at explícito: el onupdate del ORM no aplica al ON CONFLICT y el arranque
+            # lo necesita para descontar el decaimiento ocurrido mientras el servicio estuvo abajo
+            stmt = pg_insert(GraphNode).values([
+                {"id": node_id, "weight": weight, "updated_at": func.now()} for node_id, weight in weights.items()
+            ])
+            db.execute(stmt.on_conflict_do_update(index_elements=["id"], set_={"weight": stmt.excluded.weight, "updated_at": func.now()}))
+            db.commit()
+
+    async def _flush_weights(self):
+        dirty, self._dirty_db = self._dirty_db, set()
+        now = time.monotonic()
+        try:
+            await asyncio.to_thread(self.persist_weights, {node_id: self.weight(node_id, now) for node_id in dirty})
+        except Exception as e:
+            self._dirty_db |= dirty
+            print(f"⚠️ [GRAPH] No se pudieron persistir los pesos: {e}")
+
+    async def _persist_loop(self):
+        while True:
+            await asyncio.sleep(settings.GRAPH_HEAT_PERSIST_INTERVAL)
+            await self._flush_weights()
+
+    def init_weights(self, db: Session):
+        """
+        Restaura el calor desde GraphNode.weight (lo persiste el propio servicio), decaído
+        por el tiempo transcurrido desde que se guardó: tras una caída larga vuelve frío.
+        """
+        now = time.monotonic()
+        # Antigüedad medida con el reloj de Postgres (el mismo que escribió updated_at)
+        age = func.extract("epoch", func.now() - func.coalesce(GraphNode.updated_at, GraphNode.created_at))
+        rows = db.query(GraphNode.id, GraphNode.weight, age).filter(GraphNode.id.in_(list(self.base_weights))).all()
+        for node_id, weight, seconds in rows:
+            excess = min((weight or 0) - self.base_weights[node_id], self._heat_cap(node_id))
+            if excess > 0:
+                # Mismo modelo que _heat_at: el calor se fecha `seconds` atrás en el reloj monotónico
+                self.heat[node_id] = (float(excess), now - max(0.0, float(seconds or 0)))
+                self._sent[node_id] = self.weight(node_id, now)
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._tick_loop()), asyncio.create_task(self._persist_loop())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        self.diff_frame()
+        await self._flush_weights()
+
+graph_service = GraphService()
+event_bus.subscribe("graph_heat", graph_service.apply_heat)
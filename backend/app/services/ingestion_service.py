@@ -1,89 +1,265 @@
 import pandas as pd
+from sqlalchemy import text, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
-from sqlalchemy.exc import IntegrityError
-from app.models.knowledge import KnowledgeItem, GraphNode, GraphEdge, UserTaxonomy
+from app.core.config import settings
+from app.models.knowledge import KnowledgeItem, GraphNode, GraphEdge, UserTaxonomy, IngestManifest
 from app.services.graph_service import graph_service
+from app.services.rag_service import rag_service
+import csv
+import hashlib
+import io
+import json
 import os
+import time
+import uuid
+
+# Namespace fijo: el mismo ID del CSV siempre produce el mismo UUID
+KB_NAMESPACE = uuid.UUID("6f1c5a8e-2b7d-4c1e-9a53-0c1a1e2d4b6f")
+
+# Candado de Postgres para que solo un worker ingeste a la vez
+INGEST_LOCK_KEY = 727001
+
+def stable_uuid(key: str) -> uuid.UUID:
+    return uuid.uuid5(KB_NAMESPACE, str(key))
+
+def _clean(value, default=None):
+    return default if pd.isna(value) else value
+
+def file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def row_hash(row: dict) -> str:
+    clean = {k: _clean(v) for k, v in row.items()}
+    return hashlib.sha1(json.dumps(clean, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
 
 class IngestionService:
+    """
+    Ingesta incremental: un manifiesto (tabla ingest_manifest) guarda el hash de
+    cada archivo fuente y de cada fila. Al arrancar solo se aplican las diferencias;
+    los archivos sin cambios se saltan por completo.
+    """
+
+    # --- ESCRITURA EN BLOQUE ---
+
+    def _batches(self, items: list):
+        size = max(1, settings.INGEST_BATCH_SIZE)
+        for start in range(0, len(items), size):
+            yield start // size + 1, items[start:start + size]
+
+    def _bulk_upsert(self, db: Session, model, rows: list, conflict: list, update: bool = True, label: str = ""):
+        """
+        INSERT ... ON CONFLICT por lotes. Con update=True actualiza las columnas
+        no clave (DO UPDATE); si no, ignora las filas existentes (DO NOTHING).
+        Archivos grandes pasan por COPY a una tabla staging.
+        """
+        if not rows: return
+        if len(rows) >= settings.INGEST_COPY_THRESHOLD:
+            return self._copy_upsert(db, model, rows, conflict, update, label)
+
+        for number, batch in self._batches(rows):
+            start = time.perf_counter()
+            stmt = pg_insert(model).values(batch)
+            update_cols = [c for c in batch[0] if c not in conflict]
+            if update and update_cols:
+                stmt = stmt.on_conflict_do_update(index_elements=conflict, set_={c: stmt.excluded[c] for c in update_cols})
+            else:
+                stmt = stmt.on_conflict_do_nothing(index_elements=conflict)
+            db.execute(stmt)
+            print(f"   📦 {label} lote {number}: {len(batch)} filas en {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    def _copy_upsert(self, db: Session, model, rows: list, conflict: list, update: bool, label: str):
+        table = model.__table__.name
+        staging = f"_staging_{table}"
+        cols = list(rows[0])
+        col_list = ", ".join(f'"{c}"' for c in cols)
+        update_cols = [c for c in cols if c not in conflict]
+        if update and update_cols:
+            on_conflict = "DO UPDATE SET " + ", ".join(f'"{c}" = EXCLUDED."{c}"' for c in update_cols)
+        else:
+            on_conflict = "DO NOTHING"
+
+        start = time.perf_counter()
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow(["\\N" if row[c] is None else row[c] for c in cols])
+        buffer.seek(0)
+
+        # Misma transacción que la sesión: la staging se descarta al hacer commit
+        cursor = db.connection().connection.cursor()
+        try:
+            cursor.execute(f"DROP TABLE IF EXISTS {staging}")
+            cursor.execute(f"CREATE TEMP TABLE {staging} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP")
+            cursor.copy_expert(f"COPY {staging} ({col_list}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer)
+            cursor.execute(
+                f"INSERT INTO {table} ({col_list}) SELECT {col_list} FROM {staging} "
+                f"ON CONFLICT ({', '.join(conflict)}) {on_conflict}"
+            )
+        finally:
+            cursor.close()
+        print(f"   📦 {label} COPY: {len(rows)} filas en {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    def _bulk_delete(self, db: Session, column, keys: list):
+        for _, batch in self._batches(keys):
+            db.query(column.class_).filter(column.in_(batch)).delete(synchronize_session=False)
+
+    # --- HANDLERS POR FUENTE ---
+    # Cada uno recibe {clave: fila} de filas nuevas/cambiadas y las claves eliminadas.
+
+    def _kb_rows(self, df: pd.DataFrame) -> dict:
+        return {str(stable_uuid(row['ID'])): row for row in df.to_dict("records")}
+
+    def _apply_knowledge(self, db: Session, changed: dict, removed: set):
+        self._bulk_delete(db, KnowledgeItem.id, [uuid.UUID(k) for k in removed])
+        self._bulk_upsert(db, KnowledgeItem, [
+            {
+                "id": item_id,
+                "topic": _clean(row.get('Tema')),
+                "content": _clean(row.get('Contenido'), ''),
+                "keywords": _clean(row.get('Keywords')),
+                "technical_level": _clean(row.get('Nivel_Tecnico'), 'General'),
+                "application_sector": _clean(row.get('Sector_Aplicacion'), 'Transversal'),
+                "source_url": _clean(row.get('Fuente_URL')),
+                "parent_document": _clean(row.get('Documento_Padre')),
+                "chunk_index": None if pd.isna(row.get('Chunk_Index')) else int(row.get('Chunk_Index'))
+            }
+            for item_id, row in changed.items()
+        ], conflict=["id"], label="knowledge_items")
+
+    def _taxonomy_rows(self, df: pd.DataFrame) -> dict:
+        return {str(row['Codigo']): row for row in df.to_dict("records")}
+
+    def _apply_taxonomy(self, db: Session, changed: dict, removed: set):
+        self._bulk_delete(db, UserTaxonomy.code, list(removed))
+        self._bulk_upsert(db, UserTaxonomy, [
+            {"code": code, "description": _clean(row.get('Descripcion')), "examples": _clean(row.get('Ejemplos'))}
+            for code, row in changed.items()
+        ], conflict=["code"], label="user_taxonomy")
+
+    def _graph_rows(self, df: pd.DataFrame) -> dict:
+        return {f"{row['Origen']}|{row['Relacion']}|{row['Destino']}": row for row in df.to_dict("records")}
+
+    def _apply_graph(self, db: Session, changed: dict, removed: set):
+        triplet = tuple_(GraphEdge.source_id, GraphEdge.relation, GraphEdge.target_id)
+        for _, batch in self._batches([tuple(key.split("|", 2)) for key in removed]):
+            db.query(GraphEdge).filter(triplet.in_(batch)).delete(synchronize_session=False)
+
+        # Nodos sin consultas previas: los existentes se ignoran en el conflicto
+        nodes = sorted({r['Origen'] for r in changed.values()} | {r['Destino'] for r in changed.values()})
+        self._bulk_upsert(db, GraphNode, [{"id": node_id} for node_id in nodes], conflict=["id"], update=False, label="graph_nodes")
+        self._bulk_upsert(db, GraphEdge, [
+            {"id": str(uuid.uuid4()), "source_id": row['Origen'], "target_id": row['Destino'], "relation": row['Relacion']}
+            for row in changed.values()
+        ], conflict=["source_id", "relation", "target_id"], update=False, label="graph_edges")
+
+    # --- MOTOR INCREMENTAL ---
+
+    def _write_manifest(self, db: Session, manifest: dict, path: str, digest: str, hashes: dict):
+        entry = manifest.get(path)
+        if entry is None:
+            entry = IngestManifest(source=path)
+            db.add(entry)
+            manifest[path] = entry
+        entry.file_hash = digest
+        entry.row_hashes = json.dumps(hashes)
+
+    def _sync_source(self, db: Session, manifest: dict, path: str, to_rows, apply, pending: list = None) -> int:
+        """
+        Devuelve el número de filas aplicadas (0 si el archivo no cambió).
+        Con `pending`, el manifiesto no se escribe aquí: se agrega (path, hash, hashes de filas)
+        a la lista para que el llamador lo confirme cuando termine el paso dependiente.
+        """
+        if not os.path.exists(path): return 0
+
+        digest = file_hash(path)
+        entry = manifest.get(path)
+        if entry and entry.file_hash == digest:
+            print(f"⏭️ Sin cambios: {path}")
+            return 0
+
+        start = time.perf_counter()
+        rows = to_rows(pd.read_csv(path))
+        new_hashes = {key: row_hash(row) for key, row in rows.items()}
+        old_hashes = json.loads(entry.row_hashes) if entry and entry.row_hashes else {}
+
+        changed = {k: rows[k] for k, h in new_hashes.items() if old_hashes.get(k) != h}
+        removed = set(old_hashes) - set(new_hashes)
+
+        try:
+            apply(db, changed, removed)
+            if pending is None:
+                self._write_manifest(db, manifest, path, digest, new_hashes)
+            else:
+                pending.append((path, digest, new_hashes))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        print(f"✅ {path}: {len(changed)} filas aplicadas, {len(removed)} eliminadas ({(time.perf_counter() - start) * 1000:.1f} ms)")
+        return len(changed) + len(removed)
+
     def ingest_initial_data(self, db: Session):
         kb_path = "data/knowledge_base.csv"
+        chunks_path = "data/knowledge_base_full.csv"
         graph_path = "data/grafo_relaciones.csv"
         tax_path = "data/taxonomia_usuarios.csv"
 
-        # 1. Ingestar Base de Conocimiento
-        if os.path.exists(kb_path):
+        # Con varios workers, el primero ingesta y el resto espera y encuentra el manifiesto al día.
+        # El candado vive en una conexión dedicada: la sesión devuelve la suya al pool en cada commit.
+        lock_conn = db.get_bind().connect()
+        lock_conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": INGEST_LOCK_KEY})
+        try:
+            manifest = {m.source: m for m in db.query(IngestManifest).all()}
+
+            kb_changed = 0
+            kb_pending = []
+
+            # 1. Ingestar Base de Conocimiento (curada + pasajes generados por ingest.py)
+            for path in (kb_path, chunks_path):
+                try:
+                    kb_changed += self._sync_source(db, manifest, path, self._kb_rows, self._apply_knowledge, kb_pending)
+                except Exception as e:
+                    print(f"⚠️ Error procesando KB CSV {path}: {e}")
+
+            # Artefacto del índice bajo el mismo candado: se reescribe si la KB cambió (re-embebe
+            # solo lo nuevo) o si falta (contenedor nuevo); si no, solo se abre con memmap.
+            # El manifiesto de la KB se confirma después del artefacto: si el índice falla,
+            # el siguiente arranque vuelve a detectar el cambio y reintenta.
             try:
-                kb_df = pd.read_csv(kb_path)
-                # Iteramos e intentamos insertar uno por uno
-                for _, row in kb_df.iterrows():
-                    try:
-                        # Verificar si ya existe por ID antes de insertar
-                        exists = db.query(KnowledgeItem).filter(KnowledgeItem.id == row.get('ID')).first()
-                        if not exists:
-                            item = KnowledgeItem(
-                                id=row.get('ID'), # Forzamos el ID del CSV
-                                topic=row.get('Tema'),
-                                content=row.get('Contenido'),
-                                keywords=row.get('Keywords'),
-                                technical_level=row.get('Nivel_Tecnico', 'General'),
-                                application_sector=row.get('Sector_Aplicacion', 'Transversal'),
-                                source_url=row.get('Fuente_URL')
-                            )
-                            db.add(item)
-                            db.commit()
-                    except IntegrityError:
-                        db.rollback() # Si choca, ignoramos y seguimos
-                    except Exception:
-                        db.rollback()
-                print("✅ Knowledge Base verificada.")
+                rag_service.ensure_index(db, rebuild=bool(kb_changed))
+                for path, digest, hashes in kb_pending:
+                    self._write_manifest(db, manifest, path, digest, hashes)
+                db.commit()
             except Exception as e:
-                print(f"⚠️ Error procesando KB CSV: {e}")
+                db.rollback()
+                print(f"⚠️ Error construyendo índice RAG: {e}")
 
-        # 2. Ingestar Taxonomía
-        if os.path.exists(tax_path):
+            # 2. Ingestar Taxonomía
             try:
-                tax_df = pd.read_csv(tax_path)
-                for _, row in tax_df.iterrows():
-                    try:
-                        exists = db.query(UserTaxonomy).filter(UserTaxonomy.code == row['Codigo']).first()
-                        if not exists:
-                            db.add(UserTaxonomy(code=row['Codigo'], description=row['Descripcion'], examples=row['Ejemplos']))
-                            db.commit()
-                    except IntegrityError:
-                        db.rollback()
-                print("✅ Taxonomía verificada.")
-            except Exception: pass
-
-        # 3. Ingestar Grafo
-        if os.path.exists(graph_path):
+                self._sync_source(db, manifest, tax_path, self._taxonomy_rows, self._apply_taxonomy)
+            except Exception as e:
+                print(f"⚠️ Error procesando Taxonomía: {e}")
+
+            # 3. Ingestar Grafo
             try:
-                graph_df = pd.read_csv(graph_path)
-                # Nodos
-                for _, row in graph_df.iterrows():
-                    try:
-                        src = row['Origen']; dst = row['Destino']
-                        if not db.query(GraphNode).filter(GraphNode.id == src).first():
-                            db.add(GraphNode(id=src))
-                        if not db.query(GraphNode).filter(GraphNode.id == dst).first():
-                            db.add(GraphNode(id=dst))
-                        db.commit()
-                    except IntegrityError: db.rollback()
-                
-                # Aristas
-                for _, row in graph_df.iterrows():
-                    try:
-                        # Aquí simplificamos: solo insertamos, si falla es que ya existe o hay conflicto
-                        db.add(GraphEdge(source_id=row['Origen'], target_id=row['Destino'], relation=row['Relacion']))
-                        db.commit()
-                    except IntegrityError: db.rollback()
-                    
-                print("✅ Grafo verificado.")
-            except Exception: pass
-            
-        # Inicializar pesos
+                self._sync_source(db, manifest, graph_path, self._graph_rows, self._apply_graph)
+            except Exception as e:
+                print(f"⚠️ Error procesando Grafo: {e}")
+        finally:
+            lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": INGEST_LOCK_KEY})
+            lock_conn.close()
+
+        # Topología en memoria y calor persistido del grafo
         try:
+            graph_service.load_topology(db)
             graph_service.init_weights(db)
-        except: pass
+        except Exception as e:
+            print(f"⚠️ Error restaurando pesos del grafo: {e}")
 
-ingestion_service = IngestionService()
\ No newline at end of file
+ingestion_service = IngestionService()
@@ -0,0 +1,239 @@
+from app.services.vector_index import tokenize
+from typing import Dict, List, Optional, Sequence, Tuple
+import json
+import math
+import os
+import random
+import re
+import zlib
+import numpy as np
+
+# Clasificador de intención local (solo CPU): palabras y n-gramas de caracteres
+# con hashing + regresión logística multinomial. Entrenado offline con
+# train_intent.py a partir de data/training_examples*.json. El umbral de confianza
+# para no consultar al LLM se calibra con validación cruzada: el menor umbral cuya
+# precisión fuera de muestra alcanza TARGET_PRECISION. Se guarda con el modelo.
+
+TRAINING_FILES = ["data/training_examples.json", "data/training_examples_enriched.json"]
+MODEL_PATH = "data/intent_model.npz"
+
+# Calibración y piso de calidad (train_intent.py falla por debajo de MIN_ACCURACY
+# o si ningún umbral alcanza TARGET_PRECISION)
+TARGET_PRECISION = 0.85
+MIN_ACCURACY = 0.5
+
+# Las etiquetas del dataset son más finas que las categorías del chat.
+# CONTACTO dispara la herramienta save_contact: solo sus propios ejemplos (piden
+# seguimiento o dejan sus datos). Prensa y academia preguntan, son GENERAL.
+LABEL_MAP = {
+    "CIUDADANO": "GENERAL",
+    "TECNICO": "GENERAL",
+    "SCEPTIC": "GENERAL",
+    "SECTORIAL": "GENERAL",
+    "ESTUDIANTE": "ESTUDIANTE",
+    "INVERSIONISTA": "INVERSIONISTA",
+    "GOBIERNO": "GOBIERNO",
+    "STARTUP": "STARTUP",
+    "CONTACTO": "CONTACTO",
+    "PRENSA": "GENERAL",
+    "ACADEMIA": "GENERAL",
+}
+
+_COMMENT_RE = re.compile(r"/\*.*?\*/", re.DOTALL)
+
+
+def load_training_examples(paths: Sequence[str] = TRAINING_FILES) -> List[Tuple[str, str]]:
+    examples = []
+    for path in paths:
+        if not os.path.exists(path): continue
+        with open(path, "r", encoding="utf-8") as f:
+            # Los JSON del repo traen comentarios /* */ de documentación
+            data = json.loads(_COMMENT_RE.sub("", f.read()))
+        for item in data:
+            label = LABEL_MAP.get(item.get("intent"))
+            if label and item.get("user"):
+                examples.append((item["user"], label))
+    return examples
+
+
+class LocalIntentClassifier:
+    def __init__(self, dim: int = 8192, ngram_range: Tuple[int, int] = (3, 5)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+        self.labels: List[str] = []
+        self.W: Optional[np.ndarray] = None
+        self.b: Optional[np.ndarray] = None
+        # Confianza mínima calibrada (None: ninguna alcanzó la precisión objetivo)
+        self.threshold: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.W is not None
+
+    def _features(self, text: str) -> Dict[int, float]:
+        counts: Dict[int, float] = {}
+
+        def add(feature: str):
+            h = zlib.crc32(feature.encode("utf-8")) % self.dim
+            counts[h] = counts.get(h, 0.0) + 1.0
+
+        lo, hi = self.ngram_range
+        for word in tokenize(text):
+            add(f"w:{word}")
+            # n-gramas de caracteres dentro de cada palabra (robustos a typos y flexiones)
+            padded = f" {word} "
+            for n in range(lo, hi + 1):
+                for i in range(len(padded) - n + 1):
+                    add(padded[i:i + n])
+        # TF sublineal + normalización L2
+        values = {k: 1.0 + np.log(v) for k, v in counts.items()}
+        norm = np.sqrt(sum(v * v for v in values.values())) or 1.0
+        return {k: v / norm for k, v in values.items()}
+
+    def _matrix(self, texts: Sequence[str]) -> np.ndarray:
+        X = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for k, v in self._features(text).items():
+                X[row, k] = v
+        return X
+
+    def fit(self, examples: Sequence[Tuple[str, str]], epochs: int = 300, lr: float = 2.0, l2: float = 1e-4):
+        """Descenso de gradiente full-batch sobre softmax; el dataset es pequeño."""
+        self.labels = sorted({label for _, label in examples})
+        X = self._matrix([text for text, _ in examples])
+        y = np.array([self.labels.index(label) for _, label in examples])
+        Y = np.eye(len(self.labels), dtype=np.float32)[y]
+        # Pesos inversos a la frecuencia: GENERAL agrupa varias etiquetas del dataset
+        class_weight = len(y) / (len(self.labels) * np.bincount(y, minlength=len(self.labels)))
+        sample_weight = class_weight[y].astype(np.float32)[:, None]
+
+        # Solo las cubetas presentes en el dataset: las demás filas de W quedan en cero
+        # (mismo resultado, matmuls sobre unas pocas miles de columnas en vez de `dim`)
+        used = np.flatnonzero(X.any(axis=0))
+        X = np.ascontiguousarray(X[:, used])
+        W = np.zeros((len(used), len(self.labels)), dtype=np.float32)
+        self.b = np.zeros(len(self.labels), dtype=np.float32)
+        for _ in range(epochs):
+            P = self._softmax(X @ W + self.b)
+            G = sample_weight * (P - Y) / len(X)
+            W -= lr * (X.T @ G + l2 * W)
+            self.b -= lr * G.sum(axis=0)
+        self.W = np.zeros((self.dim, len(self.labels)), dtype=np.float32)
+        self.W[used] = W
+        return self
+
+    @staticmethod
+    def _softmax(Z: np.ndarray) -> np.ndarray:
+        Z = Z - Z.max(axis=-1, keepdims=True)
+        E = np.exp(Z)
+        return E / E.sum(axis=-1, keepdims=True)
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        # Vector disperso: solo se suman las filas de W de los n-gramas presentes
+        features = self._features(text)
+        idx = np.fromiter(features.keys(), dtype=np.int64, count=len(features))
+        vals = np.fromiter(features.values(), dtype=np.float32, count=len(features))
+        probs = self._softmax(vals @ self.W[idx] + self.b)
+        best = int(np.argmax(probs))
+        return self.labels[best], float(probs[best])
+
+    def save(self, path: str = MODEL_PATH):
+        threshold = np.nan if self.threshold is None else self.threshold
+        np.savez(path, W=self.W, b=self.b, labels=np.array(self.labels), dim=self.dim,
+                 ngram_range=np.array(self.ngram_range), threshold=threshold)
+
+    @classmethod
+    def load(cls, path: str = MODEL_PATH) -> Optional["LocalIntentClassifier"]:
+        if not os.path.exists(path): return None
+        data = np.load(path)
+        clf = cls(int(data["dim"]), tuple(int(n) for n in data["ngram_range"]))
+        clf.W, clf.b, clf.labels = data["W"], data["b"], [str(label) for label in data["labels"]]
+        threshold = float(data["threshold"]) if "threshold" in data.files else math.nan
+        clf.threshold = None if math.isnan(threshold) else threshold
+        return clf
+
+
+# --- CALIBRACIÓN ---
+
+def cross_validate(examples: Sequence[Tuple[str, str]], folds: int = 5, seed: int = 42) -> List[Tuple[str, str, float]]:
+    """Predicciones fuera de muestra (k-fold): (etiqueta real, predicha, confianza)."""
+    shuffled = list(examples)
+    random.Random(seed).shuffle(shuffled)
+    predictions = []
+    for fold in range(folds):
+        train = [e for i, e in enumerate(shuffled) if i % folds != fold]
+        model = LocalIntentClassifier().fit(train)
+        for text, label in shuffled[fold::folds]:
+            predicted, confidence = model.predict(text)
+            predictions.append((label, predicted, confidence))
+    return predictions
+
+
+def calibrate_threshold(predictions: Sequence[Tuple[str, str, float]], target_precision: float,
+                        min_support: int = 10) -> Optional[float]:
+    """
+    Menor confianza t tal que, entre las predicciones con confianza >= t, la fracción
+    correcta alcanza `target_precision` (con al menos `min_support` predicciones).
+    """
+    ranked = sorted(predictions, key=lambda p: p[2], reverse=True)
+    best, hits = None, 0
+    for n, (label, predicted, confidence) in enumerate(ranked, start=1):
+        hits += label == predicted
+        # Solo se corta entre confianzas distintas: un umbral admite todos los empates
+        if n < len(ranked) and ranked[n][2] == confidence: continue
+        if n >= min_support and hits / n >= target_precision:
+            best = confidence
+    return best
+
+
+def evaluate(examples: Sequence[Tuple[str, str]], target_precision: float) -> dict:
+    """Exactitud fuera de muestra, umbral calibrado y su precisión/cobertura."""
+    predictions = cross_validate(examples)
+    threshold = calibrate_threshold(predictions, target_precision)
+    confident = [p for p in predictions if threshold is not None and p[2] >= threshold]
+    return {
+        "examples": len(predictions),
+        "accuracy": sum(label == predicted for label, predicted, _ in predictions) / max(1, len(predictions)),
+        "threshold": threshold,
+        "precision": sum(label == predicted for label, predicted, _ in confident) / len(confident) if confident else None,
+        "coverage": len(confident) / max(1, len(predictions)),
+    }
+
+
+def train(examples: Sequence[Tuple[str, str]], target_precision: float) -> Tuple[LocalIntentClassifier, dict]:
+    """Calibra con validación cruzada y entrena el modelo final con todos los ejemplos."""
+    report = evaluate(examples, target_precision)
+    model = LocalIntentClassifier().fit(examples)
+    model.threshold = report["threshold"]
+    return model, report
+
+
+class IntentClassifierService:
+    def __init__(self):
+        self.model: Optional[LocalIntentClassifier] = None
+
+    def load(self):
+        self.model = LocalIntentClassifier.load(MODEL_PATH)
+        if self.model is None:
+            # Sin artefacto offline: se entrena en el arranque (dataset pequeño, < 1 s)
+            examples = load_training_examples()
+            if not examples: return
+            self.model, _ = train(examples, TARGET_PRECISION)
+            print(f"⚠️ [INTENT] {MODEL_PATH} no existe; modelo entrenado en el arranque ({len(examples)} ejemplos).")
+        else:
+            print(f"🎯 [INTENT] Clasificador local cargado: {', '.join(self.model.labels)}")
+        if self.model.threshold is None:
+            print("⚠️ [INTENT] Sin umbral calibrado: todas las intenciones se consultan al LLM.")
+
+    def classify(self, message: str) -> Optional[dict]:
+        if self.model is None or not self.model.ready: return None
+        intent, confidence = self.model.predict(message)
+        return {"intent": intent, "confidence": round(confidence, 3), "source": "local"}
+
+    def is_confident(self, result: Optional[dict], threshold: Optional[float] = None) -> bool:
+        """True si la predicción local basta para no consultar al LLM (`threshold` fuerza el calibrado)."""
+        if result is None or self.model is None: return False
+        if threshold is None: threshold = self.model.threshold
+        return threshold is not None and result["confidence"] >= threshold
+
+intent_classifier = IntentClassifierService()
@@ -0,0 +1,58 @@
+from app.core.config import settings
+from typing import Optional
+import httpx
+
+class LLMClient:
+    """
+    Cliente HTTP de larga vida para DeepSeek (API compatible con OpenAI).
+    Un solo pool por proceso con keep-alive y HTTP/2: evita un handshake
+    TCP+TLS nuevo en cada llamada. Se abre en el arranque y se cierra al apagar.
+    """
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _build_client(self) -> httpx.AsyncClient:
+        http2 = settings.LLM_HTTP2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                print("⚠️ [LLM] Paquete 'h2' no instalado, usando HTTP/1.1.")
+                http2 = False
+
+        return httpx.AsyncClient(
+            base_url=settings.DEEPSEEK_BASE_URL,
+            headers={"Authorization": f"Bearer {settings.DEEPSEEK_API_KEY}"},
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=settings.LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.LLM_MAX_KEEPALIVE,
+                keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(settings.LLM_STREAM_TIMEOUT, connect=settings.LLM_CONNECT_TIMEOUT),
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Creación perezosa: debe vivir en el event loop del worker
+        if self._client is None or self._client.is_closed:
+            self._client = self._build_client()
+        return self._client
+
+    async def startup(self):
+        _ = self.client
+
+    async def shutdown(self):
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+    async def complete(self, payload: dict, timeout: Optional[float] = None) -> httpx.Response:
+        return await self.client.post("/chat/completions", json=payload, timeout=timeout or settings.LLM_CLASSIFY_TIMEOUT)
+
+    def stream(self, payload: dict, timeout: Optional[float] = None):
+        """Context manager async con la respuesta en streaming (SSE)."""
+        return self.client.stream("POST", "/chat/completions", json=payload, timeout=timeout or settings.LLM_STREAM_TIMEOUT)
+
+llm_client = LLMClient()
@@ -0,0 +1,116 @@
+from sqlalchemy import insert
+from app.core.config import settings
+from app.database import session_scope
+from app.models.knowledge import InteractionLog
+from app.services.analytics_rollups import apply_rollups
+from typing import List, Optional
+import asyncio
+import time
+
+class InteractionLogWriter:
+    """
+    Escritor único de InteractionLog en segundo plano.
+    Los requests encolan (cola acotada) y una sola tarea inserta por lotes,
+    por tamaño o por tiempo, en una transacción por lote.
+    Si la cola se llena se aplica backpressure breve y luego se descarta (contado en métricas).
+    Si un lote falla se reintenta fila por fila: solo se pierde la fila problemática.
+    """
+
+    def __init__(self):
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+        self.stats = {"enqueued": 0, "written": 0, "batches": 0, "dropped": 0, "failed": 0, "batch_retries": 0, "last_batch_ms": 0.0}
+
+    def _ensure_started(self):
+        if self.task is None or self.task.done():
+            self.queue = asyncio.Queue(maxsize=settings.LOG_WRITER_QUEUE_SIZE)
+            self.task = asyncio.create_task(self._run())
+
+    async def start(self):
+        self._ensure_started()
+
+    async def submit(self, log_data: dict) -> bool:
+        self._ensure_started()
+        try:
+            self.queue.put_nowait(log_data)
+        except asyncio.QueueFull:
+            try:
+                await asyncio.wait_for(self.queue.put(log_data), timeout=settings.LOG_WRITER_PUT_TIMEOUT)
+            except asyncio.TimeoutError:
+                self.stats["dropped"] += 1
+                return False
+        self.stats["enqueued"] += 1
+        return True
+
+    def _write_batch(self, batch: List[dict]):
+        with session_scope() as db:
+            db.execute(insert(InteractionLog), batch)
+            # Los rollups del dashboard avanzan en la misma transacción que el lote
+            apply_rollups(db, batch)
+            db.commit()
+
+    def _write_rows(self, batch: List[dict]) -> int:
+        """Una transacción por fila (tras fallar el lote). Devuelve cuántas se escribieron."""
+        written = 0
+        for row in batch:
+            try:
+                self._write_batch([row])
+                written += 1
+            except Exception as e:
+                print(f"Error saving log (session {row.get('session_id')}): {e}")
+        return written
+
+    async def _flush(self, batch: List[dict]):
+        start = time.perf_counter()
+        try:
+            await asyncio.to_thread(self._write_batch, batch)
+            written = len(batch)
+        except Exception as e:
+            print(f"Error saving logs ({len(batch)}), reintentando fila por fila: {e}")
+            self.stats["batch_retries"] += 1
+            try:
+                written = await asyncio.to_thread(self._write_rows, batch)
+            except Exception as e:
+                written = 0
+                print(f"Error saving logs ({len(batch)}): {e}")
+        self.stats["written"] += written
+        self.stats["failed"] += len(batch) - written
+        self.stats["batches"] += 1
+        self.stats["last_batch_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    async def _run(self):
+        queue = self.queue
+        while True:
+            item = await queue.get()
+            if item is None: break
+            batch = [item]
+            deadline = time.monotonic() + settings.LOG_WRITER_FLUSH_INTERVAL
+            stop = False
+            while len(batch) < settings.LOG_WRITER_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0: break
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+            if stop: break
+
+    async def stop(self):
+        """Vacía la cola y espera el último lote (apagado ordenado)."""
+        if self.task is None or self.task.done(): return
+        await self.queue.put(None)
+        try:
+            await asyncio.wait_for(self.task, timeout=settings.LOG_WRITER_SHUTDOWN_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.task.cancel()
+            print(f"⚠️ [LOGS] Apagado con {self.queue.qsize()} logs sin escribir")
+
+    def metrics(self) -> dict:
+        return {**self.stats, "queued": self.queue.qsize() if self.queue else 0}
+
+log_writer = InteractionLogWriter()
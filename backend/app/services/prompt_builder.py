@@ -0,0 +1,88 @@
+from app.core.config import settings
+from app.schemas.tools import TOOLS_PROMPT_SCHEMA
+from typing import List, Optional, Sequence, Tuple
+import math
+import re
+
+# Armado del system prompt: prefijo estático (base + instrucciones de herramientas)
+# cacheado por modo, y después el contexto RAG recortado a un presupuesto de tokens.
+# El prefijo idéntico entre turnos también aprovecha el prefix caching del proveedor.
+
+_PIECE_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+NATIVE_TOOLS_HINT = "\n\nIMPORTANTE: Si tienes los datos necesarios, usa la herramienta correspondiente."
+
+PROMPT_TOOLS_BLOCK = f"""
+
+            IMPORTANTE: Si tienes los datos necesarios, GENERA EL JSON AL FINAL.
+            Usa este esquema EXACTO:
+            {TOOLS_PROMPT_SCHEMA}
+
+            Envuelve el JSON así:
+            @@TOOL_CALL: <JSON_AQUI> @@
+            """
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimación local de tokens BPE sin tokenizer: cada palabra cuenta ~1 token
+    por cada 4 caracteres y cada signo de puntuación cuenta 1.
+    """
+    return sum(math.ceil(len(piece) / 4) for piece in _PIECE_RE.findall(text))
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    words, used = [], 0
+    for word in text.split():
+        cost = estimate_tokens(word)
+        if used + cost > max_tokens: break
+        words.append(word)
+        used += cost
+    return " ".join(words) + " …"
+
+
+class PromptBuilder:
+    def __init__(self, base_prompt: str):
+        self.base_prompt = base_prompt
+        self._prefixes = {}
+
+    def prefix(self, tool_mode: Optional[str]) -> str:
+        """tool_mode: None (sin herramientas), "native" o "prompt"."""
+        cached = self._prefixes.get(tool_mode)
+        if cached is None:
+            tools = {"native": NATIVE_TOOLS_HINT, "prompt": PROMPT_TOOLS_BLOCK}.get(tool_mode, "")
+            cached = self._prefixes[tool_mode] = self.base_prompt + tools
+        return cached
+
+    @staticmethod
+    def context_budget(intent: Optional[str]) -> int:
+        return settings.PROMPT_CONTEXT_TOKENS_BY_INTENT.get(intent or "", settings.PROMPT_CONTEXT_TOKENS)
+
+    @staticmethod
+    def fit_passages(items: Sequence, budget: int) -> Tuple[List, List[str]]:
+        """
+        Toma los pasajes en orden de ranking hasta agotar el presupuesto.
+        El primero que no cabe se trunca si queda espacio útil; el resto se descarta.
+        Devuelve (items usados, textos).
+        """
+        used, texts, seen, remaining = [], [], set(), budget
+        for item in items:
+            content = (item.content or "").strip()
+            if not content or content in seen: continue
+            cost = estimate_tokens(content) + 1  # viñeta "- "
+            if cost <= remaining:
+                texts.append(content)
+            elif remaining >= settings.PROMPT_MIN_PASSAGE_TOKENS:
+                texts.append(_truncate(content, remaining - 1))
+                cost = remaining
+            else:
+                break
+            seen.add(content)
+            used.append(item)
+            remaining -= cost
+        return used, texts
+
+    def build(self, context_items: Sequence, tool_mode: Optional[str], intent: Optional[str] = None) -> Tuple[str, List]:
+        used, texts = self.fit_passages(context_items, self.context_budget(intent))
+        context_text = "\n".join(f"- {text}" for text in texts)
+        return f"{self.prefix(tool_mode)}\n\nCONTEXTO RAG:\n{context_text}", used
@@ -1,28 +1,229 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import session_scope
 from app.models.knowledge import KnowledgeItem
-import pandas as pd
+from app.core.config import settings
+from app.services.vector_index import VectorIndex, IndexedDoc, get_embedder, STOPWORDS
+from app.services.graph_index import GraphCSR, NodeMentions
+from app.services.graph_service import graph_service
+from typing import Dict, List, NamedTuple, Optional
+import asyncio
+import re
+import time
+import numpy as np
+
+_FTS_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+# Tema de los documentos generales que se devuelven cuando nada coincide
+FALLBACK_TOPIC = "Identidad"
+
+def reciprocal_rank_fusion(rankings: List[List[IndexedDoc]], k: int = 60, limit: int = 3) -> List[IndexedDoc]:
+    """RRF: score(d) = sum(1 / (k + rank_i(d))). Robusto a escalas distintas (coseno vs ts_rank)."""
+    scores: Dict[str, float] = {}
+    docs: Dict[str, IndexedDoc] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            scores[doc.id] = scores.get(doc.id, 0.0) + 1.0 / (k + rank)
+            docs.setdefault(doc.id, doc)
+    ordered = sorted(scores, key=scores.get, reverse=True)
+    return [docs[doc_id] for doc_id in ordered[:limit]]
+
+class GraphMentions(NamedTuple):
+    """Todo lo que usa graph_search, publicado junto: índice, CSR y menciones siempre de la misma versión."""
+    index: VectorIndex
+    csr: GraphCSR
+    mentions: NodeMentions
+    doc_rows: Dict[str, int]
 
 class RAGService:
     def __init__(self):
-        # En una implementación real, aquí cargaríamos ChromaDB o FAISS
-        pass
+        # Índice vectorial local (NumPy) construido desde knowledge_items al arrancar
+        self.index: Optional[VectorIndex] = None
+        # Documento de respaldo del índice activo: se busca una vez al publicar el índice,
+        # no en cada consulta (recorrer el DocTable decodifica todo docs.jsonl)
+        self._fallback: Optional[IndexedDoc] = None
+        # Menciones de nodos del grafo por documento: se reconstruyen fuera del loop cuando
+        # cambia el índice o la topología y se publican en una sola asignación
+        self._graph: Optional[GraphMentions] = None
+
+    def _new_embedder(self):
+        return get_embedder(settings.RAG_EMBEDDER, settings.RAG_EMBEDDING_DIM, settings.RAG_LOCAL_MODEL)
+
+    def _build(self, db: Session) -> VectorIndex:
+        start = time.perf_counter()
+        items = db.query(KnowledgeItem).all()
+        docs = [
+            IndexedDoc(id=str(item.id), topic=item.topic, content=item.content, keywords=item.keywords)
+            for item in items if item.content
+        ]
+        previous = self.index or VectorIndex.load(settings.RAG_INDEX_DIR, self._new_embedder())
+        index = VectorIndex.build(self._new_embedder(), docs, previous=previous, refit_ratio=settings.RAG_REFIT_RATIO)
+        print(f"🧠 [RAG] Índice vectorial: {len(docs)} docs en {(time.perf_counter() - start) * 1000:.1f} ms")
+        return index
+
+    def build_index(self, db: Session):
+        """Reconstruye desde Postgres solo en memoria: el artefacto lo escribe ensure_index."""
+        self._publish(self._build(db))
+        return self.index
+
+    def ensure_index(self, db: Session, rebuild: bool = False):
+        """
+        Se llama con el candado de ingesta tomado, así un solo worker construye y escribe
+        el artefacto. Abre el existente salvo que falte o se pida `rebuild`; lo recién
+        escrito se reabre con memmap para servir desde la copia compartida del page cache.
+        Propaga OSError si no se pudo escribir (queda publicado el índice en memoria).
+        """
+        if not rebuild and self.load_index() is not None:
+            return self.index
+        index = self._build(db)
+        try:
+            index.save(settings.RAG_INDEX_DIR)
+        except OSError:
+            self._publish(index)
+            raise
+        if self.load_index() is None:
+            self._publish(index)
+        return self.index
+
+    def load_index(self) -> Optional[VectorIndex]:
+        """
+        Arranque en caliente: abre el artefacto en disco con memmap (compartido entre
+        workers vía page cache). None si no existe o no es compatible; no reconstruye.
+        """
+        index = VectorIndex.load(settings.RAG_INDEX_DIR, self._new_embedder())
+        if index is None: return None
+        self._publish(index)
+        print(f"🧠 [RAG] Índice vectorial mapeado desde disco: {len(index)} docs")
+        return self.index
+
+    def _publish(self, index: VectorIndex):
+        self._fallback = next((doc for doc in index.docs if doc.topic == FALLBACK_TOPIC), None)
+        self.index = index
+        self.refresh_graph_mentions()
+
+    def _fts_query(self, query: str) -> Optional[str]:
+        # OR de términos para maximizar recall; ts_rank_cd se encarga del orden
+        terms = [t for t in _FTS_TERM_RE.findall(query.lower()) if len(t) > 1 and t not in STOPWORDS]
+        return " | ".join(dict.fromkeys(terms)) or None
+
+    def _keyword_statement(self, query: str, limit: int):
+        ts_query_text = self._fts_query(query)
+        if not ts_query_text: return None
+        ts_query = func.to_tsquery("spanish", ts_query_text)
+        rank = func.ts_rank_cd(KnowledgeItem.search_vector, ts_query).label("rank")
+        return (
+            select(KnowledgeItem.id, KnowledgeItem.topic, KnowledgeItem.content, KnowledgeItem.keywords, rank)
+            .where(KnowledgeItem.search_vector.op("@@")(ts_query)).order_by(rank.desc()).limit(limit)
+        )
+
+    @staticmethod
+    def _rows_to_docs(rows) -> List[IndexedDoc]:
+        return [IndexedDoc(id=str(r.id), topic=r.topic, content=r.content, keywords=r.keywords) for r in rows]
+
+    def keyword_search(self, db: Session, query: str, limit: int = 10) -> List[IndexedDoc]:
+        """BM25-like vía Postgres full-text: usa el índice GIN sobre search_vector."""
+        stmt = self._keyword_statement(query, limit)
+        if stmt is None: return []
+        try:
+            rows = db.execute(stmt).all()
+        except Exception as e:
+            db.rollback()
+            print(f"⚠️ [RAG] Búsqueda full-text no disponible: {e}")
+            return []
+        return self._rows_to_docs(rows)
+
+    async def akeyword_search(self, db: AsyncSession, query: str, limit: int = 10) -> List[IndexedDoc]:
+        stmt = self._keyword_statement(query, limit)
+        if stmt is None: return []
+        try:
+            rows = (await db.execute(stmt)).all()
+        except Exception as e:
+            await db.rollback()
+            print(f"⚠️ [RAG] Búsqueda full-text no disponible: {e}")
+            return []
+        return self._rows_to_docs(rows)
+
+    def refresh_graph_mentions(self):
+        """
+        Construcción O(nodos × docs) con regex: se hace al cargar/reconstruir el índice o la
+        topología (arranque, ingesta, hilos), nunca dentro de una búsqueda en el event loop.
+        """
+        index, csr = self.index, graph_service.csr
+        if index is None or csr is None:
+            self._graph = None
+            return
+        docs = list(index.docs)
+        self._graph = GraphMentions(index, csr, NodeMentions(csr, [doc.text for doc in docs]),
+                                    {doc.id: row for row, doc in enumerate(docs)})
+
+    def graph_search(self, query: str, hits: List[IndexedDoc], limit: int = 10) -> List[IndexedDoc]:
+        """Expande por graph_edges (CSR en memoria) y devuelve los docs relacionados, por puntaje."""
+        graph = self._graph  # una sola lectura: versión consistente aunque otro hilo publique una nueva
+        if graph is None: return []
+        mentions, doc_rows = graph.mentions, graph.doc_rows
+
+        seeds: Dict[int, float] = {}
+        for node in mentions.nodes_in(query):
+            seeds[node] = seeds.get(node, 0.0) + 1.0
+        for rank, doc in enumerate(hits, start=1):
+            row = doc_rows.get(doc.id)
+            for node in mentions.doc_nodes[row] if row is not None else ():
+                seeds[node] = seeds.get(node, 0.0) + 1.0 / rank
+        if not seeds: return []
+
+        node_scores = graph.csr.expand(seeds, settings.RAG_GRAPH_HOPS, settings.RAG_GRAPH_DECAY)
+        doc_scores = mentions.doc_scores(node_scores, len(doc_rows))
+        if doc_scores is None: return []
+        top = np.flatnonzero(doc_scores >= settings.RAG_GRAPH_MIN_SCORE)
+        top = top[np.argsort(-doc_scores[top], kind="stable")][:limit]
+        return [graph.index.docs[int(row)] for row in top]
+
+    def _fuse(self, query: str, vector_hits: List[IndexedDoc], keyword_hits: Optional[List[IndexedDoc]], limit: int):
+        candidates = max(limit, settings.RAG_CANDIDATES)
+        rankings = [vector_hits]
+        if keyword_hits is not None:
+            rankings.append(keyword_hits)
+        if settings.RAG_GRAPH_ENABLED:
+            # GraphRAG: vecinos (k saltos) de los nodos mencionados en la consulta y en los mejores hits
+            seeds = reciprocal_rank_fusion(rankings, settings.RAG_RRF_K, candidates)
+            rankings.append(self.graph_search(query, seeds, candidates))
+
+        if len(rankings) > 1:
+            results = reciprocal_rank_fusion(rankings, settings.RAG_RRF_K, limit)
+        else:
+            results = vector_hits[:limit]
 
-    def search(self, db: Session, query: str, limit: int = 3):
-        # Simulación de búsqueda vectorial usando búsqueda de texto simple en SQL por ahora
-        # para no complicar el Docker con dependencias de vectores pesadas aún.
-        # "Solid Architecture" permite cambiar esto luego sin romper el router.
-        
-        results = db.query(KnowledgeItem).filter(
-            KnowledgeItem.content.ilike(f"%{query}%") | 
-            KnowledgeItem.keywords.ilike(f"%{query}%")
-        ).limit(limit).all()
-        
         if not results:
-            # Fallback: traer items generales si no hay coincidencia exacta
-            results = db.query(KnowledgeItem).filter(
-                KnowledgeItem.topic == "Identidad"
-            ).limit(1).all()
-            
+            # Fallback: traer items generales si no hay coincidencia semántica
+            results = [self._fallback] if self._fallback is not None else []
+
         return results
 
-rag_service = RAGService()
\ No newline at end of file
+    def _vector_hits(self, query: str, limit: int) -> List[IndexedDoc]:
+        candidates = max(limit, settings.RAG_CANDIDATES)
+        return [doc for doc, _ in self.index.query(query, candidates, min_score=settings.RAG_MIN_SCORE)]
+
+    def search(self, db: Session, query: str, limit: int = 3):
+        if self.index is None:
+            self.build_index(db)
+
+        candidates = max(limit, settings.RAG_CANDIDATES)
+        keyword_hits = self.keyword_search(db, query, candidates) if settings.RAG_HYBRID else None
+        return self._fuse(query, self._vector_hits(query, limit), keyword_hits, limit)
+
+    async def asearch(self, db: AsyncSession, query: str, limit: int = 3):
+        """Versión async: la consulta full-text no bloquea el event loop (asyncpg)."""
+        if self.index is None:
+            await asyncio.to_thread(self._build_index_standalone)
+
+        candidates = max(limit, settings.RAG_CANDIDATES)
+        keyword_hits = await self.akeyword_search(db, query, candidates) if settings.RAG_HYBRID else None
+        return self._fuse(query, self._vector_hits(query, limit), keyword_hits, limit)
+
+    def _build_index_standalone(self):
+        with session_scope() as db:
+            self.build_index(db)
+
+rag_service = RAGService()
+graph_service.topology_listeners.append(rag_service.refresh_graph_mentions)
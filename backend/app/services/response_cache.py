@@ -0,0 +1,183 @@
+from app.core.config import settings
+from app.services.rag_service import rag_service
+from app.services.vector_index import normalize_text
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, FrozenSet, List, Optional, Sequence
+import asyncio
+import hashlib
+import json
+import re
+import time
+import numpy as np
+
+# Caché de respuestas para preguntas repetidas (FAQ).
+#   Capa 1 (exacta): mensaje normalizado + IDs del contexto RAG + alcance del turno
+#   (modo de herramientas, intención e historial de la conversación).
+#   Capa 2 (semántica): coseno entre embeddings de mensajes con el MISMO contexto y alcance,
+#   y además las mismas palabras de polaridad y números (el embedder las descarta).
+# LRU con TTL y tope de memoria. Los turnos con herramienta nunca se guardan.
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_REPLAY_RE = re.compile(r"\S+\s*")
+
+# Stopwords para el embedder RAG, pero cambian el sentido de la pregunta:
+# "¿es gratis?" y "¿no es gratis?" dan el mismo vector.
+POLARITY_WORDS = frozenset({
+    "no", "si", "ni", "sin", "nunca", "jamas", "tampoco", "nada", "nadie",
+    "ningun", "ninguna", "ninguno", "mas", "menos", "ya", "aun", "todavia",
+})
+
+
+def normalize_message(message: str) -> str:
+    return " ".join(_WORD_RE.findall(normalize_text(message)))
+
+
+def guard_tokens(norm: str) -> FrozenSet[str]:
+    """Polaridad y números del mensaje normalizado: deben coincidir para un acierto semántico."""
+    return frozenset(t for t in norm.split() if t in POLARITY_WORDS or t.isdigit())
+
+
+def scope_key(tool_mode: Optional[str], intent: Optional[str], history: List[dict]) -> str:
+    """Alcance del turno: la respuesta depende de las instrucciones de herramientas, la intención y el historial."""
+    digest = hashlib.sha1(json.dumps(history, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()[:16] if history else ""
+    return f"{tool_mode or '-'}|{intent or '-'}|{digest}"
+
+
+@dataclass
+class CacheEntry:
+    key: str
+    context_key: str
+    guard: FrozenSet[str]
+    response: str
+    created: float
+    size: int
+    slot: int
+
+
+@dataclass
+class CacheHit:
+    response: str
+    match: str  # "exact" | "semantic"
+    score: float = 1.0
+
+
+class ResponseCache:
+    def __init__(self, embed: Callable[[Sequence[str]], np.ndarray], ttl: float, max_entries: int,
+                 max_bytes: int, similarity: float):
+        self.embed = embed
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.similarity = similarity
+        self.entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self.bytes = 0
+        # Matriz de embeddings preasignada; cada entrada ocupa un slot
+        self.vectors: Optional[np.ndarray] = None
+        self.free_slots = list(range(max_entries - 1, -1, -1))
+        self.hits = {"exact": 0, "semantic": 0, "miss": 0}
+
+    @staticmethod
+    def context_key(context_ids: Sequence[str], scope: str = "") -> str:
+        return f"{scope}#{','.join(sorted(context_ids))}"
+
+    def _expired(self, entry: CacheEntry, now: float) -> bool:
+        return now - entry.created > self.ttl
+
+    def _remove(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is None: return
+        self.bytes -= entry.size
+        self.free_slots.append(entry.slot)
+
+    def _vector(self, text: str) -> Optional[np.ndarray]:
+        try:
+            return self.embed([text])[0]
+        except Exception:
+            return None
+
+    def get(self, message: str, context_ids: Sequence[str], scope: str = "") -> Optional[CacheHit]:
+        now = time.monotonic()
+        context_key = self.context_key(context_ids, scope)
+        norm = normalize_message(message)
+        key = f"{norm}|{context_key}"
+
+        entry = self.entries.get(key)
+        if entry is not None:
+            if self._expired(entry, now):
+                self._remove(key)
+            else:
+                self.entries.move_to_end(key)
+                self.hits["exact"] += 1
+                return CacheHit(entry.response, "exact")
+
+        # Capa semántica: solo entre entradas con el mismo contexto/alcance y la misma polaridad
+        if self.vectors is not None and self.entries:
+            guard = guard_tokens(norm)
+            candidates = [
+                e for e in self.entries.values()
+                if e.context_key == context_key and e.guard == guard and not self._expired(e, now)
+            ]
+            query = self._vector(norm) if candidates else None
+            if query is not None:
+                slots = np.fromiter((e.slot for e in candidates), dtype=np.int64, count=len(candidates))
+                scores = self.vectors[slots] @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.similarity:
+                    match = candidates[best]
+                    self.entries.move_to_end(match.key)
+                    self.hits["semantic"] += 1
+                    return CacheHit(match.response, "semantic", float(scores[best]))
+
+        self.hits["miss"] += 1
+        return None
+
+    def put(self, message: str, context_ids: Sequence[str], response: str, scope: str = ""):
+        if not response: return
+        context_key = self.context_key(context_ids, scope)
+        norm = normalize_message(message)
+        key = f"{norm}|{context_key}"
+        size = len(response.encode("utf-8")) + len(key.encode("utf-8"))
+        if size > self.max_bytes: return
+
+        vector = self._vector(norm)
+        if vector is None: return
+        if self.vectors is None or self.vectors.shape[1] != vector.shape[0]:
+            self.vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+
+        self._remove(key)
+        # Expulsión LRU hasta respetar el número de entradas y el tope de bytes
+        while self.entries and (not self.free_slots or self.bytes + size > self.max_bytes):
+            self._remove(next(iter(self.entries)))
+
+        slot = self.free_slots.pop()
+        self.vectors[slot] = vector
+        self.entries[key] = CacheEntry(key, context_key, guard_tokens(norm), response, time.monotonic(), size, slot)
+        self.bytes += size
+
+    def clear(self):
+        for key in list(self.entries):
+            self._remove(key)
+
+    @staticmethod
+    async def replay(response: str):
+        """Reproduce la respuesta como stream (palabra a palabra), igual que el LLM."""
+        for piece in _REPLAY_RE.findall(response):
+            yield piece
+            await asyncio.sleep(0)
+
+
+def _embed(texts: Sequence[str]) -> np.ndarray:
+    # Reutiliza el embedder del índice RAG (mismo espacio vectorial)
+    if rag_service.index is None:
+        raise RuntimeError("Índice RAG no inicializado")
+    return rag_service.index.embedder.embed(texts)
+
+
+response_cache = ResponseCache(
+    embed=_embed,
+    ttl=settings.RESPONSE_CACHE_TTL,
+    max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+    max_bytes=settings.RESPONSE_CACHE_MAX_BYTES,
+    similarity=settings.RESPONSE_CACHE_SIMILARITY,
+)
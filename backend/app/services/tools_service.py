@@ -1,24 +1,11 @@
 from sqlalchemy.orm import Session
 from app.models.knowledge import ContactLead, CourseRegistration
-from app.database import SessionLocal
+from app.database import session_scope, AsyncSessionLocal
 
 class ToolsService:
-    def handle_tool_call(self, action: str, data: dict):
-        """
-        Recibe la acción y el diccionario de datos YA VALIDADO por Pydantic.
-        """
-        print(f"🔧 [TOOL_SERVICE] Procesando: {action} con datos: {data}")
-
+    def _build_record(self, action: str, data: dict):
+        """Devuelve (registro ORM, respuesta de éxito, log) o None si la acción no existe."""
         if action == "save_contact":
-            return self._save_contact(data)
-        elif action == "register_course":
-            return self._register_course(data)
-        
-        return {"status": "error", "msg": f"Acción '{action}' no implementada"}
-
-    def _save_contact(self, data):
-        db = SessionLocal()
-        try:
             lead = ContactLead(
                 nombre=data.get("nombre"),
                 correo=data.get("correo"),
@@ -27,30 +14,54 @@ class ToolsService:
                 interes=data.get("interes"),
                 mensaje=data.get("mensaje") # Opcional
             )
-            db.add(lead)
-            db.commit()
-            print("💾 [DB] Lead guardado.")
-            return {"status": "success", "msg": "Contacto guardado en CRM."}
-        except Exception as e:
-            print(f"❌ [DB ERROR] {e}")
-            return {"status": "error", "msg": "Error de base de datos."}
-        finally: db.close()
-
-    def _register_course(self, data):
-        db = SessionLocal()
-        try:
+            return lead, {"status": "success", "msg": "Contacto guardado en CRM."}, "💾 [DB] Lead guardado."
+        elif action == "register_course":
             reg = CourseRegistration(
                 student_name=data.get("nombre"),
                 email=data.get("correo"),
                 course_name=data.get("curso")
             )
-            db.add(reg)
-            db.commit()
-            print(f"💾 [DB] Inscripción guardada: {data.get('curso')}")
-            return {"status": "success", "msg": f"Inscripción exitosa en {data.get('curso')}."}
+            return reg, {"status": "success", "msg": f"Inscripción exitosa en {data.get('curso')}."}, f"💾 [DB] Inscripción guardada: {data.get('curso')}"
+        return None
+
+    def handle_tool_call(self, action: str, data: dict):
+        """
+        Recibe la acción y el diccionario de datos YA VALIDADO por Pydantic.
+        """
+        print(f"🔧 [TOOL_SERVICE] Procesando: {action} con datos: {data}")
+
+        built = self._build_record(action, data)
+        if built is None:
+            return {"status": "error", "msg": f"Acción '{action}' no implementada"}
+
+        record, result, log = built
+        try:
+            with session_scope() as db:
+                db.add(record)
+                db.commit()
+            print(log)
+            return result
         except Exception as e:
             print(f"❌ [DB ERROR] {e}")
             return {"status": "error", "msg": "Error de base de datos."}
-        finally: db.close()
 
-tools_service = ToolsService()
\ No newline at end of file
+    async def ahandle_tool_call(self, action: str, data: dict):
+        """Versión async (asyncpg) de handle_tool_call."""
+        print(f"🔧 [TOOL_SERVICE] Procesando: {action} con datos: {data}")
+
+        built = self._build_record(action, data)
+        if built is None:
+            return {"status": "error", "msg": f"Acción '{action}' no implementada"}
+
+        record, result, log = built
+        async with AsyncSessionLocal() as db:
+            try:
+                db.add(record)
+                await db.commit()
+                print(log)
+                return result
+            except Exception as e:
+                print(f"❌ [DB ERROR] {e}")
+                return {"status": "error", "msg": "Error de base de datos."}
+
+tools_service = ToolsService()
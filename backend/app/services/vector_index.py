@@ -0,0 +1,286 @@
+from dataclasses import dataclass, asdict
+from typing import List, Optional, Sequence, Tuple
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+import time
+import unicodedata
+import zlib
+import numpy as np
+
+# Índice vectorial en proceso: una matriz contigua (n_docs x dim) en float32
+# con filas normalizadas L2, de modo que el coseno es un simple producto punto.
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+STOPWORDS = {
+    "el", "la", "los", "las", "un", "una", "unos", "unas", "de", "del", "al", "a",
+    "en", "y", "o", "u", "que", "por", "para", "con", "sin", "se", "su", "sus",
+    "es", "son", "lo", "le", "les", "me", "mi", "mis", "te", "tu", "tus", "yo",
+    "como", "mas", "pero", "si", "no", "ya", "hay", "este", "esta", "estos", "estas",
+    "ese", "esa", "eso", "muy", "qué", "cual", "cuales", "quiero", "tienen", "tiene",
+}
+
+
+def normalize_text(text: str) -> str:
+    """Minúsculas y sin acentos, para que 'Educación' y 'educacion' coincidan."""
+    text = unicodedata.normalize("NFKD", (text or "").lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(normalize_text(text)) if len(t) > 1 and t not in STOPWORDS]
+
+
+@dataclass
+class IndexedDoc:
+    id: str
+    topic: Optional[str]
+    content: str
+    keywords: Optional[str] = None
+
+    @property
+    def text(self) -> str:
+        # El tema y las keywords pesan igual que el contenido para el embedding
+        return " ".join(filter(None, [self.topic, self.keywords, self.content]))
+
+    @property
+    def fingerprint(self) -> str:
+        return hashlib.sha1(self.text.encode("utf-8")).hexdigest()
+
+
+class Embedder:
+    """
+    Interfaz mínima de un embedder local (solo CPU).
+    `embed` devuelve una matriz float32 (n, dim) con filas normalizadas L2.
+    """
+    name = "base"
+    dim = 0
+
+    def fit(self, texts: Sequence[str]) -> "Embedder":
+        return self
+
+    def config(self) -> dict:
+        return {"name": self.name, "dim": self.dim}
+
+    def save_state(self, path: str):
+        pass
+
+    def load_state(self, path: str):
+        pass
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        raise NotImplementedError
+
+
+class HashingTfidfEmbedder(Embedder):
+    """
+    TF-IDF con hashing trick: unigramas + bigramas de palabras proyectados
+    a `dim` cubetas con signo (crc32, estable entre procesos).
+    """
+    name = "hashing"
+
+    def __init__(self, dim: int = 1024):
+        self.dim = dim
+        self.idf = np.ones(dim, dtype=np.float32)
+
+    def _features(self, text: str) -> List[str]:
+        tokens = tokenize(text)
+        return tokens + [f"{a}_{b}" for a, b in zip(tokens, tokens[1:])]
+
+    def _hashed_tf(self, texts: Sequence[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                h = zlib.crc32(feature.encode("utf-8"))
+                sign = 1.0 if (h >> 31) & 1 == 0 else -1.0
+                matrix[row, h % self.dim] += sign
+        # TF sublineal: 1 + log(tf) conservando el signo de la cubeta
+        return np.sign(matrix) * np.log1p(np.abs(matrix))
+
+    def fit(self, texts: Sequence[str]) -> "HashingTfidfEmbedder":
+        if not texts: return self
+        tf = self._hashed_tf(texts)
+        df = np.count_nonzero(tf, axis=0).astype(np.float32)
+        self.idf = (np.log((1.0 + len(texts)) / (1.0 + df)) + 1.0).astype(np.float32)
+        return self
+
+    def save_state(self, path: str):
+        self.idf.astype(np.float32).tofile(os.path.join(path, "idf.f32"))
+
+    def load_state(self, path: str):
+        self.idf = np.memmap(os.path.join(path, "idf.f32"), dtype=np.float32, mode="r", shape=(self.dim,))
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        matrix = self._hashed_tf(texts) * self.idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return np.ascontiguousarray(matrix / norms, dtype=np.float32)
+
+
+class SentenceTransformerEmbedder(Embedder):
+    """
+    Modelo local pequeño vía sentence-transformers (dependencia opcional).
+    Solo se importa si se selecciona con RAG_EMBEDDER=local.
+    """
+    name = "local"
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def config(self) -> dict:
+        return {"name": self.name, "dim": self.dim, "model": self.model_name}
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = self.model.encode(list(texts), normalize_embeddings=True, convert_to_numpy=True)
+        return np.ascontiguousarray(vectors, dtype=np.float32)
+
+
+def get_embedder(name: str, dim: int = 1024, model_name: Optional[str] = None) -> Embedder:
+    if name == "local":
+        try:
+            return SentenceTransformerEmbedder(model_name)
+        except Exception as e:
+            print(f"⚠️ [RAG] Modelo local no disponible ({e}), usando hashing TF-IDF.")
+    return HashingTfidfEmbedder(dim)
+
+
+# --- ARTEFACTO EN DISCO ---
+# <root>/CURRENT apunta a la versión activa <root>/v<FORMAT>-<ts>/ que contiene:
+#   manifest.json  -> formato, embedder, dim, count
+#   vectors.f32    -> matriz cruda float32 (count x dim), se abre con np.memmap
+#   docs.jsonl     -> un documento JSON por línea
+#   offsets.u64    -> offsets en bytes de cada línea de docs.jsonl (count + 1)
+# Con memmap, N workers comparten una sola copia en el page cache del SO.
+
+INDEX_FORMAT_VERSION = 1
+
+
+class DocTable:
+    """Secuencia de IndexedDoc respaldada por docs.jsonl mapeado en memoria; decodifica solo los hits."""
+
+    def __init__(self, path: str):
+        self.offsets = np.memmap(os.path.join(path, "offsets.u64"), dtype=np.uint64, mode="r")
+        self.blob = np.memmap(os.path.join(path, "docs.jsonl"), dtype=np.uint8, mode="r") if self.offsets[-1] else b""
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> IndexedDoc:
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return IndexedDoc(**json.loads(bytes(self.blob[start:end])))
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    @staticmethod
+    def write(path: str, docs: Sequence[IndexedDoc]):
+        offsets = [0]
+        with open(os.path.join(path, "docs.jsonl"), "wb") as f:
+            for doc in docs:
+                line = json.dumps(asdict(doc), ensure_ascii=False).encode("utf-8") + b"\n"
+                f.write(line)
+                offsets.append(offsets[-1] + len(line))
+        np.asarray(offsets, dtype=np.uint64).tofile(os.path.join(path, "offsets.u64"))
+
+
+class VectorIndex:
+    def __init__(self, embedder: Embedder, matrix: np.ndarray, docs: Sequence[IndexedDoc]):
+        self.embedder = embedder
+        self.matrix = matrix
+        self.docs = docs
+
+    @classmethod
+    def build(cls, embedder: Embedder, docs: List[IndexedDoc], previous: Optional["VectorIndex"] = None,
+              refit_ratio: float = 0.3) -> "VectorIndex":
+        """
+        Con `previous`, reutiliza las filas de los docs cuyo contenido no cambió y
+        solo embebe los nuevos/cambiados con el estado (IDF) congelado del índice previo.
+        Si cambia más de `refit_ratio` del corpus, reajusta el embedder completo.
+        """
+        if previous is not None and len(previous) and previous.embedder.config() == embedder.config():
+            previous_rows = {doc.fingerprint: row for row, doc in enumerate(previous.docs)}
+            reuse = [previous_rows.get(doc.fingerprint) for doc in docs]
+            missing = [i for i, row in enumerate(reuse) if row is None]
+            if docs and len(missing) <= refit_ratio * len(docs):
+                matrix = np.empty((len(docs), previous.embedder.dim), dtype=np.float32)
+                kept = [i for i, row in enumerate(reuse) if row is not None]
+                if kept:
+                    matrix[kept] = previous.matrix[[reuse[i] for i in kept]]
+                if missing:
+                    matrix[missing] = previous.embedder.embed([docs[i].text for i in missing])
+                print(f"🧠 [RAG] Re-embebidos {len(missing)} de {len(docs)} docs")
+                return cls(previous.embedder, matrix, docs)
+
+        texts = [d.text for d in docs]
+        embedder.fit(texts)
+        matrix = embedder.embed(texts) if texts else np.zeros((0, embedder.dim), dtype=np.float32)
+        return cls(embedder, matrix, docs)
+
+    def __len__(self):
+        return len(self.docs)
+
+    def query(self, text: str, k: int = 3, min_score: float = 0.0) -> List[Tuple[IndexedDoc, float]]:
+        if not len(self.docs): return []
+        q = self.embedder.embed([text])[0]
+        # Un solo matmul vectorizado sobre toda la matriz
+        scores = self.matrix @ q
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.docs[i], float(scores[i])) for i in top if scores[i] > min_score and not math.isnan(scores[i])]
+
+    def save(self, root: str, keep: int = 2) -> str:
+        """Escribe una nueva versión del artefacto y la activa de forma atómica."""
+        os.makedirs(root, exist_ok=True)
+        version = f"v{INDEX_FORMAT_VERSION}-{time.time_ns()}"
+        path = os.path.join(root, version)
+        os.makedirs(path)
+        np.ascontiguousarray(self.matrix, dtype=np.float32).tofile(os.path.join(path, "vectors.f32"))
+        DocTable.write(path, self.docs)
+        self.embedder.save_state(path)
+        manifest = {
+            "format": INDEX_FORMAT_VERSION,
+            "embedder": self.embedder.config(),
+            "count": len(self.docs),
+            "created_at": time.time(),
+        }
+        with open(os.path.join(path, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+
+        tmp = os.path.join(root, f"CURRENT.{os.getpid()}")
+        with open(tmp, "w") as f: f.write(version)
+        os.replace(tmp, os.path.join(root, "CURRENT"))
+
+        # Limpieza de versiones viejas (los workers con memmap abierto conservan sus inodos)
+        versions = sorted(d for d in os.listdir(root) if d.startswith(f"v{INDEX_FORMAT_VERSION}-"))
+        for old in versions[:-keep]:
+            shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+        return path
+
+    @classmethod
+    def load(cls, root: str, embedder: Embedder) -> Optional["VectorIndex"]:
+        """Abre la versión activa con np.memmap. Devuelve None si no existe o no es compatible."""
+        try:
+            with open(os.path.join(root, "CURRENT")) as f: version = f.read().strip()
+            path = os.path.join(root, version)
+            with open(os.path.join(path, "manifest.json"), encoding="utf-8") as f: manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if manifest.get("format") != INDEX_FORMAT_VERSION or manifest.get("embedder") != embedder.config():
+            return None
+
+        count, dim = manifest["count"], embedder.dim
+        embedder.load_state(path)
+        if count:
+            matrix = np.memmap(os.path.join(path, "vectors.f32"), dtype=np.float32, mode="r", shape=(count, dim))
+        else:
+            matrix = np.zeros((0, dim), dtype=np.float32)
+        return cls(embedder, matrix, DocTable(path))
@@ -0,0 +1,81 @@
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List
+import hashlib
+import re
+
+# Chunker en streaming: consume el documento línea por línea y emite pasajes
+# acotados por tokens con solapamiento, sin cargar el archivo completo.
+
+_WORD_RE = re.compile(r"\S+")
+
+
+def count_tokens(text: str) -> int:
+    # Aproximación local: palabras separadas por espacios
+    return len(_WORD_RE.findall(text))
+
+
+@dataclass
+class Chunk:
+    id: str
+    parent_id: str
+    index: int
+    content: str
+    tokens: int
+
+
+def _split_long_line(line: str, max_tokens: int) -> Iterator[str]:
+    words = _WORD_RE.findall(line)
+    for start in range(0, len(words), max_tokens):
+        yield " ".join(words[start:start + max_tokens])
+
+
+def iter_chunks(lines: Iterable[str], parent_id: str, max_tokens: int = 120, overlap: int = 30) -> Iterator[Chunk]:
+    """
+    Agrupa líneas completas hasta `max_tokens`; al cortar, arrastra las
+    últimas líneas (hasta `overlap` tokens) al siguiente pasaje.
+    El ID es estable: hash del contenido, así un pasaje sin cambios conserva su ID.
+    """
+    window: List[str] = []
+    window_tokens = 0
+    index = 0
+    seen = set()
+
+    def emit():
+        nonlocal index
+        content = "\n".join(window)
+        digest = hashlib.sha1(content.encode("utf-8")).hexdigest()[:12]
+        chunk_id = f"{parent_id}:{digest}"
+        if chunk_id in seen: chunk_id = f"{chunk_id}:{index}"
+        seen.add(chunk_id)
+        chunk = Chunk(id=chunk_id, parent_id=parent_id, index=index, content=content, tokens=window_tokens)
+        index += 1
+        return chunk
+
+    def pieces():
+        for raw in lines:
+            line = raw.strip()
+            if not line: continue
+            if count_tokens(line) > max_tokens:
+                yield from _split_long_line(line, max_tokens)
+            else:
+                yield line
+
+    for line in pieces():
+        tokens = count_tokens(line)
+        if window and window_tokens + tokens > max_tokens:
+            yield emit()
+            # Solapamiento: conservar la cola de la ventana
+            tail, tail_tokens = [], 0
+            for prev in reversed(window):
+                prev_tokens = count_tokens(prev)
+                if tail_tokens + prev_tokens > overlap: break
+                tail.insert(0, prev)
+                tail_tokens += prev_tokens
+            while tail and tail_tokens + tokens > max_tokens:
+                tail_tokens -= count_tokens(tail.pop(0))
+            window, window_tokens = tail, tail_tokens
+        window.append(line)
+        window_tokens += tokens
+
+    if window:
+        yield emit()
@@ -0,0 +1,54 @@
+from sqlalchemy import tuple_
+from datetime import datetime
+from typing import Optional, Sequence, Tuple
+import base64
+import json
+import uuid
+
+# Paginación por keyset (cursor) sobre (columna de orden, id): cada página es un
+# rango del índice compuesto, sin OFFSET. El cuerpo sigue siendo una lista y el
+# cursor de la siguiente página viaja en la cabecera X-Next-Cursor.
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(moment: datetime, key) -> str:
+    raw = json.dumps([moment.isoformat(), str(key)], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """ValueError si el cursor no es válido (el router responde 400)."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        moment, key = json.loads(raw)
+        return datetime.fromisoformat(moment), str(key)
+    except Exception as e:
+        raise ValueError("Cursor inválido") from e
+
+
+def keyset(stmt, order_column, key_column, cursor: Optional[str], limit: int, descending: bool = True):
+    """Aplica orden, filtro por cursor y LIMIT (una fila extra para saber si hay más)."""
+    if cursor:
+        moment, key = decode_cursor(cursor)
+        if getattr(key_column.type, "as_uuid", False):
+            try:
+                key = uuid.UUID(key)
+            except ValueError as e:
+                raise ValueError("Cursor inválido") from e
+        position = tuple_(order_column, key_column)
+        stmt = stmt.where(position < tuple_(moment, key) if descending else position > tuple_(moment, key))
+    if descending:
+        stmt = stmt.order_by(order_column.desc(), key_column.desc())
+    else:
+        stmt = stmt.order_by(order_column.asc(), key_column.asc())
+    return stmt.limit(limit + 1)
+
+
+def split_page(rows: Sequence, limit: int, order_attr: str, key_attr: str):
+    """(filas de la página, cursor siguiente o None)."""
+    if len(rows) <= limit:
+        return list(rows), None
+    page = list(rows[:limit])
+    last = page[-1]
+    return page, encode_cursor(getattr(last, order_attr), getattr(last, key_attr))
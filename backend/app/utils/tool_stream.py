@@ -0,0 +1,83 @@
+from typing import List, Optional
+
+# Parser incremental del bloque de herramienta dentro del stream del LLM:
+#   texto visible ... @@TOOL_CALL: {json} @@
+# Cada chunk se revisa una sola vez (sin volver a escanear lo acumulado).
+
+SENTINEL = "@@"
+TOOL_PREFIX = "TOOL_CALL:"
+
+
+class ToolCallStreamParser:
+    TEXT, TOOL, DONE = "text", "tool", "done"
+
+    def __init__(self):
+        self.state = self.TEXT
+        self.parts: List[str] = []      # respuesta completa (para log y caché)
+        self._pending = ""              # posible inicio de "@@" partido entre chunks
+        self._tool_parts: List[str] = []
+        self._tool_tail = ""            # últimos caracteres del bloque, para detectar el cierre
+        self.tool_body: Optional[str] = None
+
+    @property
+    def sentinel_seen(self) -> bool:
+        return self.state != self.TEXT
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+    def feed(self, chunk: str) -> str:
+        """Consume un chunk y devuelve la parte que se puede mostrar al usuario."""
+        self.parts.append(chunk)
+        if self.state == self.TEXT:
+            return self._feed_text(chunk)
+        if self.state == self.TOOL:
+            self._feed_tool(chunk)
+        return ""
+
+    def flush(self) -> str:
+        """Fin del stream: un '@' suelto retenido era texto normal."""
+        pending, self._pending = self._pending, ""
+        return pending if self.state == self.TEXT else ""
+
+    def _feed_text(self, chunk: str) -> str:
+        data = self._pending + chunk
+        self._pending = ""
+        idx = data.find(SENTINEL)
+        if idx >= 0:
+            self.state = self.TOOL
+            self._feed_tool(data[idx + len(SENTINEL):])
+            return data[:idx]
+        # Retener un '@' final: puede ser la primera mitad del centinela
+        if data.endswith(SENTINEL[0]):
+            self._pending = SENTINEL[0]
+            return data[:-1]
+        return data
+
+    def _feed_tool(self, chunk: str):
+        if not chunk: return
+        # Solo se busca el cierre en el chunk nuevo más el carácter previo
+        window = self._tool_tail + chunk
+        idx = window.find(SENTINEL)
+        if idx < 0:
+            self._tool_parts.append(chunk)
+            self._tool_tail = window[-(len(SENTINEL) - 1):]
+            return
+        consumed = idx - len(self._tool_tail)
+        if consumed > 0:
+            self._tool_parts.append(chunk[:consumed])
+        elif consumed < 0:
+            # El cierre empezó en el chunk anterior: quitar ese carácter del cuerpo
+            self._tool_parts[-1] = self._tool_parts[-1][:consumed]
+        self.tool_body = "".join(self._tool_parts)
+        self.state = self.DONE
+
+    @property
+    def tool_json(self) -> Optional[str]:
+        """JSON de la llamada si el bloque cerrado es un @@TOOL_CALL: {...} @@."""
+        if self.tool_body is None: return None
+        body = self.tool_body.strip()
+        if not body.startswith(TOOL_PREFIX): return None
+        body = body[len(TOOL_PREFIX):].strip()
+        return body if body.startswith("{") and body.endswith("}") else None
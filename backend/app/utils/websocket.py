@@ -1,22 +1,118 @@
 from fastapi import WebSocket
-from typing import List, Any, Optional
+from app.core.config import settings
+from app.services.event_bus import event_bus
+from collections import deque
+from typing import Dict, Iterable, Any, Optional, Set
+import asyncio
 import json
 
+# Fan-out no bloqueante: cada socket tiene su cola acotada y su propia tarea de envío.
+# El request de chat solo encola; un dashboard lento nunca frena el stream de otro usuario.
+#   - Si la cola se llena se descarta el evento más antiguo.
+#   - "graph_heat": un frame de diferencias por tick del agregador de GraphService.
+#   - Si un envío falla o excede WS_SEND_TIMEOUT se cierra el socket (1013) para que el cliente reconecte.
+# Suscripciones opcionales por tema y por session_id; sin filtros se recibe todo.
+
+TOPICS = ("log", "graph_heat")
+
+
+class ClientConnection:
+    def __init__(self, websocket: WebSocket, topics: Optional[Set[str]] = None, sessions: Optional[Set[str]] = None):
+        self.websocket = websocket
+        self.topics = topics
+        self.sessions = sessions
+        self.pending: "deque[str]" = deque()
+        self.ready = asyncio.Event()
+        self.dropped = 0
+        self.task: Optional[asyncio.Task] = None
+
+    def wants(self, topic: str, session_id: Optional[str]) -> bool:
+        if self.topics is not None and topic not in self.topics: return False
+        # Los eventos globales (sin sesión) llegan a todos los suscritos al tema
+        if session_id is None or self.sessions is None: return True
+        return session_id in self.sessions
+
+    def enqueue(self, text: str):
+        self.pending.append(text)
+        while len(self.pending) > settings.WS_QUEUE_SIZE:
+            self.pending.popleft()
+            self.dropped += 1
+        self.ready.set()
+
+    async def run(self, on_error):
+        try:
+            while True:
+                await self.ready.wait()
+                self.ready.clear()
+                while self.pending:
+                    text = self.pending.popleft()
+                    await asyncio.wait_for(self.websocket.send_text(text), timeout=settings.WS_SEND_TIMEOUT)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Socket cerrado o cliente demasiado lento: se libera la conexión y se cierra el
+            # socket (1013, "try again later"); el frontend reconecta al recibir el cierre
+            on_error(self.websocket)
+            try:
+                await asyncio.wait_for(self.websocket.close(code=1013), timeout=settings.WS_SEND_TIMEOUT)
+            except Exception:
+                pass
+
+
+def _parse_filter(value: Optional[Iterable[str]]) -> Optional[Set[str]]:
+    if value is None: return None
+    if isinstance(value, str): value = value.split(",")
+    items = {v.strip() for v in value if v and v.strip()}
+    return items or None
+
+
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
+        self.clients: Dict[WebSocket, ClientConnection] = {}
 
-    async def connect(self, websocket: WebSocket):
+    @property
+    def active_connections(self):
+        return list(self.clients)
+
+    async def connect(self, websocket: WebSocket, topics=None, sessions=None):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        client = ClientConnection(websocket, _parse_filter(topics), _parse_filter(sessions))
+        client.task = asyncio.create_task(client.run(self.disconnect))
+        self.clients[websocket] = client
 
     def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+        client = self.clients.pop(websocket, None)
+        if client and client.task and client.task is not asyncio.current_task():
+            client.task.cancel()
+
+    def subscribe(self, websocket: WebSocket, topics=None, sessions=None):
+        """Mensaje del cliente: {"action": "subscribe", "topics": [...], "sessions": [...]}."""
+        client = self.clients.get(websocket)
+        if client is None: return
+        client.topics = _parse_filter(topics)
+        client.sessions = _parse_filter(sessions)
+
+    async def handle_client_message(self, websocket: WebSocket, raw: str):
+        try:
+            message = json.loads(raw)
+        except ValueError:
+            return
+        if isinstance(message, dict) and message.get("action") == "subscribe":
+            self.subscribe(websocket, message.get("topics"), message.get("sessions"))
 
-    async def broadcast_log(self, step: str, detail: str, status: str = "running", data: Optional[Any] = None):
+    def publish(self, topic: str, message: dict, session_id: Optional[str] = None):
+        if not self.clients: return
+        # Se serializa una sola vez por evento, no una vez por socket
+        text = json.dumps(message, default=str)
+        for client in list(self.clients.values()):
+            if client.wants(topic, session_id):
+                client.enqueue(text)
+
+    async def broadcast_log(self, step: str, detail: str, status: str = "running", data: Optional[Any] = None,
+                            session_id: Optional[str] = None):
         message = {
             "type": "log",
+            "session_id": session_id,
             "payload": {
                 "step": step,
                 "detail": detail,
@@ -25,23 +121,40 @@ class ConnectionManager:
                 "data": data
             }
         }
-        for connection in self.active_connections:
-            try: await connection.send_json(message)
-            except: pass
+        # Pasa por el bus: los dashboards conectados a otros workers también lo reciben
+        await event_bus.publish("log", message)
 
-    async def broadcast_graph_update(self, node_id: str, new_weight: int):
+    async def broadcast_graph_frame(self, nodes: dict, node_id: Optional[str] = None):
         """
-        Notifica al frontend que un nodo ha crecido en importancia.
+        Notifica al frontend los nodos cuyo peso cambió en el último tick.
+        `node_id`/`new_weight` señalan el nodo recién impulsado (clientes anteriores solo leen esos campos).
         """
         message = {
             "type": "graph_heat",
-            "payload": { 
+            "payload": {
                 "node_id": node_id,
-                "new_weight": new_weight
+                "new_weight": nodes.get(node_id) if node_id else None,
+                "nodes": nodes
             }
         }
-        for connection in self.active_connections:
-            try: await connection.send_json(message)
-            except: pass
+        # El agregador ya acota la tasa a un frame por tick
+        self.publish("graph_heat", message)
+
+    def send_graph_snapshot(self, websocket: WebSocket, nodes: dict):
+        """Pesos actuales completos a un cliente recién conectado (el GET /graph trae los pesos base)."""
+        client = self.clients.get(websocket)
+        if client is None or not client.wants("graph_heat", None): return
+        client.enqueue(json.dumps({"type": "graph_heat", "payload": {"node_id": None, "new_weight": None, "nodes": nodes}}, default=str))
+
+    def deliver_log(self, message: dict):
+        self.publish("log", message, message.get("session_id"))
+
+    def metrics(self) -> dict:
+        return {
+            "connections": len(self.clients),
+            "queued": sum(len(c.pending) for c in self.clients.values()),
+            "dropped": sum(c.dropped for c in self.clients.values()),
+        }
 
-manager = ConnectionManager()
\ No newline at end of file
+manager = ConnectionManager()
+event_bus.subscribe("log", manager.deliver_log)
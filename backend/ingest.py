@@ -1,46 +1,88 @@
 import os
-import pandas as pd
+import csv
+from app.utils.chunking import iter_chunks
 
 # Este script simula la "Vectorización". 
-# Lee los archivos de texto y los prepara para la base de datos.
+# Lee los archivos de texto, los parte en pasajes con solapamiento y los prepara para la base de datos.
 
 DOCS_DIR = "documents"
 OUTPUT_CSV = "data/knowledge_base_full.csv"
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", 120))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", 30))
+
+FIELDS = ["ID", "Tema", "Contenido", "Keywords", "Nivel_Tecnico", "Sector_Aplicacion", "Fuente_URL", "Documento_Padre", "Chunk_Index"]
 
 def ingest_documents():
-    data = []
     print(f"📂 Leyendo documentos desde {DOCS_DIR}...")
     
     if not os.path.exists(DOCS_DIR):
         print("❌ No existe el directorio de documentos.")
         return
 
-    for filename in os.listdir(DOCS_DIR):
-        if filename.endswith(".txt"):
+    os.makedirs("data", exist_ok=True)
+    total = 0
+    # Escritura en streaming: cada pasaje va directo al CSV, sin acumular documentos en memoria
+    with open(OUTPUT_CSV, "w", encoding="utf-8", newline="") as out:
+        writer = csv.DictWriter(out, fieldnames=FIELDS)
+        writer.writeheader()
+
+        for filename in sorted(os.listdir(DOCS_DIR)):
+            if not filename.endswith(".txt"): continue
             filepath = os.path.join(DOCS_DIR, filename)
+            parent_id = filename.replace(".txt", "")
+
+            # Crear metadatos básicos basados en el nombre del archivo
+            topic = parent_id.replace("_", " ").title()
+
             with open(filepath, "r", encoding="utf-8") as f:
-                content = f.read()
-                
-                # Crear metadatos básicos basados en el nombre del archivo
-                topic = filename.replace(".txt", "").replace("_", " ").title()
-                
-                data.append({
-                    "ID": filename,
+                rows = [{
+                    "ID": chunk.id,
                     "Tema": topic,
-                    "Contenido": content,
+                    "Contenido": chunk.content,
                     "Keywords": "ciai, yucatan, ia", # Placeholder
                     "Nivel_Tecnico": "General",
                     "Sector_Aplicacion": "Transversal",
-                    "Fuente_URL": "Documentación Oficial CIAY"
-                })
-                print(f"  ✅ Procesado: {filename}")
+                    "Fuente_URL": "Documentación Oficial CIAY",
+                    "Documento_Padre": parent_id,
+                    "Chunk_Index": chunk.index
+                } for chunk in iter_chunks(f, parent_id, CHUNK_MAX_TOKENS, CHUNK_OVERLAP)]
 
-    # Guardar como CSV listo para el sistema RAG
-    df = pd.DataFrame(data)
-    os.makedirs("data", exist_ok=True)
-    df.to_csv(OUTPUT_CSV, index=False)
-    print(f"🚀 Base de conocimiento generada en: {OUTPUT_CSV}")
+            writer.writerows(rows)
+            total += len(rows)
+            print(f"  ✅ Procesado: {filename} ({len(rows)} pasajes)")
+
+    print(f"🚀 Base de conocimiento generada en: {OUTPUT_CSV} ({total} pasajes)")
     print("   (Ahora el sistema RAG leerá de este archivo maestro)")
 
+def build_index_artifact():
+    """
+    Escribe el artefacto versionado del índice (data/index) para que los
+    workers de uvicorn arranquen en caliente con memmap en lugar de reconstruir.
+    """
+    try:
+        from app.core.config import settings
+        from app.database import SessionLocal, Base, engine
+        from app.models.schema_patches import apply_schema_patches
+        from app.services.ingestion_service import ingestion_service
+        from app.services.rag_service import rag_service
+    except Exception as e:
+        print(f"⚠️ No se pudo cargar la configuración del backend ({e}); índice no generado.")
+        return
+
+    Base.metadata.create_all(bind=engine)
+    apply_schema_patches(engine)
+    db = SessionLocal()
+    try:
+        ingestion_service.ingest_initial_data(db)
+        if rag_service.load_index() is None:
+            print("⚠️ El índice no quedó escrito en disco.")
+        else:
+            print(f"🧠 Índice vectorial escrito en: {settings.RAG_INDEX_DIR}")
+    except Exception as e:
+        print(f"⚠️ Error generando el índice: {e}")
+    finally:
+        db.close()
+
 if __name__ == "__main__":
-    ingest_documents()
\ No newline at end of file
+    ingest_documents()
+    build_index_artifact()
\ No newline at end of file
@@ -0,0 +1,16 @@
+import os
+
+# Las pruebas unitarias no tocan la base ni el LLM, pero app.core.config exige
+# estas variables al importarse. Valores de relleno si no vienen del entorno.
+for name, value in {
+    "PROJECT_NAME": "ciay-tests",
+    "POSTGRES_SERVER": "localhost",
+    "POSTGRES_USER": "postgres",
+    "POSTGRES_PASSWORD": "postgres",
+    "POSTGRES_DB": "ciay",
+    "POSTGRES_PORT": "5432",
+    "SECRET_KEY": "test",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "60",
+    "DEEPSEEK_API_KEY": "test",
+}.items():
+    os.environ.setdefault(name, value)
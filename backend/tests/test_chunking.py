@@ -0,0 +1,32 @@
+from app.utils.chunking import count_tokens, iter_chunks
+
+
+def words(prefix, n):
+    return " ".join(f"{prefix}{i}" for i in range(n))
+
+
+def test_chunks_respect_max_tokens_and_overlap():
+    lines = [words(f"l{i}_", 10) for i in range(10)]
+    chunks = list(iter_chunks(lines, "doc", max_tokens=30, overlap=10))
+    assert len(chunks) > 1
+    assert all(c.tokens <= 30 and c.tokens == count_tokens(c.content) for c in chunks)
+    assert [c.index for c in chunks] == list(range(len(chunks)))
+    # La última línea de cada pasaje abre el siguiente
+    for prev, nxt in zip(chunks, chunks[1:]):
+        assert nxt.content.split("\n")[0] == prev.content.split("\n")[-1]
+    # Todas las líneas aparecen
+    assert set(lines) == {line for c in chunks for line in c.content.split("\n")}
+
+
+def test_long_line_is_split_and_blank_lines_skipped():
+    chunks = list(iter_chunks(["", words("w", 25), "   "], "doc", max_tokens=10, overlap=0))
+    assert [c.tokens for c in chunks] == [10, 10, 5]
+
+
+def test_ids_are_stable_and_unique():
+    lines = ["misma línea"] * 3
+    first = [c.id for c in iter_chunks(lines, "doc", max_tokens=2, overlap=0)]
+    again = [c.id for c in iter_chunks(lines, "doc", max_tokens=2, overlap=0)]
+    assert first == again
+    assert len(set(first)) == 3
+    assert all(i.startswith("doc:") for i in first)
@@ -0,0 +1,103 @@
+from types import SimpleNamespace
+from app.services.event_bus import NOTIFY_MAX_BYTES, InMemoryEventBus, PostgresEventBus
+import asyncio
+import json
+
+
+def test_memory_bus_dispatches_sync_and_async_handlers():
+    bus, received = InMemoryEventBus(), []
+
+    async def async_handler(message):
+        received.append(("async", message["n"]))
+
+    bus.subscribe("log", lambda message: received.append(("sync", message["n"])))
+    bus.subscribe("log", async_handler)
+    asyncio.run(bus.publish("log", {"n": 1}))
+    asyncio.run(bus.publish("otro", {"n": 2}))
+    assert received == [("sync", 1), ("async", 1)]
+    assert bus.stats["published"] == 2
+
+
+def test_handler_error_does_not_stop_other_handlers():
+    bus, received = InMemoryEventBus(), []
+    bus.subscribe("log", lambda message: 1 / 0)
+    bus.subscribe("log", received.append)
+    asyncio.run(bus.publish("log", {"n": 1}))
+    assert received == [{"n": 1}] and bus.stats["errors"] == 1
+
+
+class FakeConn:
+    def __init__(self, fail=False):
+        self.fail, self.closed, self.executed = fail, False, []
+
+    def cursor(self):
+        conn = self
+
+        class Cursor:
+            def __enter__(self): return self
+            def __exit__(self, *exc): return False
+
+            def execute(self, sql, params=None):
+                if conn.fail: raise RuntimeError("conexión perdida")
+                conn.executed.append(params)
+        return Cursor()
+
+    def close(self):
+        self.closed = True
+
+
+def test_postgres_bus_delivers_locally_and_queues_notify():
+    async def scenario():
+        bus, received = PostgresEventBus(), []
+        bus.subscribe("log", received.append)
+        bus._outbox = asyncio.Queue()
+        await bus.publish("log", {"n": 1})
+        await bus.publish("log", {"big": "x" * NOTIFY_MAX_BYTES})
+        return bus, received
+
+    bus, received = asyncio.run(scenario())
+    assert received[0] == {"n": 1} and len(received) == 2
+    channel, payload = bus._outbox.get_nowait()
+    assert channel == "ciay_log" and json.loads(payload) == {"o": bus.origin, "m": {"n": 1}}
+    assert bus._outbox.empty() and bus.stats["oversized"] == 1
+
+
+def test_postgres_bus_ignores_its_own_echo():
+    async def scenario():
+        bus, received = PostgresEventBus(), []
+        bus.subscribe("log", received.append)
+        bus._loop = asyncio.get_running_loop()
+        notifies = [
+            SimpleNamespace(channel="ciay_log", payload=json.dumps({"o": bus.origin, "m": {"n": 1}})),
+            SimpleNamespace(channel="ciay_log", payload=json.dumps({"o": "otro-worker", "m": {"n": 2}})),
+            SimpleNamespace(channel="ciay_log", payload="no es json"),
+        ]
+        bus._listen_conn = SimpleNamespace(poll=lambda: None, notifies=notifies)
+        bus._on_readable()
+        await asyncio.sleep(0)
+        return bus, received
+
+    bus, received = asyncio.run(scenario())
+    assert received == [{"n": 2}] and bus.stats["received"] == 1
+
+
+def test_failed_notify_closes_the_connection():
+    conns = [FakeConn(fail=True), FakeConn()]
+
+    async def scenario():
+        bus = PostgresEventBus()
+        fresh = iter(conns)
+        bus._connect = lambda: next(fresh)
+        bus._outbox = asyncio.Queue()
+        bus._sender = asyncio.create_task(bus._send_loop())
+        await bus._outbox.put(("ciay_log", "{}"))
+        await asyncio.sleep(0.1)
+        await bus._outbox.put(("ciay_log", "{}"))
+        await asyncio.sleep(0.1)
+        await bus.stop()
+        return bus
+
+    bus = asyncio.run(scenario())
+    assert conns[0].closed  # la conexión que falló no se filtra
+    assert conns[1].executed == [("ciay_log", "{}")] and conns[1].closed
+    assert bus.stats["errors"] == 1
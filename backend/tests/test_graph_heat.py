@@ -0,0 +1,69 @@
+from types import SimpleNamespace
+from app.core.config import settings
+from app.services.graph_service import GraphService
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def heat_settings(monkeypatch):
+    monkeypatch.setattr(settings, "GRAPH_HEAT_HALF_LIFE", 100.0)
+    monkeypatch.setattr(settings, "GRAPH_HEAT_MAX", 60)
+
+
+def heat(service, node, amount):
+    service.apply_heat({"node_id": node, "delta": amount})
+    return service.heat[node][1]
+
+
+def test_heat_halves_every_half_life():
+    service = GraphService()
+    since = heat(service, "Educación", 20)
+    assert service.weight("Educación", since) == 40
+    assert service.weight("Educación", since + 100) == 30
+    assert service.weight("Educación", since + 200) == 25
+    assert service.weight("Educación", since + 10_000) == 20
+
+
+def test_heat_is_capped_at_what_the_weight_can_show():
+    service = GraphService()
+    for _ in range(100):
+        since = heat(service, "Educación", 5)
+    assert service.heat["Educación"][0] == 40  # 60 - base 20
+    assert service.weight("Educación", since + 100) < 60
+    service.apply_heat({"node_id": "no-es-pilar", "delta": 5})
+    assert "no-es-pilar" not in service.heat
+
+
+def test_diff_frame_sends_changes_and_forgets_cold_nodes():
+    service = GraphService()
+    heat(service, "Inversión", 10)
+    assert service.diff_frame() == {"Inversión": 30}
+    assert service.diff_frame() == {}
+    value, since = service.heat["Inversión"]
+    service.heat["Inversión"] = (value, since - 10_000)
+    assert service.diff_frame() == {"Inversión": 20}
+    assert "Inversión" not in service.heat
+
+
+class FakeDB:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def query(self, *columns):
+        return SimpleNamespace(filter=lambda *a: SimpleNamespace(all=lambda: self.rows))
+
+
+def test_restored_heat_decays_over_downtime():
+    service = GraphService()
+    service.init_weights(FakeDB([("Educación", 60, 0.0), ("Inversión", 60, 100.0), ("Gobierno", 60, 10_000.0)]))
+    weights = service.current_weights()
+    assert weights["Educación"] == 60
+    assert weights["Inversión"] == 40  # una vida media fuera de línea
+    assert weights["Gobierno"] == 20
+
+
+def test_restore_clamps_to_the_cap_and_ignores_cold_nodes():
+    service = GraphService()
+    service.init_weights(FakeDB([("Educación", 500, 0.0), ("Startups", 10, 0.0), ("Gobierno", None, None)]))
+    assert service.heat["Educación"][0] == 40
+    assert "Startups" not in service.heat and "Gobierno" not in service.heat
@@ -0,0 +1,67 @@
+from app.services.graph_index import GraphCSR, NodeMentions
+import numpy as np
+import pytest
+
+NODES = ["CIAY", "Educación", "Python", "Inversión", "Aislado"]
+LINKS = [
+    {"source": "CIAY", "target": "Educación", "relation": "pilar"},
+    {"source": "Educación", "target": "Python", "relation": "imparte"},
+    {"source": "CIAY", "target": "Inversión", "relation": "otra"},
+    {"source": "Python", "target": "Python", "relation": "bucle"},
+    {"source": "Python", "target": "Desconocido", "relation": "pilar"},
+]
+
+
+def graph():
+    return GraphCSR.from_links(NODES, LINKS, {"pilar": 1.0, "imparte": 0.5}, default_weight=0.25)
+
+
+def neighbors(csr, node):
+    i = csr.index[node]
+    return {csr.nodes[j]: float(w) for j, w in zip(csr.indices[csr.indptr[i]:csr.indptr[i + 1]],
+                                                   csr.weights[csr.indptr[i]:csr.indptr[i + 1]])}
+
+
+def test_csr_is_undirected_and_skips_self_loops_and_unknown_nodes():
+    csr = graph()
+    assert len(csr) == 5 and len(csr.indices) == 6
+    assert neighbors(csr, "CIAY") == {"Educación": 1.0, "Inversión": 0.25}
+    assert neighbors(csr, "Python") == {"Educación": 0.5}
+    assert neighbors(csr, "Aislado") == {}
+
+
+def test_transition_is_normalized_per_source():
+    csr = graph()
+    sums = np.bincount(csr._rows, weights=csr.transition, minlength=len(csr))
+    assert sums[csr.index["Aislado"]] == 0
+    assert np.allclose(sums[[csr.index[n] for n in ("CIAY", "Educación", "Python", "Inversión")]], 1.0)
+
+
+def test_expand_propagates_with_decay():
+    csr = graph()
+    scores = csr.expand({csr.index["Python"]: 1.0}, hops=2, decay=0.5)
+    assert scores[csr.index["Educación"]] == pytest.approx(0.5)
+    # segundo salto: Educación reparte 0.5 entre CIAY (1.0/1.5) y Python (0.5/1.5), por 0.5
+    assert scores[csr.index["CIAY"]] == pytest.approx(0.5 * (1.0 / 1.5) * 0.5)
+    assert scores[csr.index["Inversión"]] == 0
+    assert scores[csr.index["Aislado"]] == 0
+    assert csr.expand({csr.index["Aislado"]: 1.0}).sum() == 0
+
+
+def test_node_mentions_match_whole_names_without_accents():
+    csr = graph()
+    docs = ["Curso de PYTHON en el área de educacion", "El CIAY impulsa la inversión", "Pythonista sin más"]
+    mentions = NodeMentions(csr, docs)
+    named = [sorted(csr.nodes[n] for n in nodes) for nodes in mentions.doc_nodes]
+    assert named == [["Educación", "Python"], ["CIAY", "Inversión"], []]
+    assert sorted(csr.nodes[n] for n in mentions.nodes_in("¿Qué cursos de python tienen?")) == ["Python"]
+
+
+def test_doc_scores_weight_by_node_idf():
+    csr = graph()
+    mentions = NodeMentions(csr, ["python y educacion", "python", "ciay"])
+    scores = np.zeros(len(csr), dtype=np.float32)
+    scores[csr.index["Educación"]] = 1.0
+    doc_scores = mentions.doc_scores(scores, 3)
+    assert doc_scores[0] > 0 and doc_scores[1] == 0 and doc_scores[2] == 0
+    assert mentions.doc_scores(np.zeros(len(csr), dtype=np.float32), 3) is None
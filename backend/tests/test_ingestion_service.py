@@ -0,0 +1,94 @@
+from app.services.ingestion_service import IngestionService, file_hash, row_hash
+import pytest
+
+
+class FakeDB:
+    def __init__(self):
+        self.added, self.commits, self.rollbacks = [], 0, 0
+
+    def add(self, entry):
+        self.added.append(entry)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+def rows_by_id(df):
+    return {str(row["ID"]): row for row in df.to_dict("records")}
+
+
+def write_csv(path, rows):
+    path.write_text("ID,Contenido\n" + "".join(f"{k},{v}\n" for k, v in rows), encoding="utf-8")
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "kb.csv"
+    write_csv(path, [(1, "uno"), (2, "dos"), (3, "tres")])
+    return path
+
+
+def sync(db, manifest, path, pending=None):
+    applied = []
+    count = IngestionService()._sync_source(db, manifest, str(path), rows_by_id,
+                                            lambda db, changed, removed: applied.append((changed, removed)), pending)
+    return count, applied
+
+
+def test_row_hash_is_stable_and_ignores_nan():
+    assert row_hash({"a": 1, "b": float("nan")}) == row_hash({"b": None, "a": 1})
+    assert row_hash({"a": 1}) != row_hash({"a": 2})
+
+
+def test_first_sync_applies_everything_and_writes_manifest(source):
+    db, manifest = FakeDB(), {}
+    count, applied = sync(db, manifest, source)
+    assert count == 3
+    assert set(applied[0][0]) == {"1", "2", "3"} and applied[0][1] == set()
+    assert manifest[str(source)].file_hash == file_hash(str(source))
+    assert db.commits == 1
+
+
+def test_unchanged_file_is_skipped(source):
+    db, manifest = FakeDB(), {}
+    sync(db, manifest, source)
+    count, applied = sync(db, manifest, source)
+    assert count == 0 and applied == []
+    assert db.commits == 1
+
+
+def test_only_changed_and_removed_rows_are_applied(source):
+    db, manifest = FakeDB(), {}
+    sync(db, manifest, source)
+    write_csv(source, [(1, "uno"), (2, "DOS"), (4, "cuatro")])
+    count, applied = sync(db, manifest, source)
+    changed, removed = applied[0]
+    assert set(changed) == {"2", "4"} and removed == {"3"}
+    assert count == 3
+
+
+def test_pending_defers_the_manifest(source):
+    db, manifest, pending = FakeDB(), {}, []
+    sync(db, manifest, source, pending)
+    assert str(source) not in manifest
+    assert [p[0] for p in pending] == [str(source)]
+    # Sin manifiesto confirmado, el siguiente arranque vuelve a aplicar el archivo
+    assert sync(db, manifest, source)[0] == 3
+
+
+def test_failed_apply_rolls_back_without_manifest(source):
+    db, manifest = FakeDB(), {}
+
+    def boom(db, changed, removed):
+        raise RuntimeError("fallo")
+
+    with pytest.raises(RuntimeError):
+        IngestionService()._sync_source(db, manifest, str(source), rows_by_id, boom)
+    assert manifest == {} and db.rollbacks == 1
+
+
+def test_missing_file_is_ignored(tmp_path):
+    assert sync(FakeDB(), {}, tmp_path / "no-existe.csv") == (0, [])
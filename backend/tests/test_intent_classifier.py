@@ -0,0 +1,103 @@
+from types import SimpleNamespace
+from app.core.config import settings
+from app.services import chat_service as chat_module
+from app.services.intent_classifier import (
+    LABEL_MAP, IntentClassifierService, LocalIntentClassifier, calibrate_threshold, load_training_examples,
+)
+import asyncio
+import httpx
+import pytest
+
+EXAMPLES = [
+    ("Quiero inscribirme al curso de Python", "ESTUDIANTE"),
+    ("¿Tienen cursos de IA para estudiantes?", "ESTUDIANTE"),
+    ("Busco invertir capital en startups", "INVERSIONISTA"),
+    ("Me interesa invertir en el fondo", "INVERSIONISTA"),
+    ("¿Qué es el CIAY?", "GENERAL"),
+    ("¿Dónde están ubicados?", "GENERAL"),
+]
+
+
+def test_press_and_academia_are_not_contact():
+    assert LABEL_MAP["PRENSA"] == "GENERAL"
+    assert LABEL_MAP["ACADEMIA"] == "GENERAL"
+    labels = [label for _, label in load_training_examples()]
+    assert labels.count("CONTACTO") >= 20
+
+
+def test_calibrate_threshold_picks_lowest_precise_cutoff():
+    predictions = [("A", "A", 0.9)] * 8 + [("A", "B", 0.7)] + [("A", "A", 0.6)] * 3 + [("A", "B", 0.4)] * 4
+    # >= 0.6: 11/12 correctas; >= 0.4: 11/16
+    assert calibrate_threshold(predictions, 0.9, min_support=5) == 0.6
+    assert calibrate_threshold(predictions, 0.95, min_support=5) == 0.9
+    assert calibrate_threshold(predictions, 0.95, min_support=10) is None
+
+
+def test_calibrate_threshold_does_not_split_ties():
+    predictions = [("A", "A", 0.8)] * 10 + [("A", "B", 0.5), ("A", "A", 0.5)]
+    assert calibrate_threshold(predictions, 0.95, min_support=5) == 0.8
+
+
+def test_threshold_is_saved_with_the_model(tmp_path):
+    model = LocalIntentClassifier(dim=512).fit(EXAMPLES, epochs=50)
+    model.threshold = 0.42
+    model.save(str(tmp_path / "m.npz"))
+    assert LocalIntentClassifier.load(str(tmp_path / "m.npz")).threshold == pytest.approx(0.42)
+    model.threshold = None
+    model.save(str(tmp_path / "m.npz"))
+    assert LocalIntentClassifier.load(str(tmp_path / "m.npz")).threshold is None
+
+
+def service(threshold):
+    svc = IntentClassifierService()
+    svc.model = LocalIntentClassifier(dim=512).fit(EXAMPLES, epochs=50)
+    svc.model.threshold = threshold
+    return svc
+
+
+def test_is_confident_uses_calibrated_or_forced_threshold():
+    svc = service(0.5)
+    assert svc.is_confident({"intent": "GENERAL", "confidence": 0.5})
+    assert not svc.is_confident({"intent": "GENERAL", "confidence": 0.49})
+    assert svc.is_confident({"intent": "GENERAL", "confidence": 0.3}, threshold=0.2)
+    assert not svc.is_confident(None)
+    assert not service(None).is_confident({"intent": "GENERAL", "confidence": 0.99})
+    assert not IntentClassifierService().is_confident({"intent": "GENERAL", "confidence": 0.99})
+    assert IntentClassifierService().classify("hola") is None
+
+
+class FakeLLM:
+    def __init__(self, content=None, error=None):
+        self.content, self.error, self.calls = content, error, 0
+
+    async def complete(self, payload, timeout=None):
+        self.calls += 1
+        if self.error: raise self.error
+        return SimpleNamespace(status_code=200, json=lambda: {"choices": [{"message": {"content": self.content}}]})
+
+
+def classify(monkeypatch, svc, llm):
+    monkeypatch.setattr(chat_module, "intent_classifier", svc)
+    monkeypatch.setattr(chat_module, "llm_client", llm)
+    monkeypatch.setattr(settings, "INTENT_LOCAL_THRESHOLD", None)
+    return asyncio.run(chat_module.chat_service._classify_intent_semantically("Quiero inscribirme al curso de Python"))
+
+
+def test_confident_local_prediction_skips_the_llm(monkeypatch):
+    llm = FakeLLM('{"intent": "GENERAL", "confidence": 0.9}')
+    result = classify(monkeypatch, service(0.0), llm)
+    assert result["source"] == "local" and llm.calls == 0
+
+
+def test_low_confidence_falls_back_to_the_llm(monkeypatch):
+    llm = FakeLLM('{"intent": "GOBIERNO", "confidence": 0.9}')
+    assert classify(monkeypatch, service(1.01), llm) == {"intent": "GOBIERNO", "confidence": 0.9}
+    assert llm.calls == 1
+    llm = FakeLLM('{"intent": "GOBIERNO", "confidence": 0.9}')
+    assert classify(monkeypatch, service(None), llm)["intent"] == "GOBIERNO"
+
+
+def test_llm_failure_keeps_local_prediction_or_general(monkeypatch):
+    llm = FakeLLM(error=httpx.ConnectTimeout("timeout"))
+    assert classify(monkeypatch, service(1.01), llm)["source"] == "local"
+    assert classify(monkeypatch, IntentClassifierService(), llm) == {"intent": "GENERAL", "confidence": 0.5}
@@ -0,0 +1,88 @@
+from app.core.config import settings
+from app.services.log_writer import InteractionLogWriter
+import asyncio
+import threading
+import pytest
+
+
+class RecordingWriter(InteractionLogWriter):
+    """Sustituye la escritura en Postgres: guarda los lotes y falla con las filas marcadas."""
+
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def _write_batch(self, batch):
+        self.release.wait(5)
+        if any(row.get("bad") for row in batch):
+            raise RuntimeError("fila inválida")
+        self.batches.append([row["n"] for row in batch])
+
+
+@pytest.fixture(autouse=True)
+def small_batches(monkeypatch):
+    monkeypatch.setattr(settings, "LOG_WRITER_BATCH_SIZE", 3)
+    monkeypatch.setattr(settings, "LOG_WRITER_FLUSH_INTERVAL", 0.05)
+    monkeypatch.setattr(settings, "LOG_WRITER_QUEUE_SIZE", 100)
+    monkeypatch.setattr(settings, "LOG_WRITER_PUT_TIMEOUT", 0.01)
+    monkeypatch.setattr(settings, "LOG_WRITER_SHUTDOWN_TIMEOUT", 5)
+
+
+def test_batches_by_size_and_flushes_on_stop():
+    async def scenario():
+        writer = RecordingWriter()
+        for n in range(7):
+            await writer.submit({"n": n})
+        await writer.stop()
+        return writer
+
+    writer = asyncio.run(scenario())
+    assert [n for batch in writer.batches for n in batch] == list(range(7))
+    assert all(len(batch) <= 3 for batch in writer.batches)
+    assert writer.stats["written"] == 7 and writer.stats["failed"] == 0
+
+
+def test_flushes_a_partial_batch_after_the_interval():
+    async def scenario():
+        writer = RecordingWriter()
+        await writer.submit({"n": 1})
+        await asyncio.sleep(0.2)
+        batches = list(writer.batches)
+        await writer.stop()
+        return batches
+
+    assert asyncio.run(scenario()) == [[1]]
+
+
+def test_failed_batch_is_retried_row_by_row():
+    async def scenario():
+        writer = RecordingWriter()
+        for row in ({"n": 1}, {"n": 2, "bad": True}, {"n": 3}):
+            await writer.submit(row)
+        await writer.stop()
+        return writer
+
+    writer = asyncio.run(scenario())
+    assert writer.batches == [[1], [3]]
+    assert writer.stats["written"] == 2
+    assert writer.stats["failed"] == 1
+    assert writer.stats["batch_retries"] == 1
+
+
+def test_full_queue_drops_after_backpressure(monkeypatch):
+    monkeypatch.setattr(settings, "LOG_WRITER_QUEUE_SIZE", 2)
+
+    async def scenario():
+        writer = RecordingWriter()
+        writer.release.clear()  # el escritor queda bloqueado en el primer lote
+        results = [await writer.submit({"n": n}) for n in range(6)]
+        writer.release.set()
+        await writer.stop()
+        return writer, results
+
+    writer, results = asyncio.run(scenario())
+    assert results.count(False) == writer.stats["dropped"] > 0
+    assert writer.stats["enqueued"] == results.count(True)
+    assert writer.stats["written"] == results.count(True)
@@ -0,0 +1,59 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+from app.models.knowledge import SessionActivity
+from app.utils.pagination import decode_cursor, encode_cursor, keyset, split_page
+import pytest
+
+MOMENT = datetime(2026, 5, 4, 12, 30, 15, 123456, tzinfo=timezone.utc)
+
+
+def compile_sql(stmt) -> str:
+    return str(stmt.compile(dialect=postgresql.dialect()))
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(MOMENT, "sesion-1")
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (MOMENT, "sesion-1")
+
+
+@pytest.mark.parametrize("cursor", ["no-es-base64!", "e30", encode_cursor(MOMENT, "x")[:-3]])
+def test_bad_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_keyset_first_page_orders_and_limits():
+    stmt = keyset(select(SessionActivity.session_id, SessionActivity.first_seen),
+                  SessionActivity.first_seen, SessionActivity.session_id, None, 10)
+    sql = compile_sql(stmt)
+    assert "WHERE" not in sql
+    assert "ORDER BY session_activity.first_seen DESC, session_activity.session_id DESC" in sql
+    assert stmt._limit_clause.value == 11
+
+
+def test_keyset_with_cursor_compares_tuples():
+    cursor = encode_cursor(MOMENT, "sesion-1")
+    base = select(SessionActivity.session_id, SessionActivity.first_seen)
+    sql = compile_sql(keyset(base, SessionActivity.first_seen, SessionActivity.session_id, cursor, 10))
+    assert "(session_activity.first_seen, session_activity.session_id) <" in sql
+    sql = compile_sql(keyset(base, SessionActivity.first_seen, SessionActivity.session_id, cursor, 10, descending=False))
+    assert "(session_activity.first_seen, session_activity.session_id) >" in sql
+    assert "ORDER BY session_activity.first_seen ASC, session_activity.session_id ASC" in sql
+
+
+def test_keyset_rejects_bad_cursor():
+    with pytest.raises(ValueError):
+        keyset(select(SessionActivity.session_id), SessionActivity.first_seen, SessionActivity.session_id, "basura", 10)
+
+
+def test_split_page():
+    rows = [SimpleNamespace(first_seen=MOMENT.replace(minute=m), session_id=f"s{m}") for m in range(5)]
+    page, cursor = split_page(rows, 5, "first_seen", "session_id")
+    assert page == rows and cursor is None
+
+    page, cursor = split_page(rows, 3, "first_seen", "session_id")
+    assert page == rows[:3]
+    assert decode_cursor(cursor) == (rows[2].first_seen, "s2")
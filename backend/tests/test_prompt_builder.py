@@ -0,0 +1,44 @@
+from types import SimpleNamespace
+from app.core.config import settings
+from app.services.prompt_builder import PromptBuilder, estimate_tokens
+
+
+def passage(content):
+    return SimpleNamespace(content=content)
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("hola") == 1
+    assert estimate_tokens("inteligencia") == 3
+    assert estimate_tokens("¡Hola, mundo!") == 6  # ¡ Hola , mun·do !
+
+
+def test_fit_passages_in_ranking_order_within_budget():
+    items = [passage("uno dos tres"), passage("cuatro cinco"), passage("seis")]
+    used, texts = PromptBuilder.fit_passages(items, budget=100)
+    assert used == items
+    assert texts == ["uno dos tres", "cuatro cinco", "seis"]
+
+
+def test_fit_passages_skips_empty_and_duplicates():
+    items = [passage("uno"), passage("  "), passage(None), passage("uno "), passage("dos")]
+    used, texts = PromptBuilder.fit_passages(items, budget=100)
+    assert texts == ["uno", "dos"]
+    assert used == [items[0], items[4]]
+
+
+def test_fit_passages_truncates_first_that_does_not_fit():
+    long_text = " ".join(["palabra"] * 200)
+    budget = settings.PROMPT_MIN_PASSAGE_TOKENS + 10
+    used, texts = PromptBuilder.fit_passages([passage("corto"), passage(long_text), passage("otro")], budget)
+    assert len(used) == 2
+    assert texts[1].endswith(" …")
+    assert sum(estimate_tokens(t) + 1 for t in texts) <= budget + estimate_tokens("…")
+
+
+def test_fit_passages_stops_when_remaining_is_too_small():
+    first = " ".join(["palabra"] * 10)
+    budget = estimate_tokens(first) + 1 + settings.PROMPT_MIN_PASSAGE_TOKENS - 1
+    used, texts = PromptBuilder.fit_passages([passage(first), passage(" ".join(["otra"] * 500)), passage("x")], budget)
+    assert texts == [first]
@@ -0,0 +1,131 @@
+from types import SimpleNamespace
+from sqlalchemy.dialects import postgresql
+from app.core.config import settings
+from app.services.rag_service import RAGService, reciprocal_rank_fusion
+from app.services.vector_index import HashingTfidfEmbedder, IndexedDoc, VectorIndex
+
+DOCS = [
+    IndexedDoc(id="1", topic="Cursos", content="Curso de Python para análisis de datos"),
+    IndexedDoc(id="2", topic="Identidad", content="El CIAY es el centro de inteligencia artificial de Yucatán"),
+]
+
+
+def service(docs=DOCS):
+    rag = RAGService()
+    rag._publish(VectorIndex.build(HashingTfidfEmbedder(256), list(docs)))
+    return rag
+
+
+def test_fallback_doc_when_nothing_matches(monkeypatch):
+    monkeypatch.setattr(settings, "RAG_GRAPH_ENABLED", False)
+    rag = service()
+    assert [d.id for d in rag._fuse("xyz", [], None, 3)] == ["2"]
+    assert [d.id for d in service(DOCS[:1])._fuse("xyz", [], None, 3)] == []
+
+
+def test_fallback_is_resolved_once(monkeypatch):
+    monkeypatch.setattr(settings, "RAG_GRAPH_ENABLED", False)
+    rag = service()
+    rag.index.docs = None  # el respaldo ya no recorre los docs en cada consulta
+    assert [d.id for d in rag._fuse("xyz", [], None, 3)] == ["2"]
+
+
+def test_load_index_serves_from_memmap(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "RAG_INDEX_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "RAG_EMBEDDING_DIM", 256)
+    rag = RAGService()
+    assert rag.load_index() is None and rag.index is None
+    VectorIndex.build(HashingTfidfEmbedder(256), list(DOCS)).save(str(tmp_path))
+    assert rag.load_index() is rag.index
+    assert rag._fallback.id == "2"
+    assert type(rag.index.matrix).__name__ == "memmap"
+
+
+class FakeDB:
+    def __init__(self, docs):
+        self.items = [SimpleNamespace(id=d.id, topic=d.topic, content=d.content, keywords=d.keywords) for d in docs]
+        self.queries = 0
+
+    def query(self, model):
+        self.queries += 1
+        return SimpleNamespace(all=lambda: self.items)
+
+
+def test_ensure_index_builds_once_then_reopens_memmap(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "RAG_INDEX_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "RAG_EMBEDDING_DIM", 256)
+    db = FakeDB(DOCS)
+    rag = RAGService()
+    rag.ensure_index(db)
+    assert db.queries == 1
+    assert type(rag.index.matrix).__name__ == "memmap"
+
+    other = RAGService()  # otro worker: abre el artefacto sin tocar Postgres
+    other.ensure_index(db)
+    assert db.queries == 1 and len(other.index) == len(DOCS)
+
+    rag.ensure_index(db, rebuild=True)
+    assert db.queries == 2
+
+
+def doc(doc_id):
+    return IndexedDoc(id=doc_id, topic=None, content=f"doc {doc_id}")
+
+
+def ids(docs):
+    return [d.id for d in docs]
+
+
+def test_rrf_rewards_docs_ranked_in_both_lists():
+    vector = [doc("a"), doc("b"), doc("c")]
+    keyword = [doc("c"), doc("d"), doc("b")]
+    assert ids(reciprocal_rank_fusion([vector, keyword], k=60, limit=4)) == ["c", "b", "a", "d"]
+
+
+def test_rrf_limit_and_empty():
+    assert ids(reciprocal_rank_fusion([[doc("a"), doc("b")], []], limit=1)) == ["a"]
+    assert reciprocal_rank_fusion([[], []]) == []
+
+
+def test_fts_query_ors_unique_terms_without_stopwords():
+    rag = RAGService()
+    assert rag._fts_query("¿Tienen cursos de Python y de python?") == "cursos | python"
+    assert rag._fts_query("de la y el") is None
+    assert rag._fts_query("") is None
+
+
+def test_keyword_statement_uses_the_gin_column():
+    sql = str(RAGService()._keyword_statement("cursos python", 5).compile(dialect=postgresql.dialect()))
+    assert "knowledge_items.search_vector @@ to_tsquery" in sql
+    assert "ts_rank_cd(knowledge_items.search_vector" in sql
+    assert RAGService()._keyword_statement("de la", 5) is None
+
+
+def test_fuse_without_keyword_hits_keeps_vector_order(monkeypatch):
+    monkeypatch.setattr(settings, "RAG_GRAPH_ENABLED", False)
+    hits = [doc("a"), doc("b"), doc("c")]
+    assert ids(service()._fuse("q", hits, None, 2)) == ["a", "b"]
+
+
+def test_fuse_blends_vector_and_keyword_rankings(monkeypatch):
+    monkeypatch.setattr(settings, "RAG_GRAPH_ENABLED", False)
+    fused = service()._fuse("q", [doc("a"), doc("b")], [doc("b"), doc("k")], 3)
+    assert ids(fused) == ["b", "a", "k"]
+
+
+def test_graph_search_expands_from_query_and_hits(monkeypatch):
+    from app.services.graph_index import GraphCSR
+    from app.services.graph_service import graph_service
+    links = [{"source": "Educación", "target": "Python", "relation": "imparte"}]
+    monkeypatch.setattr(graph_service, "csr", GraphCSR.from_links(["CIAY", "Educación", "Python"], links, {}))
+    docs = [
+        IndexedDoc(id="py", topic="Cursos", content="Taller de Python"),
+        IndexedDoc(id="edu", topic="Oferta", content="Programas de educación"),
+        IndexedDoc(id="otro", topic="Eventos", content="Hackatón"),
+    ]
+    rag = service(docs)
+    assert rag._graph is not None and rag._graph.index is rag.index
+    # El vecino del nodo mencionado va primero; "otro" no está conectado
+    assert [d.id for d in rag.graph_search("¿Qué hay de educación?", [])] == ["py", "edu"]
+    assert [d.id for d in rag.graph_search("hola", [docs[0]])] == ["edu", "py"]
+    assert rag.graph_search("hola", []) == []
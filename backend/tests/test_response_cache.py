@@ -0,0 +1,92 @@
+from app.services.response_cache import ResponseCache, guard_tokens, normalize_message, scope_key
+import numpy as np
+import pytest
+
+VOCAB = ["curso", "python", "precio", "gratis", "horario", "costo"]
+
+
+def fake_embed(texts):
+    # Bolsa de palabras normalizada: sinónimos "precio"/"costo" comparten dimensión
+    vectors = np.zeros((len(texts), len(VOCAB)), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for word in text.split():
+            word = "precio" if word == "costo" else word
+            if word in VOCAB:
+                vectors[row, VOCAB.index(word)] += 1
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def make_cache(**overrides):
+    options = {"ttl": 60, "max_entries": 8, "max_bytes": 10_000, "similarity": 0.9}
+    options.update(overrides)
+    return ResponseCache(fake_embed, **options)
+
+
+def test_normalize_message():
+    assert normalize_message("¿Cuál es el PRECIO del curso?") == normalize_message("cual es el precio del curso")
+
+
+def test_guard_tokens_keep_polarity_and_numbers():
+    assert guard_tokens(normalize_message("¿No es gratis el curso 2?")) == frozenset({"no", "2"})
+    assert guard_tokens(normalize_message("¿Es gratis el curso?")) == frozenset()
+
+
+def test_scope_key_depends_on_mode_intent_and_history():
+    history = [{"role": "user", "content": "hola"}]
+    assert scope_key(None, None, []) == "-|-|"
+    assert scope_key("prompt", "ESTUDIANTE", history) == scope_key("prompt", "ESTUDIANTE", [dict(h) for h in history])
+    assert scope_key("prompt", "ESTUDIANTE", history) != scope_key("native", "ESTUDIANTE", history)
+    assert scope_key("prompt", "ESTUDIANTE", history) != scope_key("prompt", "ESTUDIANTE", [])
+
+
+def test_exact_hit_and_miss_on_other_context_or_scope():
+    cache = make_cache()
+    cache.put("¿Precio del curso Python?", ["k2", "k1"], "Cuesta 100", scope="s")
+    hit = cache.get("precio del curso python", ["k1", "k2"], scope="s")
+    assert hit.response == "Cuesta 100" and hit.match == "exact"
+    assert cache.get("precio del curso python", ["k1"], scope="s") is None
+    assert cache.get("precio del curso python", ["k1", "k2"], scope="otro") is None
+
+
+def test_semantic_hit_requires_same_guard():
+    cache = make_cache()
+    cache.put("precio del curso python", ["k1"], "Cuesta 100")
+    hit = cache.get("costo del curso python", ["k1"])
+    assert hit is not None and hit.match == "semantic"
+    assert hit.score == pytest.approx(1.0)
+    assert cache.get("no costo del curso python", ["k1"]) is None
+
+
+def test_lru_eviction_by_entries():
+    cache = make_cache(max_entries=2)
+    cache.put("curso python", ["a"], "uno")
+    cache.put("curso python", ["b"], "dos")
+    assert cache.get("curso python", ["a"]) is not None  # "a" pasa a ser la más reciente
+    cache.put("curso python", ["c"], "tres")
+    assert cache.get("curso python", ["b"]) is None
+    assert cache.get("curso python", ["a"]).response == "uno"
+    assert cache.get("curso python", ["c"]).response == "tres"
+    assert len(cache.entries) == 2
+
+
+def test_eviction_by_bytes_and_oversized_response():
+    cache = make_cache(max_bytes=100)
+    cache.put("curso", ["a"], "x" * 60)
+    cache.put("horario", ["a"], "y" * 60)
+    assert cache.get("curso", ["a"]) is None
+    assert cache.bytes <= 100
+    cache.put("precio", ["a"], "z" * 200)
+    assert cache.get("precio", ["a"]) is None
+
+
+def test_ttl_expiry(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("app.services.response_cache.time.monotonic", lambda: clock[0])
+    cache = make_cache(ttl=10)
+    cache.put("horario del curso", ["a"], "De 9 a 2")
+    clock[0] += 5
+    assert cache.get("horario del curso", ["a"]) is not None
+    clock[0] += 6
+    assert cache.get("horario del curso", ["a"]) is None
+    assert not cache.entries and cache.bytes == 0
@@ -0,0 +1,56 @@
+from app.utils.tool_stream import ToolCallStreamParser
+
+
+def run(chunks):
+    parser = ToolCallStreamParser()
+    visible = "".join(parser.feed(chunk) for chunk in chunks) + parser.flush()
+    return parser, visible
+
+
+def test_plain_text_passes_through():
+    parser, visible = run(["Hola, ", "soy ", "el CIAY."])
+    assert visible == "Hola, soy el CIAY."
+    assert not parser.sentinel_seen
+    assert parser.tool_json is None
+
+
+def test_tool_call_in_one_chunk():
+    parser, visible = run(['Listo. @@TOOL_CALL: {"action":"x"} @@'])
+    assert visible == "Listo. "
+    assert parser.tool_json == '{"action":"x"}'
+
+
+def test_sentinels_split_across_chunks():
+    text = 'Listo, te inscribo. @@TOOL_CALL: {"action":"register_course","data":{"curso":"Python"}} @@'
+    for size in (1, 2, 3, 5, 7):
+        parser, visible = run([text[i:i + size] for i in range(0, len(text), size)])
+        assert visible == "Listo, te inscribo. ", size
+        assert parser.tool_json == '{"action":"register_course","data":{"curso":"Python"}}', size
+        assert parser.text == text
+
+
+def test_trailing_at_is_held_back_then_flushed():
+    parser = ToolCallStreamParser()
+    assert parser.feed("escribe a correo@") == "escribe a correo"
+    assert parser.feed("ciay.mx") == "@ciay.mx"
+    assert parser.feed(" hola@") == " hola"
+    assert parser.flush() == "@"
+    assert not parser.sentinel_seen
+
+
+def test_text_after_tool_block_is_hidden():
+    parser, visible = run(['ok @@TOOL_CALL: {"a":1} @@', " resto"])
+    assert visible == "ok "
+    assert parser.state == ToolCallStreamParser.DONE
+
+
+def test_block_without_prefix_or_json_is_not_a_tool_call():
+    assert run(["a @@ algo sin prefijo @@"])[0].tool_json is None
+    assert run(["a @@TOOL_CALL: no es json @@"])[0].tool_json is None
+
+
+def test_unclosed_block_has_no_tool_json():
+    parser, visible = run(['texto @@TOOL_CALL: {"a":1}'])
+    assert visible == "texto "
+    assert parser.sentinel_seen
+    assert parser.tool_json is None
@@ -0,0 +1,89 @@
+from app.services.vector_index import HashingTfidfEmbedder, IndexedDoc, VectorIndex, normalize_text, tokenize
+import numpy as np
+
+DOCS = [
+    IndexedDoc(id="1", topic="Cursos", content="Curso de Python para análisis de datos", keywords="python, datos"),
+    IndexedDoc(id="2", topic="Eventos", content="Hackatón de inteligencia artificial en Mérida"),
+    IndexedDoc(id="3", topic="Identidad", content="El CIAY es el centro de inteligencia artificial de Yucatán"),
+]
+
+
+def build(docs=DOCS, **kwargs):
+    return VectorIndex.build(HashingTfidfEmbedder(256), list(docs), **kwargs)
+
+
+def test_normalize_and_tokenize():
+    assert normalize_text("Educación IA") == "educacion ia"
+    assert tokenize("¿Qué es el Análisis de Datos?") == ["analisis", "datos"]
+
+
+def test_build_normalizes_rows():
+    index = build()
+    assert index.matrix.shape == (3, 256)
+    assert index.matrix.dtype == np.float32
+    assert np.allclose(np.linalg.norm(index.matrix, axis=1), 1.0)
+
+
+def test_query_ranks_by_cosine():
+    hits = build().query("curso de python", k=2)
+    assert hits[0][0].id == "1"
+    assert hits[0][1] > 0
+    assert all(a[1] >= b[1] for a, b in zip(hits, hits[1:]))
+
+
+def test_query_min_score_and_empty_index():
+    assert build().query("zzz qqq", k=3, min_score=0.05) == []
+    assert build(docs=[]).query("python") == []
+
+
+def test_save_and_load_round_trip(tmp_path):
+    index = build()
+    index.save(str(tmp_path))
+    loaded = VectorIndex.load(str(tmp_path), HashingTfidfEmbedder(256))
+    assert isinstance(loaded.matrix, np.memmap)
+    assert np.array_equal(np.asarray(loaded.matrix), index.matrix)
+    assert np.array_equal(np.asarray(loaded.embedder.idf), index.embedder.idf)
+    assert list(loaded.docs) == DOCS
+    assert loaded.query("curso de python", k=1)[0][0].id == "1"
+
+
+def test_load_missing_or_incompatible_returns_none(tmp_path):
+    assert VectorIndex.load(str(tmp_path), HashingTfidfEmbedder(256)) is None
+    build().save(str(tmp_path))
+    assert VectorIndex.load(str(tmp_path), HashingTfidfEmbedder(128)) is None
+
+
+def test_save_keeps_last_versions(tmp_path):
+    for _ in range(4):
+        build().save(str(tmp_path), keep=2)
+    versions = [d for d in tmp_path.iterdir() if d.name.startswith("v")]
+    assert len(versions) == 2
+    assert (tmp_path / "CURRENT").read_text() in {v.name for v in versions}
+
+
+class CountingEmbedder(HashingTfidfEmbedder):
+    def __init__(self, dim):
+        super().__init__(dim)
+        self.embedded = []
+
+    def embed(self, texts):
+        self.embedded.extend(texts)
+        return super().embed(texts)
+
+
+def test_incremental_build_only_embeds_changed_docs():
+    previous = VectorIndex.build(CountingEmbedder(256), list(DOCS))
+    previous.embedder.embedded.clear()
+    changed = IndexedDoc(id="2", topic="Eventos", content="Hackatón de robótica en Mérida")
+    docs = [DOCS[0], changed, DOCS[2], IndexedDoc(id="4", topic="Cursos", content="Taller de visión")]
+    index = VectorIndex.build(HashingTfidfEmbedder(256), docs, previous=previous, refit_ratio=0.5)
+    assert previous.embedder.embedded == [changed.text, docs[3].text]
+    assert index.embedder is previous.embedder  # IDF congelado
+    assert np.array_equal(index.matrix[[0, 2]], previous.matrix[[0, 2]])
+
+
+def test_incremental_build_refits_when_too_much_changed():
+    previous = build()
+    docs = [IndexedDoc(id=str(i), topic="Nuevo", content=f"documento nuevo {i}") for i in range(3)]
+    index = VectorIndex.build(HashingTfidfEmbedder(256), docs, previous=previous, refit_ratio=0.3)
+    assert index.embedder is not previous.embedder
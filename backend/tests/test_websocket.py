@@ -0,0 +1,67 @@
+from app.core.config import settings
+from app.utils.websocket import ClientConnection, ConnectionManager
+import asyncio
+
+
+class FakeSocket:
+    def __init__(self, hang=False, fail=False):
+        self.hang, self.fail = hang, fail
+        self.sent, self.closed = [], None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        if self.fail: raise RuntimeError("socket cerrado")
+        if self.hang: await asyncio.sleep(60)
+        self.sent.append(text)
+
+    async def close(self, code=1000):
+        self.closed = code
+
+
+def test_queue_drops_oldest(monkeypatch):
+    monkeypatch.setattr(settings, "WS_QUEUE_SIZE", 2)
+    client = ClientConnection(FakeSocket())
+    for text in ("a", "b", "c"):
+        client.enqueue(text)
+    assert list(client.pending) == ["b", "c"] and client.dropped == 1
+
+
+def test_topic_and_session_filters():
+    client = ClientConnection(FakeSocket(), topics={"log"}, sessions={"s1"})
+    assert client.wants("log", "s1") and client.wants("log", None)
+    assert not client.wants("log", "s2") and not client.wants("graph_heat", None)
+
+
+def run_manager(socket, monkeypatch):
+    monkeypatch.setattr(settings, "WS_SEND_TIMEOUT", 0.05)
+
+    async def scenario():
+        manager = ConnectionManager()
+        await manager.connect(socket)
+        manager.publish("log", {"type": "log"})
+        await asyncio.sleep(0.2)
+        return manager
+
+    return asyncio.run(scenario())
+
+
+def test_delivers_published_events(monkeypatch):
+    socket = FakeSocket()
+    manager = run_manager(socket, monkeypatch)
+    assert socket.sent == ['{"type": "log"}'] and socket.closed is None
+    assert socket in manager.clients
+
+
+def test_slow_client_is_closed_so_it_reconnects(monkeypatch):
+    socket = FakeSocket(hang=True)
+    manager = run_manager(socket, monkeypatch)
+    assert socket.closed == 1013
+    assert socket not in manager.clients
+
+
+def test_failed_send_closes_the_socket(monkeypatch):
+    socket = FakeSocket(fail=True)
+    manager = run_manager(socket, monkeypatch)
+    assert socket.closed == 1013 and not manager.clients
@@ -0,0 +1,31 @@
+import sys
+from app.services.intent_classifier import load_training_examples, train as train_model, MODEL_PATH, MIN_ACCURACY, TARGET_PRECISION
+
+# Entrenamiento offline del clasificador de intención local.
+# Uso: python train_intent.py  ->  escribe data/intent_model.npz
+# Falla (código 1, sin escribir el modelo) si no alcanza el piso de calidad.
+
+def train():
+    examples = load_training_examples()
+    if not examples:
+        print("❌ No hay ejemplos de entrenamiento en data/.")
+        sys.exit(1)
+    print(f"📂 {len(examples)} ejemplos cargados.")
+
+    # Validación cruzada (5 folds): exactitud y umbral calibrado antes de entrenar con todo
+    model, report = train_model(examples, TARGET_PRECISION)
+    print(f"  📊 Exactitud fuera de muestra: {report['accuracy']:.0%} ({report['examples']} ejemplos)")
+    if report["threshold"] is None:
+        print(f"❌ Ningún umbral alcanza la precisión objetivo ({TARGET_PRECISION:.0%}).")
+        sys.exit(1)
+    print(f"  🎯 Umbral {report['threshold']:.3f}: precisión {report['precision']:.0%}, "
+          f"cobertura {report['coverage']:.0%} (mensajes que no consultan al LLM)")
+    if report["accuracy"] < MIN_ACCURACY:
+        print(f"❌ Exactitud por debajo del mínimo ({MIN_ACCURACY:.0%}).")
+        sys.exit(1)
+
+    model.save(MODEL_PATH)
+    print(f"🚀 Modelo guardado en: {MODEL_PATH} (etiquetas: {', '.join(model.labels)})")
+
+if __name__ == "__main__":
+    train()
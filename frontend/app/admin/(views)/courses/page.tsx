@@ -6,11 +6,20 @@ import { useToast } from "@/hooks/use-toast"
 
 export default function CoursesPage() {
   const [regs, setRegs] = useState<any[]>([])
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
   const { toast } = useToast()
 
-  useEffect(() => {
-    fetch(`${API_BASE_URL}/api/v1/analytics/registrations`).then(res => res.json()).then(setRegs).catch(console.error)
-  }, [])
+  const loadRegs = async (cursor?: string) => {
+    try {
+      const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : ""
+      const res = await fetch(`${API_BASE_URL}/api/v1/analytics/registrations${query}`)
+      const page = await res.json()
+      setRegs(prev => cursor ? [...prev, ...page] : page)
+      setNextCursor(res.headers.get("X-Next-Cursor"))
+    } catch (e) { console.error(e) }
+  }
+
+  useEffect(() => { loadRegs() }, [])
 
   const handleDelete = async (id: string) => {
       if (!confirm("¿Eliminar inscripción?")) return;
@@ -67,6 +76,13 @@ export default function CoursesPage() {
         </tbody>
       </table>
       {regs.length === 0 && <div className="text-center text-gray-400 p-10">No hay inscripciones registradas.</div>}
+      {nextCursor && (
+        <div className="p-4 text-center border-t border-gray-100">
+          <button onClick={() => loadRegs(nextCursor)} className="px-4 py-2 text-sm font-bold text-ciay-brown border border-ciay-brown/20 rounded hover:bg-ciay-cream transition-colors">
+            Cargar más
+          </button>
+        </div>
+      )}
     </div>
   )
 }
\ No newline at end of file
@@ -6,11 +6,21 @@ import { useToast } from "@/hooks/use-toast"
 
 export default function LeadsPage() {
   const [leads, setLeads] = useState<any[]>([])
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
   const { toast } = useToast()
 
-  useEffect(() => {
-    fetch(`${API_BASE_URL}/api/v1/analytics/leads`).then(res => res.json()).then(setLeads).catch(console.error)
-  }, [])
+  // Paginación por cursor: el backend devuelve la siguiente página en X-Next-Cursor
+  const loadLeads = async (cursor?: string) => {
+    try {
+      const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : ""
+      const res = await fetch(`${API_BASE_URL}/api/v1/analytics/leads${query}`)
+      const page = await res.json()
+      setLeads(prev => cursor ? [...prev, ...page] : page)
+      setNextCursor(res.headers.get("X-Next-Cursor"))
+    } catch (e) { console.error(e) }
+  }
+
+  useEffect(() => { loadLeads() }, [])
 
   const handleDelete = async (id: string) => {
       if (!confirm("¿Estás seguro de eliminar este lead?")) return;
@@ -67,6 +77,13 @@ export default function LeadsPage() {
         ))}
       </div>
       {leads.length === 0 && <div className="text-center text-gray-400 p-10">No hay leads registrados aún.</div>}
+      {nextCursor && (
+        <div className="text-center">
+          <button onClick={() => loadLeads(nextCursor)} className="px-4 py-2 text-sm font-bold text-ciay-brown border border-ciay-brown/20 rounded hover:bg-ciay-cream transition-colors">
+            Cargar más
+          </button>
+        </div>
+      )}
     </div>
   )
 }
\ No newline at end of file
@@ -16,15 +16,30 @@ export function ChatHistoryView({ sessionId }: { sessionId: string }) {
   const [history, setHistory] = useState<Message[]>([])
   const [loading, setLoading] = useState(true)
   const [selectedMessage, setSelectedMessage] = useState<Message | null>(null)
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
+
+  // --- FIX: USAR URL REAL (API_BASE_URL) ---
+  const fetchPage = async (cursor?: string) => {
+    const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : ""
+    const res = await fetch(`${API_BASE_URL}/api/v1/analytics/session/${sessionId}${query}`)
+    setNextCursor(res.headers.get("X-Next-Cursor"))
+    return res.json()
+  }
+
+  const loadMore = async () => {
+    if (!nextCursor) return
+    try {
+      const data = await fetchPage(nextCursor)
+      setHistory(prev => [...prev, ...data])
+    } catch (error) { console.error("Error fetching history:", error) }
+  }
 
   useEffect(() => {
     if (!sessionId) return
     const fetchHistory = async () => {
       setLoading(true)
       try {
-        // --- FIX: USAR URL REAL (API_BASE_URL) ---
-        const res = await fetch(`${API_BASE_URL}/api/v1/analytics/session/${sessionId}`)
-        const data = await res.json()
+        const data = await fetchPage()
         setHistory(data)
         if (data.length > 0) setSelectedMessage(data[0])
       } catch (error) { console.error("Error fetching history:", error) } 
@@ -68,6 +83,11 @@ export function ChatHistoryView({ sessionId }: { sessionId: string }) {
               </div>
             </div>
           ))}
+          {nextCursor && (
+            <button onClick={loadMore} className="w-full py-2 text-xs font-bold text-ciay-brown border border-gray-200 rounded-lg hover:bg-ciay-cream transition-colors">
+              Cargar más mensajes
+            </button>
+          )}
         </div>
       </div>
 
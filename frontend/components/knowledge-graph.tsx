@@ -17,6 +17,11 @@ export function KnowledgeGraph() {
   const [graphData, setGraphData] = useState<any>({ nodes: [], links: [] })
   const [activeNode, setActiveNode] = useState<string | null>(null)
   const fgRef = useRef<any>()
+  // Últimos pesos recibidos por el websocket: el snapshot puede llegar antes que la topología
+  const weightsRef = useRef<Record<string, number>>({})
+
+  const applyWeights = (nodes: any[], weights: Record<string, number>) =>
+    nodes.map((n: any) => n.id in weights ? { ...n, val: weights[n.id] } : n)
 
   const COLORS = {
     ROOT: "#624E32",    // Café
@@ -29,7 +34,8 @@ export function KnowledgeGraph() {
   useEffect(() => {
       fetch(`${API_BASE_URL}/api/v1/graph`)
         .then(res => res.json())
-        .then(data => setGraphData(data))
+        // GET /graph trae pesos base; el calor actual llega por el websocket
+        .then(data => setGraphData({ ...data, nodes: applyWeights(data.nodes, weightsRef.current) }))
         .catch(err => console.error("Error loading graph:", err));
   }, []);
 
@@ -59,15 +65,18 @@ export function KnowledgeGraph() {
         try {
             const msg = JSON.parse(event.data)
             if (msg.type === "graph_heat") {
-                const { node_id, new_weight } = msg.payload;
+                const { node_id, new_weight, nodes } = msg.payload;
+                // Un frame por tick con todos los nodos que cambiaron (boosts y decaimiento)
+                const weights: Record<string, number> = nodes ?? { [node_id]: new_weight };
+                weightsRef.current = { ...weightsRef.current, ...weights };
                 setGraphData((prev: any) => ({
                     ...prev,
-                    nodes: prev.nodes.map((n: any) => 
-                        n.id === node_id ? { ...n, val: new_weight } : n
-                    )
+                    nodes: applyWeights(prev.nodes, weights)
                 }));
-                setActiveNode(node_id);
-                setTimeout(() => setActiveNode(null), 2500);
+                if (node_id) {
+                    setActiveNode(node_id);
+                    setTimeout(() => setActiveNode(null), 2500);
+                }
             }
         } catch {}
     }